@@ -12,6 +12,9 @@ import uvicorn
 import src.bot_instance as bot_instance
 from webserver import app
 from src.utils.data_handler import restore_stats_per_guild
+from src.utils.guild_store import GuildStore
+from src.utils.http_client import PooledHttpClient
+from src.utils.name_cache import NameCache
 
 # ========= Cargar configuración =========
 load_dotenv()
@@ -45,6 +48,14 @@ bot = bot_instance.bot
 
 @bot.event
 async def setup_hook():
+    # Estado residente por servidor con volcado diferido a disco
+    bot.guild_store = GuildStore()
+    await bot.guild_store.start()
+    # Nombres visibles compartidos por los comandos de estadísticas
+    bot.name_cache = NameCache(bot)
+    # Cliente HTTP con conexiones reutilizables para FastAPI (sync y restauración)
+    bot.http_pool = PooledHttpClient()
+
     await bot.load_extension("src.cogs.voice_cog")
     await bot.load_extension("src.cogs.commands_cog")
     await bot.load_extension("src.cogs.misc_cog")
@@ -85,7 +96,18 @@ async def main():
 
     # Uvicorn gestionará el cierre y llamará al lifespan de webserver.py
     async with bot_instance.bot:
-        await asyncio.gather(bot_instance.bot.start(TOKEN), server.serve())
+        try:
+            await asyncio.gather(bot_instance.bot.start(TOKEN), server.serve())
+        finally:
+            # Normalmente ya lo ha cerrado el lifespan tras sincronizar; si no
+            # llegó a ejecutarse (p. ej. el bot falló al arrancar), se cierra aquí
+            store = getattr(bot_instance.bot, "guild_store", None)
+            if store:
+                await store.close()
+            # Después del lifespan, que aún sincroniza con FastAPI
+            http_pool = getattr(bot_instance.bot, "http_pool", None)
+            if http_pool:
+                await http_pool.close()
 
 
 if __name__ == "__main__":
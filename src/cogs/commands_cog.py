@@ -3,78 +3,147 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-from src.utils.data_handler import load_json
-from src.utils.helpers import get_data_path, update_json_file
-import os
-from datetime import datetime
-from src.config import RAIZ_PROYECTO
+from src.config import LEADERBOARD_SIZE, OCCUPANCY_MINUTES
+from src.utils.helpers import update_json_file
+from src.utils.rollups import period_start
+import io
+import json
+from datetime import datetime, time
 from src.utils.ui_components import UserStatsPaginator, generate_settings_interface
 
+# Opción `periodo` de /datos_llamada y /datos_totales_llamada (ver rollups.PERIODS)
+PERIOD_CHOICES = [
+    app_commands.Choice(name="Hoy", value="hoy"),
+    app_commands.Choice(name="Últimos 7 días", value="semana"),
+    app_commands.Choice(name="Últimos 30 días", value="mes"),
+    app_commands.Choice(name="Último año", value="año"),
+]
+
 
 class CommandsCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.data_dir = RAIZ_PROYECTO / "data"
         self.call_data = {}
 
-    async def _get_bidirectional_stats(
-        self, call_data: dict, a: str, b: str, guild: discord.Guild = None
-    ):
+    @staticmethod
+    def _since_dt(since):
+        return None if since is None else datetime.combine(since, time.min)
+
+    def _get_bidirectional_stats(self, state, a: str, b: str, since=None):
         """
-        Recupera estadísticas y el OBJETO DE MIEMBRO DEL SERVIDOR (para que salga el apodo).
+        Recupera las estadísticas de la pareja (a, b), desde el día `since` o
+        desde siempre. El tiempo incluye la sesión en curso si están en
+        llamada ahora mismo. Los nombres se resuelven aparte con
+        `bot.name_cache`.
         """
         a, b = str(a), str(b)
 
         if a == b:
             return "same_user"
+
+        # Lo guardado se deriva una vez por versión de a y b; la sesión en
+        # curso se suma siempre al consultar
+        key = ("pair", a, b, since)
+        stamp = state.query_cache.stamp((a, b))
+        found, stats = state.query_cache.get(key, stamp)
+        if not found:
+            stats = self._derive_pair_stats(state, a, b, since)
+            state.query_cache.put(key, stamp, stats)
+        if stats is None:
+            return None
+
+        return {
+            **stats,
+            "total_seconds": stats["stored_seconds"]
+            + state.sessions.shared_elapsed(a, b, since=self._since_dt(since)),
+        }
+
+    @staticmethod
+    def _derive_pair_stats(state, a: str, b: str, since=None):
+        """Contadores guardados de la pareja (a, b), sin la sesión en curso."""
+        call_data = state.stats
         if a not in call_data or b not in call_data:
             return None
 
+        if since is not None:
+            # Suma de las cubetas del periodo
+            period = state.rollups.pair_period(a, b, since)
+            return {
+                "calls_ab": period["calls_ab"],
+                "calls_ba": period["calls_ba"],
+                "total_calls": period["calls_ab"] + period["calls_ba"],
+                "stored_seconds": period["shared"],
+            }
+
         val_ab = call_data.get(a, {}).get(b, None)
         val_ba = call_data.get(b, {}).get(a, None)
 
         if isinstance(val_ab, dict):
             calls_ab = val_ab.get(f"calls_started", 0)
-            seconds_ab = val_ab.get("total_shared_time", 0) or 0
         else:
-            calls_ab, seconds_ab = 0, 0  # Inicializar si no existe
+            calls_ab = 0  # Inicializar si no existe
 
         if isinstance(val_ba, dict):
             calls_ba = val_ba.get(f"calls_started", 0)
-            seconds_ba = val_ba.get("total_shared_time", 0) or 0
         else:
-            calls_ba, seconds_ba = 0, 0  # Inicializar si no existe
+            calls_ba = 0  # Inicializar si no existe
 
         total_calls = calls_ab + calls_ba
-        total_seconds = seconds_ab or seconds_ba
-
-        user_obj = None
-        if guild:
-            # Primero intentamos obtenerlo del servidor (tiene apodo)
-            user_obj = guild.get_member(int(b))
-
-            # Si no está en caché (get_member devuelve None), intentamos fetch (más lento pero seguro)
-            if user_obj is None:
-                try:
-                    user_obj = await guild.fetch_member(int(b))
-                except discord.NotFound:
-                    pass  # El usuario ya no está en el servidor
-
-        # Si falla (ej. usuario se fue del server), usamos el global (fetch_user)
-        if user_obj is None:
-            try:
-                user_obj = await self.bot.fetch_user(int(b))
-            except Exception:
-                user_obj = None
+        stored_seconds = call_data.shared_time(a, b) or call_data.shared_time(b, a)
 
         return {
             "calls_ab": calls_ab,
             "calls_ba": calls_ba,
             "total_calls": total_calls,
-            "total_seconds": total_seconds,
-            "user_obj": user_obj,
+            "stored_seconds": stored_seconds,
         }
 
+    async def _get_user_summary(self, state, guild, mid: str, since=None) -> dict:
+        """
+        Datos de /datos_totales_llamada guardados para `mid` (desde el día
+        `since` o desde siempre): sus contadores y sus parejas con el tiempo
+        guardado, de mayor a menor. Se derivan una vez por versión de `mid`
+        (cualquier cambio en una de sus parejas también la sube).
+        """
+        key = ("user", mid, since)
+        stamp = state.query_cache.stamp((mid,))
+        found, summary = state.query_cache.get(key, stamp)
+        if found:
+            return summary
+
+        call_data = state.stats
+        my_data = call_data.get(mid, {})
+        # Usuarios con pareja registrada en cualquiera de los dos sentidos
+        all_uids = await self.bot.guild_store.partners(guild, mid)
+        partners = []
+        for uid in all_uids:
+            stats = self._derive_pair_stats(state, mid, uid, since)
+            if stats is None:
+                continue
+            # En un periodo solo cuentan las parejas con actividad en él
+            # (o con una sesión abierta ahora)
+            if since is None or (
+                stats["total_calls"]
+                or stats["stored_seconds"]
+                or frozenset((mid, uid)) in state.sessions.pairs
+            ):
+                partners.append((uid, stats["stored_seconds"]))
+        partners.sort(key=lambda item: item[1], reverse=True)
+
+        if since is not None:
+            my_data = state.rollups.user_period(mid, since)
+
+        summary = {
+            "solo_time": my_data.get("total_solo_time", 0),
+            "dep_attempts": my_data.get("depressive_attempts", 0),
+            "dep_time": my_data.get("depressive_time", 0),
+            "has_incoming": since is None and bool(my_data),
+            "has_outgoing": bool(all_uids if since is None else partners),
+            "partners": partners,
+        }
+        state.query_cache.put(key, stamp, summary)
+        return summary
+
     # ===== Funciones auxiliares de formato =====
     @staticmethod
     def fmt_time(seconds):
@@ -96,20 +165,24 @@ class CommandsCog(commands.Cog):
         name="datos_llamada",
         description="Devuelve las veces y el tiempo total que un usuario ha estado en llamada con otro.",
     )
+    @app_commands.describe(periodo="Periodo a consultar (por defecto, desde siempre)")
+    @app_commands.choices(periodo=PERIOD_CHOICES)
     async def call_stats(
         self,
         interaction: discord.Interaction,
         user1: discord.Member = None,
         user2: discord.Member = None,
+        periodo: app_commands.Choice[str] = None,
     ):
         guild = interaction.guild
-        call_data = load_json(get_data_path(guild, "stats.json"))
+        state = await self.bot.guild_store.get(guild)
 
         user1 = user1 or interaction.user
         user2 = user2 or interaction.user
+        since = period_start(periodo.value) if periodo else None
 
         u1, u2 = str(user1.id), str(user2.id)
-        stats = await self._get_bidirectional_stats(call_data, u1, u2, guild=guild)
+        stats = self._get_bidirectional_stats(state, u1, u2, since)
 
         if stats == "same_user":
             await interaction.response.send_message(
@@ -151,7 +224,8 @@ class CommandsCog(commands.Cog):
 
         # Lista de datos tal cual la pediste
         embed.description = (
-            f"🔶  **Estadísticas entre {user1.display_name} y {user2.display_name}:**\n\n"
+            f"🔶  **Estadísticas entre {user1.display_name} y {user2.display_name}"
+            f"{f' ({periodo.name.lower()})' if periodo else ''}:**\n\n"
             f"• **Tiempo compartido en llamada:** `{time_str}`\n"
             f"• **Llamadas totales:** {total_calls}\n"
             f"• **Veces que {user1.display_name} se unió a {user2.display_name}:** {calls_u1_to_u2}\n"
@@ -164,83 +238,213 @@ class CommandsCog(commands.Cog):
         name="datos_totales_llamada",
         description="Muestra estadísticas completas de llamadas de un usuario con tiempos totales.",
     )
+    @app_commands.describe(periodo="Periodo a consultar (por defecto, desde siempre)")
+    @app_commands.choices(periodo=PERIOD_CHOICES)
     async def all_call_stats(
-        self, interaction: discord.Interaction, member: discord.Member = None
+        self,
+        interaction: discord.Interaction,
+        member: discord.Member = None,
+        periodo: app_commands.Choice[str] = None,
     ):
         await interaction.response.defer()
 
         guild = interaction.guild
-        call_data = load_json(get_data_path(guild, "stats.json"))
+        state = await self.bot.guild_store.get(guild)
 
         member = member or interaction.user
         mid = str(member.id)
+        since = period_start(periodo.value) if periodo else None
+        since_dt = self._since_dt(since)
 
         # --- 1. Obtener Estadísticas Generales (NUEVO) ---
-        my_data = call_data.get(mid, {})
-        solo_time = my_data.get("total_solo_time", 0)
-        dep_attempts = my_data.get("depressive_attempts", 0)
-        dep_time = my_data.get(
-            "depressive_time", 0
-        )  # Tiempo total de intentos depresivos
+        summary = await self._get_user_summary(state, guild, mid, since)
+        # Incluye el periodo solo en curso
+        solo_time = summary["solo_time"] + state.sessions.solo_elapsed(
+            mid, since=since_dt
+        )
+        dep_attempts = summary["dep_attempts"]
+        dep_time = summary["dep_time"]  # Tiempo total de intentos depresivos
 
-        has_incoming = bool(my_data)
-        has_outgoing = any(mid in inner for inner in call_data.values())
+        has_incoming = summary["has_incoming"]
+        has_outgoing = summary["has_outgoing"]
 
         # El comando ahora falla solo si no hay *ningún* dato
         if not (has_incoming or has_outgoing) and not (
             solo_time > 0 or dep_attempts > 0
         ):
             return await interaction.followup.send(
-                f"No hay datos de llamada para **{member.display_name}**."
+                f"No hay datos de llamada para **{member.display_name}**"
+                f"{f' ({periodo.name.lower()})' if periodo else ''}."
             )
 
-        # --- 2. Recolección y Procesamiento de datos de Interacción (Mismo código) ---
-        internal_keys = [
-            "depressive_attempts",
-            "depressive_time",
-            "total_solo_time",
-            "opt_out_logs",
-        ]
-        uids_incoming = {k for k in my_data.keys() if k not in internal_keys}
-        uids_outgoing = {
-            k for k, v in call_data.items() if mid in v and k not in internal_keys
-        }
-        all_uids = list(uids_incoming | uids_outgoing)
-
-        stats_list = []
-        for uid in all_uids:
-            stats = await self._get_bidirectional_stats(
-                call_data, mid, uid, guild=guild
+        # Solo se calcula la clave de orden de cada pareja; las filas (y los
+        # nombres) se construyen al mostrar cada página. La lista llega ya
+        # ordenada por el tiempo guardado, así que reordenar con las sesiones
+        # en curso apenas mueve nada
+        ranked = [
+            uid
+            for uid, _ in sorted(
+                summary["partners"],
+                key=lambda item: item[1]
+                + state.sessions.shared_elapsed(mid, item[0], since=since_dt),
+                reverse=True,
             )
-            if not stats:
-                continue
-            user_obj = stats.get("user_obj")
-            name = user_obj.display_name if user_obj else f"Usuario ID: {uid}"
-
-            stats_entry = {
-                "name": name,
-                "total_seconds": stats.get("total_seconds", 0),
-                "total_calls": stats.get("total_calls", 0),
-                "calls_in": stats.get("calls_ab", 0),
-                "calls_out": stats.get("calls_ba", 0),
-            }
-            stats_list.append(stats_entry)
+        ]
 
-        stats_list.sort(key=lambda x: x["total_seconds"], reverse=True)
+        async def load_page(uids):
+            names = await self.bot.name_cache.resolve_many(guild, uids)
+            rows = []
+            for uid in uids:
+                stats = self._get_bidirectional_stats(state, mid, uid, since)
+                rows.append(
+                    {
+                        "name": names.get(uid) or f"Usuario ID: {uid}",
+                        "total_seconds": stats.get("total_seconds", 0),
+                        "total_calls": stats.get("total_calls", 0),
+                        "calls_in": stats.get("calls_ab", 0),
+                        "calls_out": stats.get("calls_ba", 0),
+                    }
+                )
+            return rows
 
         # --- 3. RESPUESTA VISUAL (ACTUALIZADO: Pasando los nuevos datos) ---
         view = UserStatsPaginator(
-            stats_list,
+            ranked,
+            load_page,
             member.display_name,
             solo_time=solo_time,
             dep_attempts=dep_attempts,
             dep_time=dep_time,
+            period_label=periodo.name.lower() if periodo else None,
         )
-        embed, _ = view.get_page_content()
+        embed, _ = await view.render_page()
 
         await interaction.followup.send(embed=embed, view=view)
         view.message = await interaction.original_response()
 
+    @app_commands.command(
+        name="ranking",
+        description="Clasificación del servidor: parejas por tiempo juntos, tiempo a solas o intentos depresivos.",
+    )
+    @app_commands.describe(tipo="Qué clasificación mostrar")
+    @app_commands.choices(
+        tipo=[
+            app_commands.Choice(name="Parejas con más tiempo juntas", value="parejas"),
+            app_commands.Choice(name="Más tiempo a solas", value="solo"),
+            app_commands.Choice(name="Más intentos depresivos", value="depresion"),
+        ]
+    )
+    async def ranking(
+        self, interaction: discord.Interaction, tipo: app_commands.Choice[str] = None
+    ):
+        await interaction.response.defer()
+
+        guild = interaction.guild
+        state = await self.bot.guild_store.get(guild)
+        kind = tipo.value if tipo else "parejas"
+        board = {
+            "parejas": state.leaderboard.pairs,
+            "solo": state.leaderboard.solo,
+            "depresion": state.leaderboard.depressive,
+        }[kind]
+
+        def visible(uid):
+            fields = state.stats.user_fields(uid)
+            return not (isinstance(fields, dict) and fields.get("opt_out_logs"))
+
+        # El top guarda el doble de puestos: margen para saltar a quien no quiere seguimiento
+        entries = [
+            (key, score)
+            for key, score in board.top(board.capacity)
+            if all(visible(uid) for uid in (key if kind == "parejas" else (key,)))
+        ][:LEADERBOARD_SIZE]
+
+        if not entries:
+            return await interaction.followup.send(
+                "Todavía no hay datos suficientes para esta clasificación."
+            )
+
+        uids = [
+            uid for key, _ in entries for uid in (key if kind == "parejas" else (key,))
+        ]
+        names = await self.bot.name_cache.resolve_many(guild, uids)
+
+        def name(uid):
+            return names.get(uid) or f"Usuario ID: {uid}"
+
+        lines = []
+        for rank, (key, score) in enumerate(entries, start=1):
+            icon = {1: "🥇", 2: "🥈", 3: "🥉"}.get(rank, f"`#{rank}`")
+            if kind == "parejas":
+                lines.append(
+                    f"{icon} **{name(key[0])}** y **{name(key[1])}** • `{self.fmt_time(score)}`"
+                )
+            elif kind == "solo":
+                lines.append(f"{icon} **{name(key)}** • `{self.fmt_time(score)}`")
+            else:
+                lines.append(f"{icon} **{name(key)}** • {self.fmt_count(score)}")
+
+        titles = {
+            "parejas": "👥 Parejas con más tiempo en llamada",
+            "solo": "🧍 Más tiempo a solas en llamada",
+            "depresion": "🌧️ Más intentos depresivos",
+        }
+        embed = discord.Embed(
+            title=f"🏆 Ranking de {guild.name}",
+            description=f"**{titles[kind]}**\n\n" + "\n".join(lines),
+            color=discord.Color.gold(),
+        )
+        await interaction.followup.send(embed=embed)
+
+    @app_commands.command(
+        name="ocupacion",
+        description="Muestra la ocupación actual, máxima y media de los canales de voz.",
+    )
+    @app_commands.describe(
+        canal="Canal de voz concreto (por defecto, todos los del servidor)",
+        minutos="Ventana de tiempo en minutos (por defecto, 60)",
+    )
+    async def occupancy(
+        self,
+        interaction: discord.Interaction,
+        canal: discord.VoiceChannel = None,
+        minutos: app_commands.Range[int, 1, OCCUPANCY_MINUTES] = 60,
+    ):
+        voice_cog = self.bot.get_cog("VoiceCog")
+        channels = [canal] if canal else interaction.guild.voice_channels
+
+        rows = []
+        for channel in channels:
+            summary = voice_cog.occupancy.summary(channel.id, minutos)
+            if summary:
+                rows.append((channel, summary))
+
+        if not rows:
+            await interaction.response.send_message(
+                "No hay datos de ocupación para esos canales todavía.", ephemeral=True
+            )
+            return
+
+        rows.sort(key=lambda row: (row[1]["peak"], row[1]["avg"]), reverse=True)
+        lines = []
+        for channel, summary in rows[:15]:
+            peak_at = (
+                datetime.fromtimestamp(summary["peak_at"]).strftime("%H:%M")
+                if summary["peak_at"] is not None
+                else "-"
+            )
+            lines.append(
+                f"🔊 **{channel.name}**: ahora {summary['current']} · "
+                f"máx. {summary['peak']} ({peak_at}) · media {summary['avg']:.1f}"
+            )
+
+        embed = discord.Embed(
+            title=f"📈 Ocupación de voz (últimos {minutos} min)",
+            description="\n".join(lines),
+            color=discord.Color.blurple(),
+        )
+        await interaction.response.send_message(embed=embed)
+
     @app_commands.command(
         name="descargar_json",
         description="Envía los archivos stats.json y dates.json del servidor (solo admin).",
@@ -256,16 +460,17 @@ class CommandsCog(commands.Cog):
             )
             return
 
+        # Los archivos se generan al momento desde el estado residente
+        state = await self.bot.guild_store.get(guild)
         files = []
-        # Nota: Aquí mantenemos os.path.join porque necesitamos la ruta absoluta para discord.File
-        # get_data_path devuelve ruta relativa, usamos os.path.join para absoluta/sistema.
         for filename in ["stats.json", "dates.json"]:
-            path = os.path.join(self.data_dir, str(guild.id), filename)
+            data = state.export(filename)
 
-            if os.path.exists(path):
-                files.append(discord.File(path))
+            if data:
+                raw = json.dumps(data, indent=4, sort_keys=True).encode("utf-8")
+                files.append(discord.File(io.BytesIO(raw), filename=filename))
             else:
-                print(f"[WARN] No se encontró {path}.")
+                print(f"[WARN] No hay datos de {filename} en {guild.id}.")
 
         if files:
             await interaction.response.send_message(
@@ -326,7 +531,9 @@ class CommandsCog(commands.Cog):
         guild_id = interaction.guild.id
 
         # Generamos la UI inicial centralizada, delegando la lógica visual
-        embed, view = generate_settings_interface(guild_id, user_id)
+        embed, view = await generate_settings_interface(
+            self.bot.guild_store, guild_id, user_id
+        )
 
         await interaction.response.send_message(embed=embed, view=view, ephemeral=False)
 
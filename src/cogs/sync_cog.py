@@ -5,9 +5,7 @@ import asyncio
 from datetime import datetime, timedelta
 from discord.ext import commands, tasks
 from discord import app_commands, Interaction
-from src.config import RAIZ_PROYECTO
-from src.utils.data_handler import load_json
-from src.utils.helpers import get_data_path, send_to_fastapi, sync_all_guilds
+from src.utils.helpers import sync_all_guilds
 
 
 class SyncCog(commands.Cog):
@@ -28,17 +26,16 @@ class SyncCog(commands.Cog):
 
     @tasks.loop(hours=48)
     async def flush_task(self):
-        """Loop automático: cada 48h envía los stats de cada servidor si existen."""
+        """Loop automático: cada 48h envía los cambios de stats de cada servidor si existen."""
         print("Iniciada copia de seguridad.")
-        for guild in self.bot.guilds:
-            print(
-                f"\033[33m[SyncCog] Ejecutando volcado automático de stats para servidor {guild}...\033[0m"
-            )
-            gid = str(guild.id)
-            stats_path = RAIZ_PROYECTO / "data" / gid / "stats.json"
-            if stats_path.exists():
-                call_data = load_json(get_data_path(gid, "stats.json"))
-                await send_to_fastapi(call_data, guild_id=guild)
+        print(
+            f"\033[33m[SyncCog] Ejecutando volcado automático de stats para {len(self.bot.guilds)} servidores...\033[0m"
+        )
+        report = await sync_all_guilds(self.bot, force=True)
+        print(
+            f"\033[33m[SyncCog] Volcado automático: {report['sent']} servidores sincronizados, "
+            f"{len(report['failed'])} con error.\033[0m"
+        )
 
         self.next_flush_at = datetime.utcnow() + timedelta(hours=48)
 
@@ -95,9 +92,11 @@ class SyncCog(commands.Cog):
         print("Volcado de bases de datos llamada.")
         await interaction.response.defer(ephemeral=True)
 
-        sent = await sync_all_guilds(self.bot, force=True)
+        report = await sync_all_guilds(self.bot, force=True)
 
-        msg = f"✅ Volcado manual completado — Servidores sincronizados: {sent}."
+        msg = f"✅ Volcado manual completado — Servidores sincronizados: {report['sent']}."
+        if report["failed"]:
+            msg += f" Con error: {', '.join(report['failed'])}."
 
         await interaction.followup.send(msg, ephemeral=True)
 
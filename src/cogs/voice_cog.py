@@ -1,19 +1,38 @@
 # src/cogs/voice_cog.py
 import asyncio
+import time
+from datetime import datetime
 
 import discord
-from src.utils.data_handler import load_json, save_json
 from discord.ext import commands
 from src.utils.helpers import (
-    handle_call_data,
-    save_time,
-    calculate_total_time,
-    update_channel_history,
-    timer_task,
+    depressive_timer_expired,
     check_depressive_attempts,
-    get_data_path,
 )
-from datetime import datetime
+from src.utils.occupancy import OccupancyTracker
+from src.utils.solo_timers import SoloTimers
+
+
+def _at(ts) -> dict:
+    """Campos para fijar la hora de una operación (None = ahora)."""
+    return {} if ts is None else {"ts": ts}
+
+
+def _latest(*stamps):
+    """La marca ISO más reciente de las dadas (None si no hay ninguna)."""
+    stamps = [ts for ts in stamps if ts]
+    return max(stamps, key=datetime.fromisoformat, default=None)
+
+
+def _closing_time(last_seen, start):
+    """
+    Hora a la que se cierra en la reconciliación algo abierto desde `start`:
+    la última en que se sabe que el bot seguía vivo (latido o checkpoint),
+    pero nunca antes del propio inicio. None = ahora.
+    """
+    if last_seen is None:
+        return None
+    return _latest(last_seen, start)
 
 
 class VoiceCog(commands.Cog):
@@ -22,8 +41,11 @@ class VoiceCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.timeout = 600
-        self.timers = {}
-        self.historiales_por_canal = {}
+        # Plazos de depresión de los usuarios solos (persistidos en data/timers.json)
+        self.timers = SoloTimers()
+        self._reconciled = False
+        # Ocupación de cada canal de voz (consultada con /ocupacion)
+        self.occupancy = OccupancyTracker()
         self.is_depressed = {}
         self.recorded_attempts = {}
 
@@ -58,10 +80,229 @@ class VoiceCog(commands.Cog):
         except Exception as e:
             print(f"Error en voice_update: {e}")
 
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # on_ready se repite en cada reconexión; el arranque solo se reconcilia una vez
+        if self._reconciled:
+            return
+        self._reconciled = True
+        await self.restore_timers()
+        await self.reconcile_voice_states()
+
+    async def restore_timers(self):
+        """
+        Rearma los plazos guardados en data/timers.json con el tiempo que les
+        quedaba. Solo se cargan los servidores que aparecen en el archivo.
+        """
+        started = time.perf_counter()
+        saved = await self.timers.load()
+        by_guild = {}
+        for uid, entry in saved.items():
+            by_guild.setdefault(entry["g"], []).append((uid, entry))
+
+        results = await asyncio.gather(
+            *(
+                self._restore_guild_timers(gid, items)
+                for gid, items in by_guild.items()
+            ),
+            return_exceptions=True,
+        )
+        for gid, result in zip(by_guild, results):
+            if isinstance(result, Exception):
+                print(
+                    f"\033[31m[TIMERS] Error restaurando temporizadores del servidor {gid}: {result}\033[0m"
+                )
+
+        await self.timers.save()
+        if saved:
+            print(
+                f"\033[32m[TIMERS] {len(self.timers.entries)}/{len(saved)} temporizador(es) "
+                f"restaurados en {(time.perf_counter() - started) * 1000:.1f} ms.\033[0m"
+            )
+
+    async def _restore_guild_timers(self, gid: str, items: list):
+        guild = self.bot.get_guild(int(gid))
+        if guild is None:
+            return
+        state = await self.bot.guild_store.get(guild)
+        await state.actor.run(self._rearm_timers, guild, items, state)
+
+    def _rearm_timers(self, guild: discord.Guild, items: list, state):
+        """Trabajo del actor: rearma los plazos de quienes siguen solos en su canal."""
+        for uid, entry in items:
+            if uid in self.timers:
+                continue  # Ya rearmado por un evento posterior al arranque
+            member = guild.get_member(int(uid))
+            channel = getattr(getattr(member, "voice", None), "channel", None)
+            alone = (
+                channel is not None
+                and channel.id == entry["c"]
+                and len(channel.members) == 1
+                and not state.stats.get(uid, {}).get("opt_out_logs", False)
+            )
+            marked = "_solo_depressive_start" in state.dates.get(uid, {})
+
+            if alone and marked:
+                # El plazo ya había vencido: se conserva la marca de depresión
+                self.is_depressed[uid] = True
+                self.timers.restore(uid, entry)
+            elif alone:
+                self.timers.restore(
+                    uid,
+                    entry,
+                    state.actor.post,
+                    depressive_timer_expired,
+                    member,
+                    self.is_depressed,
+                    state,
+                )
+            # Si ya no está solo, la reconciliación cierra su marca de depresión
+
+    async def reconcile_voice_states(self):
+        """
+        Ajusta el estado de todos los servidores a quién está ahora mismo en
+        cada canal de voz (caché del gateway), en paralelo entre servidores.
+        """
+        started = time.perf_counter()
+        results = await asyncio.gather(
+            *(self.reconcile_guild(guild) for guild in self.bot.guilds),
+            return_exceptions=True,
+        )
+
+        totals = {"opened": 0, "closed": 0, "solo": 0}
+        for guild, result in zip(self.bot.guilds, results):
+            if isinstance(result, Exception):
+                print(
+                    f"\033[31m[RECONCILE] Error en {guild.name} ({guild.id}): {result}\033[0m"
+                )
+                continue
+            for key in totals:
+                totals[key] += result[key]
+
+        print(
+            f"\033[32m[RECONCILE] {len(results)} servidor(es) reconciliados en "
+            f"{(time.perf_counter() - started) * 1000:.1f} ms: {totals['opened']} sesiones abiertas, "
+            f"{totals['closed']} cerradas, {totals['solo']} usuarios solos.\033[0m"
+        )
+
+    async def reconcile_guild(self, guild: discord.Guild) -> dict:
+        """Reconcilia un servidor (ver _reconcile_guild)."""
+        store = self.bot.guild_store
+        state = await store.get(guild)
+        for channel in guild.voice_channels:
+            if channel.members:
+                self.occupancy.record(channel.id, len(channel.members))
+        # Lo más reciente entre el latido global y el checkpoint del servidor
+        last_seen = _latest(store.last_heartbeat, state.last_checkpoint.get("ts"))
+        if last_seen is None and state.sessions.pairs:
+            print(
+                f"\033[33m[RECONCILE][WARN] {guild.name}: sin latido ni checkpoint previo, las sesiones colgadas se cierran ahora.\033[0m"
+            )
+        return await state.actor.run(self._reconcile_guild, guild, state, last_seen)
+
+    @commands.Cog.listener()
+    async def on_guild_available(self, guild: discord.Guild):
+        # Servidor que vuelve tras una caída de Discord (o que no estaba en on_ready)
+        if self._reconciled:
+            await self.reconcile_guild(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_join(self, guild: discord.Guild):
+        await self.reconcile_guild(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        # Canales temporales: su ocupación no se vuelve a consultar
+        self.occupancy.forget(channel.id)
+
+    def _reconcile_guild(self, guild: discord.Guild, state, heartbeat) -> dict:
+        """
+        Trabajo del actor:
+        - abre las sesiones de pareja de quienes comparten canal y no la tenían;
+        - cierra a la hora del último latido las sesiones, periodos solo y
+          marcas de depresión de quienes ya no están en esa situación;
+        - abre el periodo solo (y su temporizador) de quien está solo.
+        Desde aquí las sesiones abiertas del servidor son reales y ya se
+        pueden guardar sus checkpoints.
+        """
+        stats, dates = state.stats, state.dates
+
+        def tracked(uid):
+            return not stats.get(uid, {}).get("opt_out_logs", False)
+
+        members, channel_size = {}, {}
+        wanted = {}  # {frozenset(a, b): (a, b)} con a el último en llegar
+        for channel in guild.voice_channels:
+            ids = []
+            for m in channel.members:
+                uid = str(m.id)
+                members[uid] = m
+                channel_size[uid] = len(channel.members)
+                if tracked(uid):
+                    for other in ids:
+                        wanted[frozenset((uid, other))] = (uid, other)
+                    ids.append(uid)
+
+        open_pairs = {}
+        solo_open, depressive_open = [], []
+        for uid, entry in dates.items():
+            if not isinstance(entry, dict):
+                continue
+            for other, value in entry.items():
+                if isinstance(value, dict) and value.get("entries"):
+                    last = value["entries"][-1]
+                    if last["end_time"] is None:
+                        open_pairs[frozenset((uid, other))] = last["start_time"]
+            if entry.get("_solo_total_start"):
+                solo_open.append((uid, entry["_solo_total_start"]))
+            if entry.get("_solo_depressive_start"):
+                depressive_open.append((uid, entry["_solo_depressive_start"]))
+
+        # Las parejas se agrupan por usuario (y hora de cierre) en una operación cada grupo
+        result = {"opened": 0, "closed": 0, "solo": 0}
+        closing, opening = {}, {}
+        for pair, start in open_pairs.items():
+            if pair not in wanted:
+                a, b = sorted(pair)
+                closing.setdefault((a, _closing_time(heartbeat, start)), []).append(b)
+                result["closed"] += 1
+        for pair, (a, b) in wanted.items():
+            if pair not in open_pairs:
+                opening.setdefault(a, []).append(b)
+                result["opened"] += 1
+        for (a, ts), bs in closing.items():
+            state.record("leave", a=a, bs=bs, **_at(ts))
+        for a, bs in opening.items():
+            state.record("join", a=a, bs=bs)
+
+        for uid, start in depressive_open:
+            if channel_size.get(uid) != 1:
+                state.record(
+                    "depressive_end", uid=uid, **_at(_closing_time(heartbeat, start))
+                )
+        for uid, start in solo_open:
+            if channel_size.get(uid) != 1:
+                state.record(
+                    "solo_end", uid=uid, **_at(_closing_time(heartbeat, start))
+                )
+
+        for uid, member in members.items():
+            if channel_size[uid] != 1 or not tracked(uid):
+                continue
+            result["solo"] += 1
+            self._start_total_solo(state, member)
+            if "_solo_depressive_start" in dates.get(uid, {}):
+                self.is_depressed[uid] = True
+            else:
+                self.start_timer(member, state)
+
+        state.sessions_verified = True
+        return result
+
     async def member_joined(self, member: discord.Member, after: discord.VoiceState):
         """Maneja la entrada de un miembro a un canal de voz."""
 
-        update_channel_history(self.historiales_por_canal, after.channel.id, 1)
+        self.occupancy.record(after.channel.id, len(after.channel.members))
 
         print(
             f"\033[92m[{member.guild.name}] {member.display_name} se ha unido a {after.channel.name}. "
@@ -69,9 +310,18 @@ class VoiceCog(commands.Cog):
             f"{', '.join(m.display_name for m in after.channel.members)}.\033[0m"
         )
 
-        guild = member.guild
-        stats = load_json(get_data_path(guild, "stats.json"))
-        time_entries = load_json(get_data_path(guild, "dates.json"))
+        state = await self.bot.guild_store.get(member.guild)
+        # Las mutaciones del servidor se ejecutan en orden en su actor
+        await state.actor.run(self._joined, member, after, state)
+
+    async def _joined(
+        self,
+        member: discord.Member,
+        after: discord.VoiceState,
+        state,
+    ):
+        """Trabajo del actor del servidor para member_joined."""
+        stats = state.stats
 
         # Se desmarcan flags de depresión y se comprueba si usuario no quiere seguimiento
         mid = str(member.id)
@@ -81,15 +331,15 @@ class VoiceCog(commands.Cog):
         if self.is_depressed.get(mid, False):
             self.is_depressed[mid] = False
             self.recorded_attempts.pop(mid, None)
-        self._clear_solo_depressive(mid, time_entries)
+        self._clear_solo_depressive(mid, state)
 
         num_members = len(after.channel.members)
-        stats_changed = False
 
         # Canal con ≥2 miembros
         if num_members >= 2:
+            self.cancel_timers(member.guild, after.channel.members)
+            partners = []
             for m in after.channel.members:
-                await self.cancel_timer(m)
                 self.is_depressed[str(m.id)] = False
                 self.recorded_attempts.pop(str(m.id), None)
 
@@ -97,72 +347,72 @@ class VoiceCog(commands.Cog):
                 m_stats = stats.get(str(m.id), {})
                 m_opted_out = m_stats.get("opt_out_logs", False)
 
-                if not m_opted_out:  # Solo cerramos solo_time del otro si acepta logs
-                    elapsed = self._end_total_solo(time_entries, stats, m)
-                    if elapsed:
-                        stats_changed = True
+                # Solo cerramos solo_time del otro si acepta logs
+                if not m_opted_out:
+                    self._end_total_solo(state, m)
 
                 if m != member:
                     if (
                         not opted_out and not m_opted_out
                     ):  # Solo guardamos si AMBOS aceptan logs
-                        handle_call_data(stats, member, m)
-                        save_time(time_entries, member, m, True)
+                        partners.append(str(m.id))
+
+            # Todas las parejas del evento en una sola operación
+            if partners:
+                state.record("join", a=mid, bs=partners)
 
         # Canal con 1 miembro (queda solo)
         elif num_members == 1 and not opted_out:
             # Registrar inicio de tiempo total solo en dates.json
-            if self._start_total_solo(time_entries, member):
-                stats_changed = True
+            self._start_total_solo(state, member)
 
             # Iniciar temporizador de depresión
-            self.start_timer(member, time_entries)
+            self.start_timer(member, state)
 
         else:
             pass
 
-        # Guardamos dates y stats.json
-        if stats_changed:
-            path_stats = get_data_path(guild, "stats.json")
-            save_json(path_stats, stats)
-        path_dates = get_data_path(guild, "dates.json")
-        save_json(path_dates, time_entries)
-
     async def member_left(self, member: discord.Member, before: discord.VoiceState):
-        update_channel_history(self.historiales_por_canal, before.channel.id, -1)
+        self.occupancy.record(before.channel.id, len(before.channel.members))
         print(
             f"\033[91m[{member.guild.name}] {member.display_name} ha salido de {before.channel.name}. "
             f"Ahora quedan {len(before.channel.members)} miembros: {', '.join(m.display_name for m in before.channel.members)}\033[0m"
         )
 
-        guild = member.guild
-        stats = load_json(get_data_path(guild, "stats.json"))
-        time_entries = load_json(get_data_path(guild, "dates.json"))
+        state = await self.bot.guild_store.get(member.guild)
+        # Las mutaciones del servidor se ejecutan en orden en su actor
+        await state.actor.run(self._left, member, before, state)
+
+    async def _left(
+        self,
+        member: discord.Member,
+        before: discord.VoiceState,
+        state,
+    ):
+        """Trabajo del actor del servidor para member_left."""
+        stats = state.stats
         mid = str(member.id)
 
         # Comprobamos opt_out del usuario que se va
         user_stats = stats.get(mid, {})
         opted_out = user_stats.get("opt_out_logs", False)
 
-        stats_changed = False
-
         member_flag = self.is_depressed.get(mid, False)
         member_flag_dict = {mid: member_flag}
 
-        await self.cancel_timer(member)
+        self.cancel_timer(member)
 
         if not member_flag:
             self.is_depressed[mid] = False
 
         if not opted_out:
             check_depressive_attempts(
-                member, member_flag_dict, stats, self.recorded_attempts, time_entries
+                member, member_flag_dict, state, self.recorded_attempts
             )
-            elapsed = self._end_total_solo(time_entries, stats, member)
-            if elapsed:
-                stats_changed = True
+            self._end_total_solo(state, member)
 
         updated_users = []
+        partners = []
 
         for m in before.channel.members:
             updated_users.append(m.display_name)
@@ -175,8 +425,10 @@ class VoiceCog(commands.Cog):
                 if (
                     not opted_out and not m_opted_out
                 ):  # Solo guardamos si AMBOS aceptan logs
-                    save_time(time_entries, member, m, False)
-                    calculate_total_time(time_entries, stats, member, m)
+                    partners.append(str(m.id))
+
+        if partners:
+            state.record("leave", a=mid, bs=partners)
 
         if len(before.channel.members) == 1:
             remaining = before.channel.members[0]
@@ -187,24 +439,16 @@ class VoiceCog(commands.Cog):
 
             # Registrar inicio de tiempo total solo
             if not rem_opted_out:
-                if self._start_total_solo(time_entries, remaining):
-                    stats_changed = True
+                self._start_total_solo(state, remaining)
 
             # Iniciar temporizador de depresión (TODO: puede ser interesante en futuro)
-            # self.start_timer(remaining, time_entries)
+            # self.start_timer(remaining, state)
 
         if updated_users:
             print(
                 f"[{member.guild.name}] Actualizado el tiempo con los usuarios: {', '.join(updated_users)}"
             )
 
-        # Guardamos dates y stats.json
-        if stats_changed:
-            path_stats = get_data_path(guild, "stats.json")
-            save_json(path_stats, stats)
-        path_dates = get_data_path(guild, "dates.json")
-        save_json(path_dates, time_entries)
-
     async def member_moved(
         self,
         member: discord.Member,
@@ -213,8 +457,8 @@ class VoiceCog(commands.Cog):
     ):
         """Maneja cuando un usuario se mueve de un canal a otro."""
 
-        update_channel_history(self.historiales_por_canal, before.channel.id, -1)
-        update_channel_history(self.historiales_por_canal, after.channel.id, 1)
+        self.occupancy.record(before.channel.id, len(before.channel.members))
+        self.occupancy.record(after.channel.id, len(after.channel.members))
 
         num_after = len(after.channel.members)
         num_before = len(before.channel.members)
@@ -225,45 +469,58 @@ class VoiceCog(commands.Cog):
             f"Ahora hay {num_after} miembros: {', '.join(m.display_name for m in after.channel.members)}."
         )
 
-        guild = member.guild
-        stats = load_json(get_data_path(guild, "stats.json"))
-        time_entries = load_json(get_data_path(guild, "dates.json"))
+        state = await self.bot.guild_store.get(member.guild)
+        # Las mutaciones del servidor se ejecutan en orden en su actor
+        await state.actor.run(
+            self._moved, member, before, after, num_before, num_after, state
+        )
+
+    async def _moved(
+        self,
+        member: discord.Member,
+        before: discord.VoiceState,
+        after: discord.VoiceState,
+        num_before: int,
+        num_after: int,
+        state,
+    ):
+        """Trabajo del actor del servidor para member_moved."""
+        stats = state.stats
 
         mid = str(member.id)
         user_stats = stats.get(mid, {})
         opted_out = user_stats.get("opt_out_logs", False)
 
-        stats_changed = False
-
         # Canal destino
         if num_after >= 2:
+            self.cancel_timers(member.guild, after.channel.members)
+            partners = []
             for m in after.channel.members:
                 midm = str(m.id)
                 self.is_depressed[midm] = False
                 self.recorded_attempts.pop(midm, None)
-                await self.cancel_timer(m)
 
                 m_stats = stats.get(midm, {})
                 m_opted_out = m_stats.get("opt_out_logs", False)
 
                 if not m_opted_out:
-                    elapsed = self._end_total_solo(time_entries, stats, m)
-                    if elapsed:
-                        stats_changed = True
+                    self._end_total_solo(state, m)
 
                 if m != member:
                     if not opted_out and not m_opted_out:
-                        save_time(time_entries, member, m, True)
-                        handle_call_data(stats, member, m)
+                        partners.append(midm)
+
+            if partners:
+                state.record("join", a=mid, bs=partners)
 
         elif num_after == 1:
             if not opted_out:
-                if self._start_total_solo(time_entries, member):
-                    stats_changed = True
-                self.start_timer(member, time_entries)
+                self._start_total_solo(state, member)
+                self.start_timer(member, state)
 
         # Canal origen
         if num_before >= 2:
+            partners = []
             for m in before.channel.members:
                 print(f"Actualizando estadísticas para {member} con {m}")
 
@@ -273,9 +530,10 @@ class VoiceCog(commands.Cog):
 
                 if m != member:
                     if not opted_out and not m_opted_out:
-                        save_time(time_entries, member, m, False)
-                        handle_call_data(stats, member, m)
-                        calculate_total_time(time_entries, stats, member, m)
+                        partners.append(str(m.id))
+
+            if partners:
+                state.record("move", a=mid, bs=partners)
 
         elif num_before == 1:
             remaining_member = before.channel.members[0]
@@ -284,14 +542,12 @@ class VoiceCog(commands.Cog):
             rem_opted_out = rem_stats.get("opt_out_logs", False)
 
             if not rem_opted_out:
-                if self._start_total_solo(time_entries, remaining_member):
-                    stats_changed = True
+                self._start_total_solo(state, remaining_member)
 
-                self.start_timer(remaining_member, time_entries)
+                self.start_timer(remaining_member, state)
 
             if not opted_out and not rem_opted_out:
-                save_time(time_entries, member, remaining_member, False)
-                calculate_total_time(time_entries, stats, member, remaining_member)
+                state.record("leave", a=mid, bs=[str(remaining_member.id)])
                 print(
                     f"Actualizado el tiempo con el usuario: {remaining_member.display_name}"
                 )
@@ -299,109 +555,61 @@ class VoiceCog(commands.Cog):
         else:
             pass
 
-        # Guardamos dates y stats.json
-        if stats_changed:
-            path_stats = get_data_path(guild, "stats.json")
-            save_json(path_stats, stats)
-        path_dates = get_data_path(guild, "dates.json")
-        save_json(path_dates, time_entries)
-
-    def start_timer(self, member: discord.Member, time_entries):
-        mid = str(member.id)
-        if mid in self.timers:
-            return
-
-        task = asyncio.create_task(
-            timer_task(
-                member,
-                self.is_depressed,
-                self.timeout,
-                time_entries,
-            )
-        )
-        self.timers[mid] = task
-        print(
-            f"\033[93m[{member.guild.name}] Temporizador iniciado para marcar a {member.display_name} con depresión.\033[0m"
+    def start_timer(self, member: discord.Member, state):
+        """Programa el plazo tras el que se marca a member con depresión si sigue solo."""
+        scheduled = self.timers.arm(
+            str(member.id),
+            member.guild.id,
+            getattr(member.voice.channel, "id", None),
+            self.timeout,
+            state.actor.post,
+            depressive_timer_expired,
+            member,
+            self.is_depressed,
+            state,
         )
+        if scheduled:
+            print(
+                f"\033[93m[{member.guild.name}] Temporizador iniciado para marcar a {member.display_name} con depresión.\033[0m"
+            )
 
     # Helpers
-    def _ensure_user_stats(self, stats, mid):
-        """Asegura que exista la entrada stats[mid]."""
-        if mid not in stats:
-            stats[mid] = {}
-
-    def _start_total_solo(self, time_entries, member):
-        """
-        Marca el inicio del periodo 'total solo' para member en dates.json (time_entries).
-        """
-        mid = str(member.id)
-        if mid not in time_entries:
-            time_entries[mid] = {}
-
-        if not time_entries[mid].get("_solo_total_start"):
-            time_entries[mid]["_solo_total_start"] = datetime.now().isoformat()
-            time_entries[mid]["_solo_total_channel"] = getattr(
-                member.voice.channel, "id", None
-            )
-            return True
+    def _start_total_solo(self, state, member):
+        """Abre el periodo 'total solo' de member (ver helpers.start_total_solo)."""
+        return state.record(
+            "solo_start",
+            uid=str(member.id),
+            channel=getattr(member.voice.channel, "id", None),
+        )
 
-        return False
+    def _end_total_solo(self, state, member: discord.Member):
+        """Cierra el periodo 'total solo' de member y suma el tiempo en stats."""
+        return state.record("solo_end", uid=str(member.id))
 
-    def _end_total_solo(self, time_entries, stats, member: discord.Member):
+    def _clear_solo_depressive(self, user_id, state):
         """
-        Cierra el periodo 'total solo' leyendo de dates.json (time_entries)
-        y suma el resultado en stats.json (stats).
+        Limpia los marcadores de depresión de un usuario si ya no está solo.
         """
-        mid = str(member.id)
-        start_iso = time_entries.get(mid, {}).get("_solo_total_start")
-
-        if start_iso:
-            try:
-                start_dt = datetime.fromisoformat(start_iso)
-            except Exception:
-                time_entries[mid]["_solo_total_start"] = None
-                return 0
+        return state.record("depressive_clear", uid=str(user_id))
 
-            elapsed = (datetime.now() - start_dt).total_seconds()
-
-            self._ensure_user_stats(stats, mid)
-
-            stats[mid]["total_solo_time"] = (
-                stats[mid].get("total_solo_time", 0) + elapsed
+    def cancel_timer(self, member: discord.Member):
+        """Cancela el temporizador activo de un usuario, si lo tiene."""
+        remaining = self.timers.cancel(str(member.id))
+        if remaining:
+            print(
+                f"\033[93m[{member.guild.name}] Temporizador cancelado para {member.display_name} antes de deprimirse (quedaban {remaining:.0f}s).\033[0m"
             )
 
-            time_entries[mid].pop("_solo_total_start", None)
-            time_entries[mid].pop("_solo_total_channel", None)
-
-            return elapsed
-
-        return 0
+    def cancel_timers(self, guild: discord.Guild, members):
+        """Cancela de una vez los temporizadores de varios usuarios (canal que se llena)."""
+        cancelled = self.timers.cancel_many(str(m.id) for m in members)
+        if any(cancelled.values()):
+            print(
+                f"\033[93m[{guild.name}] {sum(1 for r in cancelled.values() if r)} temporizador(es) cancelado(s) al llenarse el canal.\033[0m"
+            )
 
-    def _clear_solo_depressive(self, user_id, time_entries):
-        """
-        Limpia los marcadores de depresión de un usuario si ya no está solo.
-        """
-        entry = time_entries.get(str(user_id))
-        if entry:
-            entry.pop("_solo_depressive_start", None)
-            entry.pop("_solo_depressive_channel_id", None)
-            if not entry:
-                time_entries.pop(str(user_id))
-
-    async def cancel_timer(self, member: discord.Member):
-        """Cancela y elimina un temporizador activo para un usuario si existe, esperando a que termine la tarea."""
-        mid = str(member.id)
-        task = self.timers.pop(mid, None)
-        if task:
-            task.cancel()
-            try:
-                await task
-            except asyncio.CancelledError:
-                pass
-            except Exception as e:
-                print(
-                    f"\033[91mError al cancelar temporizador de {member.display_name}: {e}\033[0m"
-                )
+    async def cog_unload(self):
+        await self.timers.close()
 
 
 async def setup(bot: commands.Bot):
@@ -1,5 +1,84 @@
 # src/config.py
+import os
 from pathlib import Path
 
+from dotenv import load_dotenv
+
 # Raíz del proyecto (carpeta donde está main.py y webserver.py)
 RAIZ_PROYECTO = Path(__file__).resolve().parents[1]
+
+load_dotenv()
+
+# ========= Estado residente por servidor =========
+# Backend de almacenamiento local: "json" (snapshot + diario) o "sqlite" (sin diario:
+# una caída pierde lo que no se haya volcado según FLUSH_INTERVAL/FLUSH_DIRTY_THRESHOLD)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json").lower()
+# Cada cuántos segundos se escriben (con fsync) los diarios con operaciones pendientes
+FLUSH_INTERVAL = float(os.getenv("FLUSH_INTERVAL", 5))
+# Nº de operaciones pendientes en un servidor que fuerzan una escritura anticipada
+FLUSH_DIRTY_THRESHOLD = int(os.getenv("FLUSH_DIRTY_THRESHOLD", 200))
+# Nº de operaciones en el diario a partir del cual se compacta en snapshot.json
+JOURNAL_COMPACT_EVERY = int(os.getenv("JOURNAL_COMPACT_EVERY", 5000))
+# Servidores (IDs separados por comas, o "*") cuyo snapshot se guarda en formato
+# binario compacto (snapshot.bin) en lugar de snapshot.json
+BINARY_SNAPSHOT_GUILDS = {
+    gid.strip()
+    for gid in os.getenv("BINARY_SNAPSHOT_GUILDS", "").split(",")
+    if gid.strip()
+}
+# Cada cuántos segundos se guarda el latido (data/heartbeat.json) con el que, al
+# arrancar, se cierran las sesiones que quedaron abiertas por una caída
+HEARTBEAT_INTERVAL = float(os.getenv("HEARTBEAT_INTERVAL", 60))
+# Cada cuántos segundos se guarda el checkpoint de las sesiones abiertas de cada
+# servidor (data/<gid>/checkpoint.json): es la pérdida máxima de tiempo en llamada
+# si el proceso muere a mitad de una sesión
+CHECKPOINT_INTERVAL = float(os.getenv("CHECKPOINT_INTERVAL", 30))
+# Máximo de checkpoints escritos por ronda (0 = sin límite); los servidores que no
+# entran se escriben en la siguiente ronda, empezando por los más atrasados
+CHECKPOINT_MAX_WRITES = int(os.getenv("CHECKPOINT_MAX_WRITES", 0))
+# Hilos del pool que serializa y escribe en disco fuera del event loop
+STORAGE_IO_WORKERS = int(os.getenv("STORAGE_IO_WORKERS", 4))
+# Ocupación de canales de voz (/ocupacion): nº de cambios recientes guardados por
+# canal y nº de minutos de resúmenes (máximo y media por minuto)
+OCCUPANCY_EVENTS = int(os.getenv("OCCUPANCY_EVENTS", 512))
+OCCUPANCY_MINUTES = int(os.getenv("OCCUPANCY_MINUTES", 1440))
+# Caché de nombres visibles (bot.name_cache): nº máximo de entradas, segundos de
+# validez y nº máximo de peticiones simultáneas a la API para resolver los que faltan
+NAME_CACHE_SIZE = int(os.getenv("NAME_CACHE_SIZE", 5000))
+NAME_CACHE_TTL = float(os.getenv("NAME_CACHE_TTL", 600))
+NAME_FETCH_CONCURRENCY = int(os.getenv("NAME_FETCH_CONCURRENCY", 5))
+# Contadores por periodos (opción `periodo`): días que se guardan día a día antes
+# de pasar a semanas, y semanas que se guardan antes de pasar a meses
+ROLLUP_DAYS = int(os.getenv("ROLLUP_DAYS", 35))
+ROLLUP_WEEKS = int(os.getenv("ROLLUP_WEEKS", 13))
+# Nº de puestos que muestra /ranking (el top mantenido guarda el doble)
+LEADERBOARD_SIZE = int(os.getenv("LEADERBOARD_SIZE", 10))
+# Nº máximo de resultados de /datos_llamada y /datos_totales_llamada guardados por
+# servidor en la caché de consultas (se invalidan solos al cambiar sus usuarios)
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", 2000))
+# Cliente HTTP compartido (bot.http_pool) para FastAPI: conexiones simultáneas
+# máximas, conexiones inactivas que se mantienen abiertas y sus segundos de vida,
+# segundos de timeout por petición y si se intenta HTTP/2 (requiere httpx[http2])
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 20))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", 10))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 60))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 30))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() in ("1", "true", "yes")
+# Sincronización con FastAPI: servidores enviados a la vez, segundos máximos por
+# servidor y plazo total del volcado al apagar (debe quedar por debajo del periodo
+# de gracia con el que el contenedor espera antes de matar el proceso)
+SYNC_CONCURRENCY = int(os.getenv("SYNC_CONCURRENCY", 8))
+SYNC_GUILD_TIMEOUT = float(os.getenv("SYNC_GUILD_TIMEOUT", 20))
+SHUTDOWN_DEADLINE = float(os.getenv("SHUTDOWN_DEADLINE", 25))
+# Si hay varios servidores con cambios, se envían juntos (POST /save-json/batch)
+# en lotes de como mucho este número de servidores
+SYNC_BATCH_SIZE = int(os.getenv("SYNC_BATCH_SIZE", 50))
+# Histórico de FastAPI (webserver.py): de cada servidor se guarda el último registro
+# por hora durante HISTORY_HOURLY_HOURS horas, por día hasta HISTORY_DAILY_DAYS días
+# y por semana después; la limpieza se repite cada HISTORY_RETENTION_INTERVAL
+# segundos (0 = desactivada)
+HISTORY_HOURLY_HOURS = float(os.getenv("HISTORY_HOURLY_HOURS", 24))
+HISTORY_DAILY_DAYS = float(os.getenv("HISTORY_DAILY_DAYS", 30))
+HISTORY_RETENTION_INTERVAL = float(os.getenv("HISTORY_RETENTION_INTERVAL", 3600))
+# Profundidad de la cola del actor de un servidor a partir de la cual se avisa en el log
+ACTOR_QUEUE_WARN = int(os.getenv("ACTOR_QUEUE_WARN", 50))
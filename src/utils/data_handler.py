@@ -1,9 +1,11 @@
 # src/utils/data_handler.py
 
+import asyncio
 import json
 import os
-import aiohttp
-from src.config import RAIZ_PROYECTO
+from concurrent.futures import ThreadPoolExecutor
+
+from src.config import RAIZ_PROYECTO, STORAGE_IO_WORKERS
 
 
 # ---------------------------------------------------------
@@ -45,11 +47,57 @@ def stringify_keys(obj):
         return obj
 
 
+def apply_stats_delta(base: dict, delta: dict) -> dict:
+    """
+    Aplica sobre un stats.json (`base`) un delta de GuildState.take_sync y
+    devuelve el resultado sin modificar `base` (solo se copian las entradas
+    que cambian):
+    - "resets": usuarios borrados, cuya entrada se rehace desde cero;
+    - "users": {uid: campos propios (sin parejas) o None si ya no existe};
+    - "pairs": [[a, b, stats[a][b] o None si ya no existe]].
+    """
+    data = dict(base)
+    copied = set()
+
+    def entry(uid):
+        if uid not in copied:
+            copied.add(uid)
+            current = data.get(uid)
+            data[uid] = dict(current) if isinstance(current, dict) else {}
+        return data[uid]
+
+    for uid in delta.get("resets", []):
+        data.pop(uid, None)
+        copied.discard(uid)
+
+    for uid, fields in delta.get("users", {}).items():
+        if fields is None:
+            data.pop(uid, None)
+            copied.discard(uid)
+        elif isinstance(fields, dict):
+            entry(uid).update(fields)
+        else:
+            data[uid] = fields
+            copied.discard(uid)
+
+    for a, b, pair in delta.get("pairs", []):
+        if pair is not None:
+            entry(a)[b] = pair
+        elif isinstance(data.get(a), dict) and b in data[a]:
+            entry(a).pop(b)
+    return data
+
+
 # ---------------------------------------------------------
 # FUNCIONES DE BAJO NIVEL (Mecanismo I/O)
 # ---------------------------------------------------------
+def data_path(filename) -> str:
+    """Ruta absoluta de un archivo dentro de la carpeta data/."""
+    return os.path.join(RAIZ_PROYECTO, "data", filename)
+
+
 def load_json(filename):
-    path = os.path.join(RAIZ_PROYECTO, "data", filename)
+    path = data_path(filename)
     os.makedirs(os.path.dirname(path), exist_ok=True)
 
     if not os.path.exists(path):
@@ -63,12 +111,85 @@ def load_json(filename):
     return data
 
 
-def save_json(filename: str, data: dict):
-    path = os.path.join(RAIZ_PROYECTO, "data", filename)
+def save_json(filename: str, data: dict, pretty: bool = True):
+    """
+    Escribe el JSON de forma atómica (archivo temporal + os.replace), para que
+    un cierre brusco nunca deje el archivo a medias.
+    """
+    if pretty:
+        text = json.dumps(data, indent=4, sort_keys=True)
+    else:
+        text = json.dumps(data, separators=(",", ":"))
+    save_bytes(filename, text.encode("utf-8"))
+
+
+def load_bytes(filename):
+    """Contenido binario de un archivo de data/, o None si no existe."""
+    path = data_path(filename)
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def save_bytes(filename: str, data: bytes):
+    """Escritura atómica (archivo temporal + fsync + os.replace) de un archivo de data/."""
+    path = data_path(filename)
     os.makedirs(os.path.dirname(path), exist_ok=True)
 
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4, sort_keys=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def remove_file(filename: str):
+    """Borra un archivo de data/ si existe."""
+    try:
+        os.remove(data_path(filename))
+    except FileNotFoundError:
+        pass
+
+
+# ---------------------------------------------------------
+# E/S ASÍNCRONA (pool de hilos acotado)
+# ---------------------------------------------------------
+_io_pool = ThreadPoolExecutor(
+    max_workers=STORAGE_IO_WORKERS, thread_name_prefix="storage-io"
+)
+_io_locks = {}
+
+
+async def run_io(key: str, fn, *args):
+    """
+    Ejecuta fn(*args) en el pool de E/S sin bloquear el event loop.
+    Las llamadas con la misma `key` (normalmente la ruta o el servidor) se
+    ejecutan de una en una y en orden de llegada; claves distintas van en paralelo.
+    """
+    lock = _io_locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        future = asyncio.get_running_loop().run_in_executor(_io_pool, fn, *args)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # La operación en curso termina antes de liberar el turno de la clave
+            await asyncio.wait([future])
+            raise
+
+
+async def load_json_async(filename):
+    """Versión awaitable de load_json."""
+    return await run_io(filename, load_json, filename)
+
+
+async def save_json_async(filename: str, data: dict, pretty: bool = True):
+    """
+    Versión awaitable de save_json. La serialización ocurre en el hilo, así que
+    `data` no debe mutarse hasta que termine.
+    """
+    return await run_io(filename, save_json, filename, data, pretty)
 
 
 # ---------------------------------------------------------
@@ -78,60 +199,65 @@ async def restore_stats_per_guild(bot, port: int, api_key: str):
     """
     Al arrancar, intenta recuperar stats por cada guild desde /stats/{gid}.
     Muestra la fecha de creación del registro (timestamp) en el log.
+    No pisa el estado local si tiene operaciones que FastAPI no ha
+    confirmado (ver GuildStore.restore).
     Recibe dependencias como argumentos para evitar ciclos de importación.
+    Las peticiones van por el cliente compartido del bot (`bot.http_pool`).
     """
-    async with aiohttp.ClientSession() as session:
-        print("\033[93mRestaurando stats.json por servidor...\033[0m")
-
-        for guild in bot.guilds:
-            gid = str(guild.id)
-            stats_dir = RAIZ_PROYECTO / "data" / gid
-            stats_path = stats_dir / "stats.json"
-            stats_dir.mkdir(parents=True, exist_ok=True)
-
-            try:
-                url = f"http://localhost:{port}/stats/{gid}"
-
-                async with session.get(
-                    url, headers={"x-api-key": api_key}, timeout=150
-                ) as r:
-                    if r.status != 200:
-                        if r.status == 404:
-                            print(
-                                f"[INIT] servidor {gid}: no hay registro previo (404)."
-                            )
-                        else:
-                            print(
-                                f"[INIT] servidor {gid}: error inesperado ({r.status})."
-                            )
-                        continue
-
-                    payload = await r.json()
-
-                    if isinstance(payload, dict) and "error" not in payload:
-                        raw_date = payload.get("created_at")
-
-                        if raw_date:
-                            ts_display = str(raw_date).split(".")[0]
-                        else:
-                            ts_display = "Fecha desconocida"
-
-                        stats_data = payload.get("data", payload)
-
-                        # Usamos la función robusta definida arriba
-                        safe_data_local = stringify_keys(stats_data)
-
-                        with stats_path.open("w", encoding="utf-8") as f:
-                            json.dump(safe_data_local, f, indent=2)
-
-                        print(
-                            f"\033[32m[INIT] stats.json restaurado para {gid} "
-                            f"| Fecha BBDD: {ts_display}\033[0m"
-                        )
-                    else:
-                        print(f"\033[33m[INIT] no hay datos válidos para {gid}\033[0m")
-
-            except Exception as e:
-                print(f"\033[31m[INIT] excepción al recuperar stats {gid}: {e}\033[0m")
-
-        print("\033[93mRestauración completada.\033[0m")
+    print("\033[93mRestaurando stats.json por servidor...\033[0m")
+
+    for guild in bot.guilds:
+        gid = str(guild.id)
+
+        try:
+            url = f"http://localhost:{port}/stats/{gid}"
+
+            r = await bot.http_pool.get(
+                url, headers={"x-api-key": api_key}, timeout=150
+            )
+            if r.status_code != 200:
+                if r.status_code == 404:
+                    print(f"[INIT] servidor {gid}: no hay registro previo (404).")
+                else:
+                    print(f"[INIT] servidor {gid}: error inesperado ({r.status_code}).")
+                continue
+
+            payload = r.json()
+
+            if isinstance(payload, dict) and "error" not in payload:
+                raw_date = payload.get("created_at")
+
+                if raw_date:
+                    ts_display = str(raw_date).split(".")[0]
+                else:
+                    ts_display = "Fecha desconocida"
+
+                stats_data = payload.get("data", payload)
+
+                # Usamos la función robusta definida arriba
+                safe_data_local = stringify_keys(stats_data)
+
+                # Se sustituye el estado residente (si el local no es más
+                # reciente) y se vuelca a disco; la versión pasa a ser la base
+                # de los próximos deltas
+                restored = await bot.guild_store.restore(
+                    gid, safe_data_local, payload.get("version")
+                )
+
+                if restored:
+                    print(
+                        f"\033[32m[INIT] stats.json restaurado para {gid} "
+                        f"| Fecha BBDD: {ts_display}\033[0m"
+                    )
+                else:
+                    print(
+                        f"[INIT] servidor {gid}: el estado local ya incluye la versión "
+                        f"{payload.get('version')} de la BBDD o es más reciente; no se restaura."
+                    )
+            else:
+                print(f"\033[33m[INIT] no hay datos válidos para {gid}\033[0m")
+
+        except Exception as e:
+            print(f"\033[31m[INIT] excepción al recuperar stats {gid}: {e}\033[0m")
+
+    print("\033[93mRestauración completada.\033[0m")
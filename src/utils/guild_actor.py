@@ -0,0 +1,127 @@
+# src/utils/guild_actor.py
+# Actor por servidor: una cola asyncio y un worker que ejecuta las mutaciones en orden.
+
+import asyncio
+import inspect
+import time
+
+
+class GuildActor:
+    """
+    Serializa todas las mutaciones de un servidor.
+    Cada trabajo se encola y un único worker los ejecuta de uno en uno, de modo
+    que un evento de voz, un cambio de /ajustes o una subida de JSON nunca se
+    intercalan entre sí. Servidores distintos tienen actores distintos y
+    avanzan en paralelo.
+
+    Métricas: profundidad actual y máxima de la cola, trabajos procesados y
+    latencias de espera en cola y de ejecución.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._queue = asyncio.Queue()
+        self._worker = None
+        # Métricas
+        self.processed = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.run_total = 0.0
+        self.run_max = 0.0
+
+    @property
+    def depth(self) -> int:
+        """Trabajos en cola sin empezar."""
+        return self._queue.qsize()
+
+    def _in_worker(self) -> bool:
+        return self._worker is not None and asyncio.current_task() is self._worker
+
+    def _enqueue(self, fn, args, future):
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._work())
+        self._queue.put_nowait((fn, args, future, time.perf_counter()))
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+
+    async def run(self, fn, *args):
+        """
+        Encola fn(*args) (función o corrutina) y espera su resultado.
+        Llamado desde dentro de otro trabajo del mismo actor, se ejecuta al
+        momento para no bloquearse esperándose a sí mismo.
+        """
+        if self._in_worker():
+            return await _call(fn, args)
+
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(fn, args, future)
+        return await future
+
+    def post(self, fn, *args):
+        """Encola fn(*args) sin esperar a que termine (los errores se registran)."""
+        self._enqueue(fn, args, None)
+
+    async def _work(self):
+        while True:
+            fn, args, future, queued_at = await self._queue.get()
+            started = time.perf_counter()
+            try:
+                if future is not None and future.cancelled():
+                    continue  # Quien lo pidió ya no espera el resultado
+                result = await _call(fn, args)
+                if future is not None and not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                self.failed += 1
+                if future is not None and not future.done():
+                    future.set_exception(e)
+                else:
+                    print(f"\033[31m[ACTOR] Error en servidor {self.name}: {e}\033[0m")
+            finally:
+                finished = time.perf_counter()
+                self.processed += 1
+                self.wait_total += started - queued_at
+                self.wait_max = max(self.wait_max, started - queued_at)
+                self.run_total += finished - started
+                self.run_max = max(self.run_max, finished - started)
+                self._queue.task_done()
+
+    def metrics(self, reset: bool = False) -> dict:
+        """Resumen de las métricas; con `reset` se reinician los máximos y totales."""
+        processed = self.processed or 1
+        data = {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "processed": self.processed,
+            "failed": self.failed,
+            "avg_wait_ms": self.wait_total / processed * 1000,
+            "max_wait_ms": self.wait_max * 1000,
+            "avg_run_ms": self.run_total / processed * 1000,
+            "max_run_ms": self.run_max * 1000,
+        }
+        if reset:
+            self.processed = self.failed = 0
+            self.max_depth = self.depth
+            self.wait_total = self.wait_max = self.run_total = self.run_max = 0.0
+        return data
+
+    async def drain(self):
+        """Espera a que terminen los trabajos encolados y detiene el worker."""
+        if self._worker is None:
+            return
+        if not self._worker.done():
+            await self._queue.join()
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+
+async def _call(fn, args):
+    result = fn(*args)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
@@ -0,0 +1,806 @@
+# src/utils/guild_store.py
+# Estado residente por servidor, persistido por un backend intercambiable.
+
+import asyncio
+import json
+import time
+from datetime import datetime
+
+from src.config import (
+    ACTOR_QUEUE_WARN,
+    BINARY_SNAPSHOT_GUILDS,
+    CHECKPOINT_INTERVAL,
+    CHECKPOINT_MAX_WRITES,
+    FLUSH_INTERVAL,
+    FLUSH_DIRTY_THRESHOLD,
+    HEARTBEAT_INTERVAL,
+    JOURNAL_COMPACT_EVERY,
+    STORAGE_BACKEND,
+)
+
+from . import snapshot_codec
+from .data_handler import (
+    data_path,
+    load_bytes,
+    load_json,
+    remove_file,
+    run_io,
+    save_bytes,
+    save_json,
+)
+from .guild_actor import GuildActor
+from .helpers import apply_op, get_data_path, index_dates, op_partners
+from .journal import VoiceJournal
+from .leaderboard import Leaderboard
+from .open_sessions import OpenSessions
+from .query_cache import QueryCache
+from .rollups import Rollups
+from .stats_table import StatsTable
+
+HEARTBEAT_FILE = "heartbeat.json"
+CHECKPOINT_FILE = "checkpoint.json"
+SYNC_FILE = "sync.json"
+
+
+def read_checkpoint(gid: str) -> dict:
+    """Último checkpoint de sesiones abiertas del servidor ({} si no hay)."""
+    raw = load_bytes(get_data_path(gid, CHECKPOINT_FILE))
+    return json.loads(raw) if raw else {}
+
+
+def read_sync_ack(gid: str) -> dict:
+    """Última versión confirmada por FastAPI y su seq ({} si no hay)."""
+    raw = load_bytes(get_data_path(gid, SYNC_FILE))
+    return json.loads(raw) if raw else {}
+
+
+class GuildState:
+    """
+    Copia en memoria de stats.json (como `StatsTable`), dates.json y los
+    contadores por periodos (`Rollups`) de un servidor.
+    Toda mutación pasa por `record`, siempre desde un trabajo de `actor`, que la
+    aplica sobre los dicts residentes,
+    la añade al diario del servidor (si el backend usa diario) y anota qué
+    usuarios y parejas han cambiado para que el backend escriba solo eso.
+    """
+
+    def __init__(
+        self,
+        guild_id: str,
+        stats: dict,
+        dates: dict,
+        seq: int = 0,
+        journal=None,
+        rollups: dict = None,
+    ):
+        self.guild_id = guild_id
+        self.stats = stats if isinstance(stats, StatsTable) else StatsTable(stats)
+        self.dates = dates
+        # Los mismos contadores por días, semanas y meses (consultas con `periodo`)
+        self.rollups = Rollups.from_dict(rollups or {})
+        # Sesiones abiertas para sumar el tiempo en curso en las consultas
+        self.sessions = OpenSessions.from_dates(dates)
+        # Índice inverso de dates.json (quién tiene una entrada de cada usuario)
+        self.date_refs = index_dates(dates)
+        # Clasificaciones del servidor (/ranking), al día con cada contador
+        self.leaderboard = Leaderboard(self.stats)
+        # Resultados de consultas, invalidados por `track` usuario a usuario
+        self.query_cache = QueryCache()
+        self.seq = seq  # Última operación aplicada
+        self.journal = journal
+        self.pending = 0  # Operaciones sin persistir
+        self.dirty_users = set()
+        self.dirty_pairs = set()
+        self.dirty_all = False  # Cambio masivo: el backend debe reescribirlo todo
+        self.purge = False  # Hubo un borrado: no deben quedar copias antiguas en disco
+        # Cambios de stats aún no confirmados por FastAPI (sincronización por
+        # deltas). Sin versión base conocida se envía el snapshot entero
+        self.sync_users = set()
+        self.sync_pairs = set()
+        self.sync_resets = set()  # Usuarios borrados: el servidor rehace su entrada
+        self.sync_full = True
+        self.sync_version = None  # Versión del servidor que refleja lo ya enviado
+        self.sync_seq = None  # Última operación incluida en sync_version
+        self.sync_ack_dirty = False  # sync_version/sync_seq sin guardar en sync.json
+        # Todas las mutaciones (y las lecturas completas del estado desde el
+        # pool de E/S) pasan por el actor, en orden y sin solaparse
+        self.actor = GuildActor(guild_id)
+        self._on_dirty = None
+        # Checkpoint de sesiones abiertas: el leído al cargar (el del arranque
+        # anterior) y cuándo se escribió el último en este arranque
+        self.last_checkpoint = {}
+        self.checkpoint_at = 0.0
+        self.checkpoint_open = False
+        # Hasta que se reconcilian con el gateway, las sesiones abiertas pueden
+        # ser restos de una caída y no deben renovarse con un checkpoint
+        self.sessions_verified = False
+
+    def data(self, filename: str) -> dict:
+        """Devuelve el dict residente asociado a `filename`."""
+        if filename == "stats.json":
+            return self.stats
+        if filename == "dates.json":
+            return self.dates
+        raise ValueError(f"Archivo desconocido: {filename}")
+
+    def export(self, filename: str) -> dict:
+        """Contenido de `filename` como dicts JSON (copia para serializar o enviar)."""
+        if filename == "stats.json":
+            return self.stats.to_dict()
+        return self.data(filename)
+
+    def live_shared_time(self, a: str, b: str) -> float:
+        """Tiempo compartido entre a y b incluyendo la sesión en curso."""
+        a, b = str(a), str(b)
+        stored = self.stats.shared_time(a, b) or self.stats.shared_time(b, a)
+        return stored + self.sessions.shared_elapsed(a, b)
+
+    def live_solo_time(self, uid: str) -> float:
+        """total_solo_time de uid incluyendo el periodo solo en curso."""
+        uid = str(uid)
+        fields = self.stats.user_fields(uid)
+        stored = fields.get("total_solo_time", 0) if isinstance(fields, dict) else 0
+        return stored + self.sessions.solo_elapsed(uid)
+
+    def record(self, kind: str, **fields):
+        """
+        Aplica la operación `kind` (ver helpers.VOICE_OPS) y la añade al diario.
+        Las operaciones que no cambian nada (devuelven False) no se registran.
+        """
+        op = {"op": kind, "ts": datetime.now().isoformat(), **fields}
+        result = apply_op(self, op)
+        if result is False:
+            return result
+
+        self.seq += 1
+        op["seq"] = self.seq
+        self.track(op, result)
+        if self.journal is not None:
+            self.journal.append(op)
+        if self._on_dirty:
+            self._on_dirty(self)
+        return result
+
+    def track(self, op: dict, result=None):
+        """
+        Anota los usuarios y parejas que toca una operación, para el backend
+        y para la próxima sincronización, e invalida sus resultados en
+        `query_cache`.
+        """
+        self.pending += 1
+        users, pairs = set(), set()
+        if op["op"] == "erase":
+            # El borrado toca las entradas de todos los que tenían al usuario
+            # (los devuelve erase_user); sin ellos se reescribe todo
+            uid = op["uid"]
+            self.purge = True
+            self.sync_resets.add(uid)
+            users.add(uid)
+            if isinstance(result, set):
+                users |= result
+                for other in result:
+                    pairs.update(((uid, other), (other, uid)))
+            else:
+                self.dirty_all = True
+                self.sync_full = True
+                self.query_cache.bump_all()
+        elif "a" in op:
+            a = op["a"]
+            users.add(a)
+            for b in op_partners(op):
+                users.add(b)
+                pairs.update(((a, b), (b, a)))
+        elif "uid" in op:
+            users.add(op["uid"])
+
+        self.dirty_users |= users
+        self.dirty_pairs |= pairs
+        self.sync_users |= users
+        self.sync_pairs |= pairs
+        self.query_cache.bump(users)
+
+    def take_dirty(self) -> dict:
+        """Devuelve y reinicia el registro de cambios pendientes."""
+        dirty = {
+            "pending": self.pending,
+            "users": self.dirty_users,
+            "pairs": self.dirty_pairs,
+            "all": self.dirty_all,
+            "purge": self.purge,
+        }
+        self.pending = 0
+        self.dirty_users = set()
+        self.dirty_pairs = set()
+        self.dirty_all = False
+        self.purge = False
+        return dirty
+
+    def restore_dirty(self, dirty: dict):
+        """Reincorpora cambios cuya persistencia ha fallado."""
+        self.pending += dirty["pending"]
+        self.dirty_users |= dirty["users"]
+        self.dirty_pairs |= dirty["pairs"]
+        self.dirty_all = self.dirty_all or dirty["all"]
+        self.purge = self.purge or dirty["purge"]
+
+    # ----- Sincronización con FastAPI -----
+    def sync_pending(self) -> bool:
+        """Si hay algo de stats que FastAPI aún no tiene."""
+        return bool(
+            self.sync_full
+            or self.sync_version is None
+            or self.sync_users
+            or self.sync_pairs
+            or self.sync_resets
+        )
+
+    def has_unsynced_ops(self) -> bool:
+        """
+        Si el estado local tiene operaciones (o una carga completa) que
+        FastAPI no ha confirmado; entonces no debe restaurarse desde allí.
+        """
+        if self.sync_seq is None:
+            return self.seq > 0 or bool(self.stats)
+        return self.seq > self.sync_seq
+
+    def load_sync_ack(self, ack: dict):
+        """Recupera la última confirmación de FastAPI guardada en sync.json."""
+        self.sync_version = ack.get("version")
+        self.sync_seq = ack.get("seq")
+        # Sin operaciones posteriores, FastAPI ya tiene exactamente estas stats
+        if self.sync_version is not None and self.sync_seq == self.seq:
+            self.sync_full = False
+
+    def confirm_sync(self, taken: dict, version):
+        """FastAPI ha guardado como `version` lo tomado con `take_sync`."""
+        self.sync_version = version
+        self.sync_seq = taken["seq"]
+        self.sync_ack_dirty = True
+
+    def replace_stats(self, new_data: dict, version=None):
+        """
+        Sustituye stats entero. Con `version`, el contenido es el de esa
+        versión de FastAPI (restauración) y no hay nada que reenviarle.
+        """
+        self.stats.clear()
+        self.stats.update(new_data)
+        # Las cubetas ya no corresponden a los nuevos totales: se empieza de
+        # cero (dirty_all hace que ambos backends las reescriban)
+        self.rollups = Rollups()
+        self.leaderboard.invalidate()
+        self.dirty_all = True
+        self.query_cache.bump_all()
+        self.sync_users = set()
+        self.sync_pairs = set()
+        self.sync_resets = set()
+        if version is None:
+            # Carga local (p. ej. /update_json): FastAPI aún no la tiene
+            self.sync_full = True
+            self.sync_seq = None
+        else:
+            self.sync_full = False
+            self.sync_version = version
+            self.sync_seq = self.seq
+        self.sync_ack_dirty = True
+
+    def take_sync(self) -> dict:
+        """
+        Devuelve y reinicia los cambios de stats pendientes de sincronizar,
+        con lo que hay que enviar: el snapshot entero (`full`) o un delta
+        sobre `sync_version` (ver data_handler.apply_stats_delta).
+        """
+        taken = {
+            "users": self.sync_users,
+            "pairs": self.sync_pairs,
+            "resets": self.sync_resets,
+            "full": self.sync_full or self.sync_version is None,
+            "seq": self.seq,
+        }
+        self.sync_users = set()
+        self.sync_pairs = set()
+        self.sync_resets = set()
+        self.sync_full = False
+        if taken["full"]:
+            taken["data"] = self.export("stats.json")
+        else:
+            stats = self.stats
+            taken["delta"] = {
+                "resets": sorted(taken["resets"]),
+                "users": {
+                    uid: (dict(fields) if isinstance(fields, dict) else fields)
+                    for uid in taken["users"]
+                    for fields in (stats.user_fields(uid),)
+                },
+                "pairs": [[a, b, stats.pair(a, b)] for a, b in taken["pairs"]],
+            }
+        return taken
+
+    def restore_sync(self, taken: dict):
+        """Reincorpora cambios cuya sincronización ha fallado."""
+        self.sync_users |= taken["users"]
+        self.sync_pairs |= taken["pairs"]
+        self.sync_resets |= taken["resets"]
+        self.sync_full = self.sync_full or taken["full"]
+
+
+class JournalBackend:
+    """
+    Backend por defecto: data/<gid>/snapshot.json + data/<gid>/journal.jsonl.
+    El diario se escribe por lotes y se compacta en el snapshot cuando supera
+    `compact_every` operaciones. Los servidores de `binary_guilds` ("*" = todos)
+    guardan el snapshot en formato binario (snapshot.bin, ver snapshot_codec).
+    """
+
+    def __init__(
+        self,
+        compact_every: int = JOURNAL_COMPACT_EVERY,
+        binary_guilds=BINARY_SNAPSHOT_GUILDS,
+    ):
+        self.compact_every = compact_every
+        self.binary_guilds = set(binary_guilds)
+
+    def uses_binary(self, gid: str) -> bool:
+        return "*" in self.binary_guilds or gid in self.binary_guilds
+
+    async def load(self, gid: str) -> GuildState:
+        return await run_io(gid, self.load_sync, gid)
+
+    def _read_snapshot(self, gid: str):
+        """
+        Snapshot más reciente del servidor como (seq, stats, dates, rollups,
+        binario), o None. Si quedaron los dos formatos (cambio cortado a
+        medias), gana el de mayor seq.
+        """
+        found = []
+        raw = load_bytes(get_data_path(gid, "snapshot.bin"))
+        if raw:
+            found.append((*snapshot_codec.decode_snapshot(raw), True))
+        raw = load_bytes(get_data_path(gid, "snapshot.json"))
+        if raw:
+            snapshot = json.loads(raw)
+            if snapshot:
+                found.append(
+                    (
+                        snapshot["seq"],
+                        snapshot["stats"],
+                        snapshot["dates"],
+                        snapshot.get("rollups"),
+                        False,
+                    )
+                )
+        return max(found, key=lambda s: s[0], default=None)
+
+    def load_sync(self, gid: str) -> GuildState:
+        """Carga snapshot + cola del diario. Se ejecuta en el pool de E/S."""
+        journal = VoiceJournal(data_path(get_data_path(gid, "journal.jsonl")))
+        snapshot = self._read_snapshot(gid)
+        if snapshot:
+            seq, stats, dates, rollups, binary = snapshot
+            state = GuildState(gid, stats, dates, seq, journal, rollups)
+        else:
+            # Servidor sin snapshot: se parte de los JSON clásicos
+            binary = None
+            state = GuildState(
+                gid,
+                load_json(get_data_path(gid, "stats.json")),
+                load_json(get_data_path(gid, "dates.json")),
+                journal=journal,
+            )
+
+        ops = journal.replay(after_seq=state.seq)
+        for op in ops:
+            apply_op(state, op)
+            state.seq = op["seq"]
+
+        if ops:
+            print(
+                f"[STORE] Servidor {gid}: {len(ops)} operaciones del diario reproducidas."
+            )
+        if ops or (binary is not None and binary != self.uses_binary(gid)):
+            # Se consolida lo reproducido (o se cambia de formato) para
+            # arrancar con el diario vacío y el snapshot en el formato elegido
+            self._write_snapshot(state)
+        return state
+
+    def _write_snapshot(self, state: GuildState):
+        gid = state.guild_id
+        if self.uses_binary(gid):
+            save_bytes(
+                get_data_path(gid, "snapshot.bin"),
+                snapshot_codec.encode(
+                    state.seq,
+                    state.stats.to_dict(),
+                    state.dates,
+                    state.rollups.to_dict(),
+                ),
+            )
+            remove_file(get_data_path(gid, "snapshot.json"))
+        else:
+            save_json(
+                get_data_path(gid, "snapshot.json"),
+                {
+                    "seq": state.seq,
+                    "stats": state.stats.to_dict(),
+                    "dates": state.dates,
+                    "rollups": state.rollups.to_dict(),
+                },
+                pretty=False,
+            )
+            remove_file(get_data_path(gid, "snapshot.bin"))
+        state.journal.truncate()
+
+    async def compact(self, state: GuildState):
+        """Escribe el snapshot completo del servidor y vacía su diario."""
+        await state.actor.run(self._compact, state)
+
+    async def _compact(self, state: GuildState):
+        # Lo pendiente del diario ya queda incluido en el snapshot
+        state.journal.take()
+        await run_io(state.guild_id, self._write_snapshot, state)
+
+    async def flush(self, state: GuildState, compact: bool = False):
+        """Escribe el diario pendiente y lo compacta si toca."""
+        dirty = state.take_dirty()
+        lines = state.journal.take()
+        try:
+            await run_io(state.guild_id, state.journal.write, lines)
+        except Exception:
+            state.journal.restore(lines)
+            state.restore_dirty(dirty)
+            raise
+
+        # Un borrado se compacta al momento para que el snapshot no conserve los datos
+        if (
+            compact
+            or dirty["all"]
+            or dirty["purge"]
+            or state.journal.records >= self.compact_every
+        ):
+            await self.compact(state)
+
+    def needs_flush(self, state: GuildState, compact: bool = False) -> bool:
+        return bool(state.pending or (compact and state.journal.records))
+
+    async def close(self):
+        pass
+
+
+def make_backend(name: str = STORAGE_BACKEND):
+    """Instancia el backend configurado en STORAGE_BACKEND ('json' o 'sqlite')."""
+    if name == "sqlite":
+        from .sqlite_store import SqliteBackend
+
+        return SqliteBackend()
+    return JournalBackend()
+
+
+class GuildStore:
+    """
+    Contenedor de `GuildState` propiedad del bot (`bot.guild_store`).
+    Carga cada servidor una sola vez desde el backend y persiste los cambios
+    pendientes cada `interval` segundos o en cuanto un servidor acumule
+    `threshold` operaciones. Cada `checkpoint_interval` segundos guarda además
+    el checkpoint de los servidores con sesiones abiertas (como mucho
+    `checkpoint_max_writes` por ronda, 0 = todos).
+    """
+
+    def __init__(
+        self,
+        backend=None,
+        interval: float = FLUSH_INTERVAL,
+        threshold: int = FLUSH_DIRTY_THRESHOLD,
+        checkpoint_interval: float = CHECKPOINT_INTERVAL,
+        checkpoint_max_writes: int = CHECKPOINT_MAX_WRITES,
+    ):
+        self.backend = backend or make_backend()
+        self.interval = interval
+        self.threshold = threshold
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_max_writes = checkpoint_max_writes
+        self._states = {}
+        self._load_locks = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._closed = False
+        # Último latido del arranque anterior: hasta ahí se sabe que el bot seguía vivo
+        self.last_heartbeat = None
+        self._beat_at = 0.0
+
+    # ----- Acceso -----
+    async def get(self, guild_context) -> GuildState:
+        """Devuelve el estado del servidor, cargándolo la primera vez."""
+        gid = (
+            str(guild_context.id)
+            if hasattr(guild_context, "id")
+            else str(guild_context)
+        )
+        state = self._states.get(gid)
+        if state is not None:
+            return state
+
+        # Dos eventos simultáneos del mismo servidor comparten una única carga
+        async with self._load_locks.setdefault(gid, asyncio.Lock()):
+            state = self._states.get(gid)
+            if state is None:
+                state = await self.backend.load(gid)
+                # Se lee antes de que este arranque escriba uno nuevo
+                state.last_checkpoint = await run_io(gid, read_checkpoint, gid)
+                state.load_sync_ack(await run_io(gid, read_sync_ack, gid))
+                state._on_dirty = self._notify
+                self._states[gid] = state
+        return state
+
+    async def replace(self, guild_context, filename: str, new_data: dict):
+        """Sustituye el contenido completo de un archivo y lo persiste al momento."""
+        state = await self.get(guild_context)
+
+        def apply():
+            if filename == "stats.json":
+                state.replace_stats(new_data)
+                return
+            obj = state.data(filename)
+            obj.clear()
+            obj.update(new_data)
+            state.sessions = OpenSessions.from_dates(state.dates)
+            state.date_refs = index_dates(state.dates)
+            state.dirty_all = True
+            state.query_cache.bump_all()
+
+        await state.actor.run(apply)
+        await self.flush(state, compact=True)
+        await self._write_sync_ack(state)
+
+    async def restore(self, guild_context, new_stats: dict, version) -> bool:
+        """
+        Sustituye stats por la `version` guardada en FastAPI, salvo que el
+        estado local tenga operaciones que FastAPI no ha confirmado o ya
+        refleje esa versión (o una posterior). Devuelve si se sustituyó.
+        """
+        state = await self.get(guild_context)
+
+        def apply():
+            if state.has_unsynced_ops():
+                return False
+            if state.sync_version is not None and (
+                version is None
+                or state.sync_version > version
+                or (state.sync_version == version and state.sync_seq == state.seq)
+            ):
+                return False
+            state.replace_stats(new_stats, version)
+            return True
+
+        if not await state.actor.run(apply):
+            return False
+        await self.flush(state, compact=True)
+        await self._write_sync_ack(state)
+        return True
+
+    async def partners(self, guild_context, user_id: str) -> set:
+        """
+        IDs de los usuarios con los que `user_id` tiene una pareja registrada,
+        en cualquiera de los dos sentidos.
+        """
+        state = await self.get(guild_context)
+        if hasattr(self.backend, "partners"):
+            # Consulta por índice: antes se persisten los cambios pendientes
+            if state.pending or state.dirty_all:
+                await self.flush(state)
+            return await self.backend.partners(state.guild_id, user_id)
+
+        return state.stats.partners(user_id)
+
+    # ----- Persistencia -----
+    def _notify(self, state: GuildState):
+        if state.pending >= self.threshold:
+            self._wakeup.set()
+
+    async def flush(self, state: GuildState, compact: bool = False):
+        """Persiste los cambios pendientes de un servidor."""
+        await self.backend.flush(state, compact=compact)
+
+    async def _flush_safe(self, state: GuildState, compact: bool) -> bool:
+        try:
+            await self.flush(state, compact=compact)
+            return True
+        except Exception as e:
+            print(
+                f"\033[31m[STORE] Error volcando servidor {state.guild_id}: {e}\033[0m"
+            )
+            return False
+
+    async def flush_all(self, compact: bool = False) -> int:
+        """
+        Persiste en paralelo todos los servidores con cambios.
+        Devuelve cuántos se escribieron correctamente.
+        """
+        states = [
+            state
+            for state in list(self._states.values())
+            if self.backend.needs_flush(state, compact)
+        ]
+        results = await asyncio.gather(
+            *(self._flush_safe(state, compact) for state in states)
+        )
+        return sum(results)
+
+    # ----- Métricas de los actores -----
+    def actor_metrics(self) -> dict:
+        """Métricas de cola y latencia del actor de cada servidor cargado."""
+        return {gid: state.actor.metrics() for gid, state in self._states.items()}
+
+    def query_cache_metrics(self, reset: bool = False) -> dict:
+        """Aciertos y fallos de la caché de consultas de cada servidor cargado."""
+        return {
+            gid: state.query_cache.metrics(reset) for gid, state in self._states.items()
+        }
+
+    def _report_backpressure(self):
+        """Avisa de los servidores cuya cola ha superado ACTOR_QUEUE_WARN trabajos."""
+        for gid, state in list(self._states.items()):
+            if state.actor.max_depth < ACTOR_QUEUE_WARN:
+                continue
+            m = state.actor.metrics(reset=True)
+            print(
+                f"\033[33m[ACTOR][WARN] Servidor {gid}: cola máx. {m['max_depth']} "
+                f"(actual {m['depth']}), {m['processed']} trabajos, espera media "
+                f"{m['avg_wait_ms']:.1f} ms (máx. {m['max_wait_ms']:.1f} ms), "
+                f"ejecución media {m['avg_run_ms']:.1f} ms.\033[0m"
+            )
+
+    # ----- Checkpoints de sesiones abiertas -----
+    async def _write_checkpoint(self, state: GuildState):
+        """
+        Guarda en un único archivo compacto por servidor la hora actual y las
+        sesiones abiertas que cubre. Al arrancar, las sesiones que quedaron
+        abiertas por una caída se cierran a esa hora (ver VoiceCog.reconcile_voice_states).
+        """
+        sessions = state.sessions
+        checkpoint = {
+            "ts": datetime.now().isoformat(),
+            "seq": state.seq,
+            "pairs": len(sessions.pairs),
+            "solo": len(sessions.solo),
+        }
+        await run_io(
+            state.guild_id,
+            save_json,
+            get_data_path(state.guild_id, CHECKPOINT_FILE),
+            checkpoint,
+            False,
+        )
+        state.checkpoint_at = time.monotonic()
+        state.checkpoint_open = bool(sessions.pairs or sessions.solo)
+
+    # ----- Confirmaciones de FastAPI -----
+    async def _write_sync_ack(self, state: GuildState):
+        """Guarda en sync.json la última versión confirmada por FastAPI y su seq."""
+        state.sync_ack_dirty = False
+        try:
+            await run_io(
+                state.guild_id,
+                save_json,
+                get_data_path(state.guild_id, SYNC_FILE),
+                {"version": state.sync_version, "seq": state.sync_seq},
+                False,
+            )
+        except Exception:
+            state.sync_ack_dirty = True
+            raise
+
+    async def save_sync_acks(self):
+        """Escribe sync.json de los servidores con confirmaciones nuevas."""
+        due = [state for state in self._states.values() if state.sync_ack_dirty]
+        results = await asyncio.gather(
+            *(self._write_sync_ack(state) for state in due), return_exceptions=True
+        )
+        for state, result in zip(due, results):
+            if isinstance(result, Exception):
+                print(
+                    f"\033[31m[STORE] Error guardando la confirmación de FastAPI del servidor {state.guild_id}: {result}\033[0m"
+                )
+
+    async def checkpoint_all(self, force: bool = False) -> int:
+        """
+        Escribe el checkpoint de los servidores con sesiones abiertas (o que
+        las tenían en el anterior) cuyo último checkpoint tiene más de
+        `checkpoint_interval` segundos. Devuelve cuántos se escribieron.
+        """
+        now = time.monotonic()
+        due = [
+            state
+            for state in list(self._states.values())
+            if state.sessions_verified
+            and (state.sessions.pairs or state.sessions.solo or state.checkpoint_open)
+            and (force or now - state.checkpoint_at >= self.checkpoint_interval)
+        ]
+        # Primero los más atrasados, por si la ronda está limitada
+        due.sort(key=lambda state: state.checkpoint_at)
+        if self.checkpoint_max_writes and not force:
+            due = due[: self.checkpoint_max_writes]
+
+        results = await asyncio.gather(
+            *(self._write_checkpoint(state) for state in due), return_exceptions=True
+        )
+        for state, result in zip(due, results):
+            if isinstance(result, Exception):
+                print(
+                    f"\033[31m[STORE] Error guardando el checkpoint del servidor {state.guild_id}: {result}\033[0m"
+                )
+        return sum(not isinstance(result, Exception) for result in results)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(),
+                    timeout=min(self.interval, self.checkpoint_interval),
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            started = time.perf_counter()
+            flushed = await self.flush_all()
+            if flushed:
+                print(
+                    f"[STORE] Cambios de {flushed} servidor(es) persistidos en "
+                    f"{(time.perf_counter() - started) * 1000:.1f} ms."
+                )
+            self._report_backpressure()
+            await self.checkpoint_all()
+            await self.save_sync_acks()
+            if time.monotonic() - self._beat_at >= HEARTBEAT_INTERVAL:
+                await self._beat()
+
+    async def _beat(self):
+        """Guarda la hora actual en data/heartbeat.json (todo lo anterior ya está en disco)."""
+        self._beat_at = time.monotonic()
+        try:
+            await run_io(
+                HEARTBEAT_FILE,
+                save_json,
+                HEARTBEAT_FILE,
+                {"ts": datetime.now().isoformat()},
+                False,
+            )
+        except Exception as e:
+            print(f"\033[31m[STORE] Error guardando el latido: {e}\033[0m")
+
+    async def start(self):
+        """Lee el latido del arranque anterior y arranca el volcador en segundo plano."""
+        if self.last_heartbeat is None:
+            # Se lee antes de que el volcador escriba el primer latido nuevo
+            heartbeat = await run_io(HEARTBEAT_FILE, load_json, HEARTBEAT_FILE)
+            self.last_heartbeat = heartbeat.get("ts")
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _drain_actors(self):
+        await asyncio.gather(
+            *(state.actor.drain() for state in list(self._states.values()))
+        )
+
+    async def close(self):
+        """
+        Detiene el volcador, termina las colas de los actores y persiste todo
+        lo pendiente. Solo actúa la primera vez: el cierre que cuenta es el del
+        lifespan de webserver.py, después de la última sincronización.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._drain_actors()
+        await self.flush_all(compact=True)
+        # La compactación final también pasa por los actores
+        await self._drain_actors()
+        await self.checkpoint_all(force=True)
+        await self.save_sync_acks()
+        await self._beat()
+        await self.backend.close()
@@ -2,17 +2,16 @@
 import asyncio
 import os
 import json
-import shutil
 from datetime import datetime
 import time
+from contextlib import AsyncExitStack
 
 from dotenv import load_dotenv
 import httpx
 
-from src.config import RAIZ_PROYECTO
-
-from .data_handler import load_json, save_json, stringify_keys
-
+from src.config import SYNC_BATCH_SIZE, SYNC_CONCURRENCY, SYNC_GUILD_TIMEOUT
+from .data_handler import save_json_async, stringify_keys
+from .leaderboard import pair_key
 
 # ========= Configuración FastAPI =========
 load_dotenv()
@@ -21,73 +20,148 @@ API_KEY = os.getenv("API_KEY", None)
 
 
 # ========= FUNCIONES DE GUARDADO Y RED =========
-async def send_to_fastapi(data, guild_id=None):
+def _guild_label(guild_id):
+    """(ID, nombre) del servidor a partir de un objeto Guild, un ID o None."""
+    if guild_id is None:
+        return "default", "default"
+    try:
+        return str(guild_id.id), guild_id.name
+    except AttributeError:
+        return str(guild_id), str(guild_id)
+
+
+async def send_to_fastapi(client, data, guild_id=None):
     """
-    Envía data a FastAPI por guild_id de manera asíncrona.
+    Envía data a FastAPI por guild_id de manera asíncrona con `client`
+    (el cliente compartido `bot.http_pool`).
     Se usa el endpoint POST /save-json con payload {"guild_id","data"}.
     Imprime información de debug (status + body) para depuración.
+    Devuelve la respuesta del servidor (con la nueva "version") o None si falla.
     """
     # Determinar ID y nombre del servidor de forma segura
-    if guild_id is None:
-        gid = "default"
-        guild_name = "default"
-    else:
-        try:
-            gid = str(guild_id.id)
-            guild_name = guild_id.name
-        except AttributeError:
-            gid = str(guild_id)
-            guild_name = gid
+    gid, guild_name = _guild_label(guild_id)
 
+    safe_data = stringify_keys(data)
+    if safe_data != data:
+        print(
+            f"\033[33m[FastAPI][WARN] Datos para {guild_name} ({gid}) han sido sanitizados (claves no-str convertidas).\033[0m"
+        )
+
+    return await _post_fastapi(
+        client, "/save-json", {"guild_id": gid, "data": safe_data}, gid, guild_name
+    )
+
+
+async def send_delta_to_fastapi(client, delta: dict, base_version: int, guild_id=None):
+    """
+    Envía a POST /save-json/delta los cambios de stats sobre la versión
+    `base_version` del servidor. Devuelve la respuesta; si el servidor ya no
+    tiene esa versión como la última, {"status": "conflicto", ...}.
+    """
+    gid, guild_name = _guild_label(guild_id)
+    payload = {
+        "guild_id": gid,
+        "base_version": base_version,
+        "delta": stringify_keys(delta),
+    }
+    return await _post_fastapi(client, "/save-json/delta", payload, gid, guild_name)
+
+
+async def send_batch_to_fastapi(client, items: list):
+    """
+    Envía a POST /save-json/batch varios servidores en una sola petición
+    (NDJSON, un elemento por línea con el mismo formato que /save-json o
+    /save-json/delta). Devuelve el resultado de cada elemento, en orden, o
+    None si la petición falla.
+    """
     if not API_URL:
         print(
-            f"\033[31m[FastAPI][ERROR] API_URL no configurada. No se puede enviar datos para {guild_name} ({gid}).\033[0m"
+            f"\033[31m[FastAPI][ERROR] API_URL no configurada. No se puede enviar el lote de {len(items)} servidores.\033[0m"
         )
-        return
+        return None
 
-    safe_data = stringify_keys(data)
-    if safe_data != data:
+    headers = {"content-type": "application/x-ndjson"}
+    if API_KEY:
+        headers["x-api-key"] = API_KEY
+    endpoint = f"{API_URL.rstrip('/')}/save-json/batch"
+    body = "\n".join(
+        json.dumps(stringify_keys(item), separators=(",", ":")) for item in items
+    ).encode("utf-8")
+
+    try:
+        resp = await client.post(endpoint, content=body, headers=headers)
+        data_resp = resp.json()
+    except httpx.RequestError as e:
         print(
-            f"\033[33m[FastAPI][WARN] Datos para {guild_name} ({gid}) han sido sanitizados (claves no-str convertidas).\033[0m"
+            f"\033[33m[FastAPI] ⚠️ Excepción al enviar el lote de {len(items)} servidores: {e}\033[0m"
+        )
+        return None
+    except Exception as e:
+        print(f"\033[31m[FastAPI] ❌ Error inesperado en envío del lote: {e}\033[0m")
+        return None
+
+    results = data_resp.get("results") if isinstance(data_resp, dict) else None
+    if not isinstance(results, list) or len(results) != len(items):
+        print(
+            f"\033[33m[FastAPI] ⚠️ Respuesta inesperada del servidor al lote: {resp.text}\033[0m"
         )
+        return None
+
+    saved = sum(1 for result in results if result.get("status") == "guardado")
+    print(
+        f"\033[32m[FastAPI] ✅ Lote enviado: {saved}/{len(items)} servidores guardados\033[0m"
+    )
+    return results
+
+
+async def _post_fastapi(client, path: str, payload: dict, gid: str, guild_name: str):
+    if not API_URL:
+        print(
+            f"\033[31m[FastAPI][ERROR] API_URL no configurada. No se puede enviar datos para {guild_name} ({gid}).\033[0m"
+        )
+        return None
 
-    payload = {"guild_id": gid, "data": safe_data}
     headers = {"x-api-key": API_KEY} if API_KEY else {}
-    endpoint = f"{API_URL.rstrip('/')}/save-json"
-    timeout = httpx.Timeout(30.0, read=30.0)
+    endpoint = f"{API_URL.rstrip('/')}{path}"
 
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        try:
-            resp = await client.post(endpoint, json=payload, headers=headers)
+    try:
+        resp = await client.post(endpoint, json=payload, headers=headers)
 
-            try:
-                data_resp = resp.json()
-            except Exception:
-                data_resp = None
-                print(
-                    f"\033[33m[FastAPI][WARN] No se pudo parsear la respuesta JSON de {guild_name} ({gid}): {resp.text}\033[0m"
-                )
+        if resp.status_code == 409:
+            # Versión base desactualizada: quien llama envía el snapshot entero
+            print(
+                f"\033[33m[FastAPI] ⚠️ Versión base desactualizada para {guild_name} ({gid}).\033[0m"
+            )
+            return {"status": "conflicto"}
 
-            if data_resp and data_resp.get("status") == "guardado":
-                print(
-                    f"\033[32m[FastAPI] ✅ Datos enviados correctamente para {guild_name} ({gid})\033[0m"
-                )
-            elif data_resp is None:
-                pass
-            else:
-                print(
-                    f"\033[33m[FastAPI] ⚠️ Respuesta inesperada del servidor para {guild_name} ({gid}): {resp.text}\033[0m"
-                )
+        try:
+            data_resp = resp.json()
+        except Exception:
+            data_resp = None
+            print(
+                f"\033[33m[FastAPI][WARN] No se pudo parsear la respuesta JSON de {guild_name} ({gid}): {resp.text}\033[0m"
+            )
 
-        except httpx.RequestError as e:
+        if data_resp and data_resp.get("status") == "guardado":
             print(
-                f"\033[33m[FastAPI] ⚠️ Excepción al enviar datos para {guild_name} ({gid}): {e}\033[0m"
+                f"\033[32m[FastAPI] ✅ Datos enviados correctamente para {guild_name} ({gid})\033[0m"
             )
-        except Exception as e:
+            return data_resp
+        elif data_resp is None:
+            pass
+        else:
             print(
-                f"\033[31m[FastAPI] ❌ Error inesperado en envío de datos: {e}\033[0m"
+                f"\033[33m[FastAPI] ⚠️ Respuesta inesperada del servidor para {guild_name} ({gid}): {resp.text}\033[0m"
             )
 
+    except httpx.RequestError as e:
+        print(
+            f"\033[33m[FastAPI] ⚠️ Excepción al enviar datos para {guild_name} ({gid}): {e}\033[0m"
+        )
+    except Exception as e:
+        print(f"\033[31m[FastAPI] ❌ Error inesperado en envío de datos: {e}\033[0m")
+    return None
+
 
 def get_data_path(guild_context, filename: str) -> str:
     """
@@ -100,72 +174,249 @@ def get_data_path(guild_context, filename: str) -> str:
 
 
 _last_sync_cache = {}
+_sync_locks = {}  # gid -> Lock: una sincronización por servidor a la vez
+
 
+async def sync_guild(bot, guild):
+    """
+    Sincroniza stats de un servidor con FastAPI: solo los usuarios y parejas
+    que han cambiado desde la última versión confirmada, o el snapshot entero
+    si no se conoce esa versión o el servidor ya no la tiene como la última.
+    Devuelve False si no se pudo (los cambios quedan pendientes para la
+    próxima) y None si no había nada que enviar.
+    """
+    state = await bot.guild_store.get(guild)
+    async with _sync_locks.setdefault(state.guild_id, asyncio.Lock()):
+        return await _sync_state(bot.http_pool, state, guild)
 
-async def sync_all_guilds(bot, force: bool = False):
-    sent = 0
-    skipped = 0
+
+async def _sync_state(client, state, guild):
+    taken = state.take_sync()
+    if not taken["full"] and not any(taken["delta"].values()):
+        return None  # Nada que enviar desde la última sincronización
+
+    try:
+        if taken["full"]:
+            resp = await send_to_fastapi(client, taken["data"], guild_id=guild)
+        else:
+            resp = await send_delta_to_fastapi(
+                client, taken["delta"], state.sync_version, guild_id=guild
+            )
+            if resp and resp.get("status") == "conflicto":
+                taken["full"] = True
+                resp = await send_to_fastapi(
+                    client, state.export("stats.json"), guild_id=guild
+                )
+    except asyncio.CancelledError:
+        # Cortada por un timeout: lo tomado se envía en la próxima
+        state.restore_sync(taken)
+        raise
+
+    return _finish_sync(state, taken, resp)
+
+
+def _finish_sync(state, taken: dict, resp) -> bool:
+    """Anota la versión confirmada o, si no se guardó, devuelve los cambios a `state`."""
+    if not resp or resp.get("status") != "guardado":
+        state.restore_sync(taken)
+        return False
+    state.confirm_sync(taken, resp.get("version"))
+    return True
+
+
+def _batch_item(state, taken: dict) -> dict:
+    if taken["full"]:
+        return {"guild_id": state.guild_id, "data": taken["data"]}
+    return {
+        "guild_id": state.guild_id,
+        "base_version": state.sync_version,
+        "delta": taken["delta"],
+    }
+
+
+async def _sync_batch(client, states: list) -> dict:
+    """
+    Sincroniza varios servidores con una petición a /save-json/batch (y otra
+    con el snapshot entero de los que respondan con conflicto de versión).
+    Devuelve {gid: sincronizado}, con None si no había nada que enviar.
+    """
+    outcome = {}
+    async with AsyncExitStack() as stack:
+        # Siempre en el mismo orden, para no bloquearse con otra sincronización
+        for state in sorted(states, key=lambda state: state.guild_id):
+            await stack.enter_async_context(
+                _sync_locks.setdefault(state.guild_id, asyncio.Lock())
+            )
+
+        pending = []
+        for state in states:
+            taken = state.take_sync()
+            if not taken["full"] and not any(taken["delta"].values()):
+                outcome[state.guild_id] = None  # Ya sincronizado mientras esperaba
+            else:
+                pending.append((state, taken))
+
+        try:
+            while pending:
+                results = await send_batch_to_fastapi(
+                    client, [_batch_item(state, taken) for state, taken in pending]
+                )
+                if results is None:
+                    results = [None] * len(pending)
+                conflicts = []
+                for (state, taken), result in zip(pending, results):
+                    if result and result.get("status") == "conflicto":
+                        taken["full"] = True
+                        taken["data"] = state.export("stats.json")
+                        conflicts.append((state, taken))
+                    else:
+                        outcome[state.guild_id] = _finish_sync(state, taken, result)
+                # Los conflictos se reenvían enteros, con lo que ya no pueden repetirse
+                pending = conflicts
+        except asyncio.CancelledError:
+            for state, taken in pending:
+                state.restore_sync(taken)
+            raise
+    return outcome
+
+
+async def sync_all_guilds(bot, force: bool = False, deadline: float = None) -> dict:
+    """
+    Sincroniza en paralelo todos los servidores, con como mucho
+    SYNC_CONCURRENCY peticiones a la vez y SYNC_GUILD_TIMEOUT segundos por
+    petición. Si hay varios con cambios, van en lotes de SYNC_BATCH_SIZE
+    por petición (/save-json/batch).
+    Con `deadline` (segundos), lo que no haya terminado a tiempo se cancela.
+    Devuelve un informe: {"sent", "skipped", "failed": [gid], "missed": [gid]}.
+    """
     current_time = time.time()
     limit = 180
+    report = {"sent": 0, "skipped": 0, "failed": [], "missed": []}
 
     print(
         f"🔄 [SYNC] Comprobando estado de sincronización de {len(bot.guilds)} servidores... (Force: {force})"
     )
 
+    semaphore = asyncio.Semaphore(SYNC_CONCURRENCY)
+
+    async def sync_one(guild, state):
+        async with semaphore:
+            async with _sync_locks.setdefault(state.guild_id, asyncio.Lock()):
+                synced = await asyncio.wait_for(
+                    _sync_state(bot.http_pool, state, guild), SYNC_GUILD_TIMEOUT
+                )
+            return {state.guild_id: synced}
+
+    async def sync_chunk(states):
+        async with semaphore:
+            return await asyncio.wait_for(
+                _sync_batch(bot.http_pool, states), SYNC_GUILD_TIMEOUT
+            )
+
+    candidates = []
     for guild in bot.guilds:
         gid = str(guild.id)
-        stats_path = RAIZ_PROYECTO / "data" / gid / "stats.json"
-
-        if stats_path.exists():
-            last_sync = _last_sync_cache.get(gid, 0)
+        if not force and (current_time - _last_sync_cache.get(gid, 0)) < limit:
+            report["skipped"] += 1
+            continue
+        candidates.append(guild)
+
+    states = await asyncio.gather(*(bot.guild_store.get(guild) for guild in candidates))
+    dirty = []
+    for guild, state in zip(candidates, states):
+        if not state.stats:
+            continue
+        if state.sync_pending():
+            dirty.append((guild, state))
+        else:
+            # Nada nuevo desde la última sincronización confirmada
+            _last_sync_cache[state.guild_id] = current_time
+            report["skipped"] += 1
+
+    # Con varios servidores con cambios, se envían por lotes en una petición
+    tasks = {}
+    if len(dirty) > 1:
+        for i in range(0, len(dirty), SYNC_BATCH_SIZE):
+            chunk = [state for _, state in dirty[i : i + SYNC_BATCH_SIZE]]
+            tasks[asyncio.create_task(sync_chunk(chunk))] = [
+                state.guild_id for state in chunk
+            ]
+    else:
+        for guild, state in dirty:
+            tasks[asyncio.create_task(sync_one(guild, state))] = [state.guild_id]
 
-            if not force and (current_time - last_sync) < limit:
-                skipped += 1
-                continue
+    if tasks:
+        done, pending = await asyncio.wait(tasks, timeout=deadline)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
 
+        for task in done:
+            gids = tasks[task]
             try:
-                call_data = load_json(get_data_path(gid, "stats.json"))
-                await send_to_fastapi(call_data, guild_id=guild)
-                _last_sync_cache[gid] = current_time
-                sent += 1
+                outcome = task.result()
+            except asyncio.TimeoutError:
+                print(
+                    f"   ❌ Timeout sincronizando servidores {', '.join(gids)} ({SYNC_GUILD_TIMEOUT} s)."
+                )
+                report["failed"] += gids
+                continue
             except Exception as e:
-                print(f"   ❌ Error sincronizando servidor {gid}: {e}")
-    if skipped:
+                print(f"   ❌ Error sincronizando servidores {', '.join(gids)}: {e}")
+                report["failed"] += gids
+                continue
+            for gid, synced in outcome.items():
+                if synced is None:
+                    # Ya sincronizado por otra vía mientras esperaba su turno
+                    report["skipped"] += 1
+                elif synced:
+                    _last_sync_cache[gid] = current_time
+                    report["sent"] += 1
+                else:
+                    report["failed"].append(gid)
+        report["missed"] = sorted(gid for task in pending for gid in tasks[task])
+
+    if report["skipped"]:
+        print(
+            f"\033[33mSe han omitido varios servidores: {report['skipped']} (sin cambios o con la última copia hace menos de {limit} segundos).\033[0m"
+        )
+    if report["missed"]:
         print(
-            f"\033[33mSe han omitido varios servidores: {skipped}. La última copia fue hace menos de {limit} segundos.\033[0m"
+            f"\033[31m[SYNC] Fuera de plazo ({deadline} s), sin sincronizar: "
+            f"{', '.join(report['missed'])}\033[0m"
         )
-    return sent
+    return report
 
 
 # ========= MANEJO DE EVENTOS DE LLAMADA =========
-def handle_call_data(stats, member, channel_member):
-    """Actualiza las estadísticas de llamadas entre dos usuarios."""
-    joiner_id = str(member.id)  # ID del que entra
-    existing_id = str(channel_member.id)  # ID del que ya estaba
-
-    # Garantiza que existan las estructuras necesarias
-    stats.setdefault(existing_id, {})
-    stats.setdefault(joiner_id, {})
-    stats[existing_id].setdefault(joiner_id, {})
-    stats[joiner_id].setdefault(existing_id, {})
-
-    stats[existing_id][joiner_id].setdefault("calls_started", 0)
-    stats[existing_id][joiner_id].setdefault("total_shared_time", 0)
-    stats[joiner_id][existing_id].setdefault(
-        "total_shared_time", stats[existing_id][joiner_id]["total_shared_time"]
-    )
-
-    # Incrementa contador de llamadas iniciadas por el usuario que entra
-    stats[existing_id][joiner_id]["calls_started"] += 1
+# Las funciones de esta sección son deterministas: reciben la marca de tiempo
+# en lugar de leer el reloj, para que el diario de eventos pueda reproducirlas.
+def _uid(member) -> str:
+    """Devuelve el ID como str a partir de un objeto (Member/User) o de un ID."""
+    return str(member.id) if hasattr(member, "id") else str(member)
+
+
+def handle_call_data(state, member, channel_members, current_time=None):
+    """Actualiza las estadísticas de llamadas entre member y cada uno de channel_members."""
+    stats = state.stats
+    current_time = current_time or datetime.now().isoformat()
+    joiner_id = _uid(member)  # ID del que entra
+
+    for channel_member in channel_members:
+        existing_id = _uid(channel_member)  # ID del que ya estaba
+
+        # Garantiza que existan las parejas en ambos sentidos
+        stats.ensure_pair(existing_id, joiner_id, calls=0, shared=0.0)
+        stats.ensure_pair(
+            joiner_id, existing_id, shared=stats.shared_time(existing_id, joiner_id)
+        )
 
-    # Guardar cambios en el JSON
-    path_stats = get_data_path(member.guild, "stats.json")
-    save_json(path_stats, stats)
+        # Incrementa contador de llamadas iniciadas por el usuario que entra
+        stats.add_calls(existing_id, joiner_id)
+        state.rollups.add_call(existing_id, joiner_id, current_time)
 
 
-def check_depressive_attempts(
-    member, is_depressed, stats, recorded_attempts, time_entries=None
-):
+def check_depressive_attempts(member, is_depressed, state, recorded_attempts):
     """
     Registra un intento depresivo de un usuario si está marcado como deprimido
     y aún no ha sido registrado, actualizando estadísticas y tiempo solo.
@@ -176,167 +427,311 @@ def check_depressive_attempts(
     if not is_depressed.get(mid, False) or recorded_attempts.get(mid):
         return
 
-    # Inicializar stats del usuario
-    stats.setdefault(mid, {})
-    stats[mid]["depressive_attempts"] = stats[mid].get("depressive_attempts", 0) + 1
+    solo_secs = state.record("depressive_end", uid=mid)
+    recorded_attempts[mid] = True
 
-    solo_secs = 0.0
+    user_stats = state.stats[mid]
+    print(
+        f"[{member.guild.name}] {member.display_name} ha tenido un episodio depresivo nuevo "
+        f"(total: {user_stats['depressive_attempts']}). Ha estado: {user_stats['depressive_time']:.2f} segundos solo "
+        f"(+ {solo_secs:.2f} segundos)."
+    )
+
+
+def close_depressive(state, member, current_time):
+    """Suma un intento depresivo y el tiempo transcurrido desde la marca de depresión."""
+    stats, time_entries = state.stats, state.dates
+    mid = _uid(member)
 
-    if time_entries and mid in time_entries:
+    user = stats.user(mid)
+    user["depressive_attempts"] = user.get("depressive_attempts", 0) + 1
+
+    solo_secs = 0.0
+    start_iso = None
+    if mid in time_entries:
         start_iso = time_entries[mid].get("_solo_depressive_start")
         if start_iso:
             solo_secs = (
-                datetime.now() - datetime.fromisoformat(start_iso)
+                datetime.fromisoformat(current_time) - datetime.fromisoformat(start_iso)
             ).total_seconds()
             # Limpiar los campos de tiempo depresivo
             time_entries[mid].pop("_solo_depressive_start", None)
             time_entries[mid].pop("_solo_depressive_channel_id", None)
 
-            path_dates = get_data_path(member.guild, "dates.json")
-            save_json(path_dates, time_entries)
+    user["depressive_time"] = user.get("depressive_time", 0) + solo_secs
+    state.rollups.add_depressive(mid, start_iso, current_time)
+    state.leaderboard.depressive.update(mid, user["depressive_attempts"])
+    return solo_secs
 
-    # Acumular tiempo solo en stats y marcar intento como registrado
-    stats[mid]["depressive_time"] = stats[mid].get("depressive_time", 0) + solo_secs
-    path_stats = get_data_path(member.guild, "stats.json")
-    save_json(path_stats, stats)
-    recorded_attempts[mid] = True
 
-    print(
-        f"[{member.guild.name}] {member.display_name} ha tenido un episodio depresivo nuevo "
-        f"(total: {stats[mid]['depressive_attempts']}). Ha estado: {stats[mid]['depressive_time']:.2f} segundos solo "
-        f"(+ {solo_secs:.2f} segundos)."
-    )
+def mark_depressive(state, member, current_time, channel_id=None):
+    """Guarda en dates.json la marca de solo depresivo dentro del usuario."""
+    user_entry = state.dates.setdefault(_uid(member), {})
+    user_entry["_solo_depressive_start"] = current_time
+    user_entry["_solo_depressive_channel_id"] = channel_id
 
 
-# ========= MANEJO DE TIEMPO VC =========
-def save_time(time_entries, member, channel_member, enter=True):
-    """Registra el inicio o fin de una sesión compartida entre dos usuarios."""
-    current_time = datetime.now().isoformat()
+def clear_solo_depressive(state, member):
+    """
+    Limpia los marcadores de depresión de un usuario si ya no está solo.
+    Devuelve False si no había nada que limpiar.
+    """
+    time_entries = state.dates
+    mid = _uid(member)
+    entry = time_entries.get(mid)
+    if not entry or "_solo_depressive_start" not in entry:
+        return False
+
+    entry.pop("_solo_depressive_start", None)
+    entry.pop("_solo_depressive_channel_id", None)
+    if not entry:
+        time_entries.pop(mid)
+    return True
 
-    def ensure_entry(a, b):
-        time_entries.setdefault(str(a.id), {}).setdefault(str(b.id), {"entries": []})
 
-    def add_start(a, b):
-        ensure_entry(a, b)
-        time_entries[str(a.id)][str(b.id)]["entries"].append(
+# ========= MANEJO DE TIEMPO VC =========
+def save_time(state, member, channel_members, enter=True, current_time=None):
+    """Registra el inicio o fin de las sesiones compartidas de member con channel_members."""
+    time_entries = state.dates
+    current_time = current_time or datetime.now().isoformat()
+    a = _uid(member)
+
+    def add_start(x, y):
+        if y not in time_entries.setdefault(x, {}):
+            time_entries[x][y] = {"entries": []}
+            state.date_refs.setdefault(y, set()).add(x)
+        time_entries[x][y]["entries"].append(
             {"start_time": current_time, "end_time": None}
         )
 
-    def add_end(a, b):
-        entries = time_entries.get(str(a.id), {}).get(str(b.id), {}).get("entries", [])
+    def add_end(x, y):
+        entries = time_entries.get(x, {}).get(y, {}).get("entries", [])
         if entries and entries[-1]["end_time"] is None:
             entries[-1]["end_time"] = current_time
 
-    if enter:
-        add_start(member, channel_member)
-        add_start(channel_member, member)
-    else:
-        add_end(member, channel_member)
-        add_end(channel_member, member)
+    for channel_member in channel_members:
+        b = _uid(channel_member)
+        if enter:
+            add_start(a, b)
+            add_start(b, a)
+            state.sessions.open_pair(a, b, current_time)
+        else:
+            add_end(a, b)
+            add_end(b, a)
+            state.sessions.close_pair(a, b)
 
-    path_dates = get_data_path(member.guild, "dates.json")
-    save_json(path_dates, time_entries)
 
+def calculate_total_time(state, member, channel_members):
+    """Recalcula el tiempo total compartido de member con cada uno de channel_members."""
+    mid = _uid(member)
+    for channel_member in channel_members:
+        _consolidate_pair(state, mid, _uid(channel_member))
 
-def calculate_total_time(time_entries, stats, member, channel_member):
-    """Recalcula el tiempo total compartido entre dos usuarios.
-    Se mantiene reciprocidad en stats."""
-    mid, oid = str(member.id), str(channel_member.id)
+
+def _consolidate_pair(state, mid, oid):
+    """Suma a stats las sesiones cerradas de una pareja (con reciprocidad) y las limpia."""
+    time_entries, stats = state.dates, state.stats
 
     if mid not in time_entries or oid not in time_entries[mid]:
         return
 
     # Calcula tiempo nuevo desde las entradas activas
+    closed = [
+        e
+        for e in time_entries[mid][oid]["entries"]
+        if e["start_time"] and e["end_time"]
+    ]
     new_total = sum(
         (
             datetime.fromisoformat(e["end_time"])
             - datetime.fromisoformat(e["start_time"])
         ).total_seconds()
-        for e in time_entries[mid][oid]["entries"]
-        if e["start_time"] and e["end_time"]
+        for e in closed
     )
+    for e in closed:
+        state.rollups.add_shared(mid, oid, e["start_time"], e["end_time"])
 
     # suma al total previo
-    stats.setdefault(mid, {}).setdefault(oid, {"total_shared_time": 0})
-    stats.setdefault(oid, {}).setdefault(mid, {"total_shared_time": 0})
+    stats.ensure_pair(mid, oid, shared=0.0)
+    stats.ensure_pair(oid, mid, shared=0.0)
 
-    prev_total = stats[mid][oid].get("total_shared_time", 0)
-    total = prev_total + new_total
+    total = stats.shared_time(mid, oid) + new_total
 
-    stats[mid][oid]["total_shared_time"] = total
-    stats[oid][mid]["total_shared_time"] = total
+    stats.set_shared_time(mid, oid, total)
+    stats.set_shared_time(oid, mid, total)
+    state.leaderboard.pairs.update(pair_key(mid, oid), total)
 
     # limpiar histórico ya consolidado
     time_entries[mid][oid]["entries"] = []
     time_entries[oid][mid]["entries"] = []
 
-    path_dates = get_data_path(member.guild, "dates.json")
-    save_json(path_dates, time_entries)
 
-    # guardar stats actualizado
-    path_stats = get_data_path(member.guild, "stats.json")
-    save_json(path_stats, stats)
-
-
-# ========= HISTORIAL DE CANALES =========
-def update_channel_history(historiales_por_canal, channel_id, cambio):
+def start_total_solo(state, member, current_time, channel_id=None):
     """
-    Actualiza el historial de miembros de un canal de voz.
-
-    Parámetros:
-    - historiales_por_canal: dict[int, list[int]]
-        Diccionario que guarda por cada canal una lista con la cantidad
-        de miembros a lo largo del tiempo.
-    - channel_id: int
-        ID del canal que se va a actualizar.
-    - cambio: int
-        +1 si un miembro entra, -1 si un miembro sale.
+    Marca el inicio del periodo 'total solo' para member en dates.json.
+    Devuelve False si ya estaba abierto.
     """
-    historiales_por_canal.setdefault(channel_id, [0])
-    historiales_por_canal[channel_id].append(
-        historiales_por_canal[channel_id][-1] + cambio
-    )
+    time_entries = state.dates
+    mid = _uid(member)
+    if mid not in time_entries:
+        time_entries[mid] = {}
+
+    if not time_entries[mid].get("_solo_total_start"):
+        time_entries[mid]["_solo_total_start"] = current_time
+        time_entries[mid]["_solo_total_channel"] = channel_id
+        state.sessions.open_solo(mid, current_time)
+        return True
 
+    return False
 
-# ========= TEMPORIZADOR =========
-async def timer_task(member, is_depressed, timeout=150, time_entries=None):
+
+def end_total_solo(state, member, current_time):
     """
-    Marca un usuario como deprimido si permanece solo demasiado tiempo.
-    Guarda en time_entries (dates.json) la marca de solo depresivo dentro del usuario.
+    Cierra el periodo 'total solo' leyendo de dates.json y suma el resultado
+    en stats.json. Devuelve los segundos sumados (False si no había periodo abierto).
     """
-    time_left = timeout
-    mid = str(member.id)
+    time_entries, stats = state.dates, state.stats
+    mid = _uid(member)
+    start_iso = time_entries.get(mid, {}).get("_solo_total_start")
+
+    if not start_iso:
+        # Sin periodo abierto no hay nada que registrar en el diario
+        return False
+
     try:
-        while time_left > 0:
-            await asyncio.sleep(1)
-            if time_left % 30 == 0 or time_left == timeout:
-                print(
-                    f"[{member.guild.name}] {member.display_name} se deprimirá en {time_left}s."
-                )
-            time_left -= 1
+        start_dt = datetime.fromisoformat(start_iso)
+    except Exception:
+        time_entries[mid]["_solo_total_start"] = None
+        state.sessions.close_solo(mid)
+        return 0
 
-        is_depressed[mid] = True
+    elapsed = (datetime.fromisoformat(current_time) - start_dt).total_seconds()
 
-        # Guardamos el marcador dentro del usuario en time_entries
-        if time_entries is not None:
-            user_entry = time_entries.setdefault(mid, {})
-            user_entry["_solo_depressive_start"] = datetime.now().isoformat()
-            user_entry["_solo_depressive_channel_id"] = getattr(
-                member.voice.channel, "id", None
-            )
+    user = stats.user(mid)
+    user["total_solo_time"] = user.get("total_solo_time", 0) + elapsed
+    state.leaderboard.solo.update(mid, user["total_solo_time"])
+    state.rollups.add_solo(mid, start_iso, current_time)
 
-            path_dates = get_data_path(member.guild, "dates.json")
-            save_json(path_dates, time_entries)
+    time_entries[mid].pop("_solo_total_start", None)
+    time_entries[mid].pop("_solo_total_channel", None)
+    state.sessions.close_solo(mid)
 
-        print(
-            f"\033[93m[{member.guild.name}] {member.display_name} se ha marcado con depresión.\033[0m"
-        )
+    return elapsed
 
-    except asyncio.CancelledError:
-        print(
-            f"\033[93m[{member.guild.name}] Temporizador cancelado para {member.display_name} antes de deprimirse (quedaban {time_left}s).\033[0m"
-        )
-        is_depressed[mid] = False
+
+# ========= AJUSTES DE USUARIO =========
+def set_opt_out(state, member, opted_out: bool):
+    """Activa o desactiva el seguimiento (opt_out_logs) de un usuario."""
+    state.stats.user(_uid(member))["opt_out_logs"] = opted_out
+
+
+def index_dates(dates: dict) -> dict:
+    """Índice inverso de dates.json: {uid: IDs x con una entrada dates[x][uid]}."""
+    refs = {}
+    for uid, entry in dates.items():
+        if not isinstance(entry, dict):
+            continue
+        for other, value in entry.items():
+            if isinstance(value, dict):
+                refs.setdefault(other, set()).add(uid)
+    return refs
+
+
+def erase_user(state, member):
+    """
+    Borra todo rastro del usuario en stats y dates y desactiva su seguimiento.
+    Solo visita a quienes tenían datos con él (índices inversos). Devuelve
+    los IDs de esos usuarios, cuyas entradas también han cambiado.
+    """
+    mid = _uid(member)
+    touched = set()
+    for other_user_id in state.date_refs.pop(mid, set()):
+        other_user_data = state.dates.get(other_user_id)
+        if other_user_id != mid and isinstance(other_user_data, dict):
+            other_user_data.pop(mid, None)
+            touched.add(other_user_id)
+    own = state.dates.pop(mid, None)
+    if isinstance(own, dict):
+        for other, value in own.items():
+            if isinstance(value, dict):
+                state.date_refs.get(other, set()).discard(mid)
+    state.sessions.drop_user(mid)
+    state.leaderboard.forget_user(mid)
+
+    partners = state.stats.remove_user(mid)
+    state.rollups.drop_user(mid, partners)
+    touched |= partners
+    state.stats.user(mid)["opt_out_logs"] = True
+    touched.discard(mid)
+    return touched
+
+
+# ========= DIARIO DE EVENTOS =========
+# Las operaciones de pareja llevan al usuario que se mueve en "a" y a todos
+# los del canal en "bs", de modo que un evento es una sola operación.
+def op_partners(op) -> list:
+    """Usuarios de "bs" de una operación de pareja (o el "b" de diarios antiguos)."""
+    return op["bs"] if "bs" in op else [op["b"]]
+
+
+def _op_join(state, op):
+    handle_call_data(state, op["a"], op_partners(op), op["ts"])
+    save_time(state, op["a"], op_partners(op), True, op["ts"])
+
+
+def _op_leave(state, op):
+    save_time(state, op["a"], op_partners(op), False, op["ts"])
+    calculate_total_time(state, op["a"], op_partners(op))
+
+
+def _op_move(state, op):
+    # Salida del canal origen en un movimiento: también cuenta como llamada
+    save_time(state, op["a"], op_partners(op), False, op["ts"])
+    handle_call_data(state, op["a"], op_partners(op), op["ts"])
+    calculate_total_time(state, op["a"], op_partners(op))
+
+
+VOICE_OPS = {
+    "join": _op_join,
+    "leave": _op_leave,
+    "move": _op_move,
+    "solo_start": lambda state, op: start_total_solo(
+        state, op["uid"], op["ts"], op.get("channel")
+    ),
+    "solo_end": lambda state, op: end_total_solo(state, op["uid"], op["ts"]),
+    "depressive": lambda state, op: mark_depressive(
+        state, op["uid"], op["ts"], op.get("channel")
+    ),
+    "depressive_end": lambda state, op: close_depressive(state, op["uid"], op["ts"]),
+    "depressive_clear": lambda state, op: clear_solo_depressive(state, op["uid"]),
+    "opt_out": lambda state, op: set_opt_out(state, op["uid"], op["value"]),
+    "erase": lambda state, op: erase_user(state, op["uid"]),
+}
+
+
+def apply_op(state, op: dict):
+    """Aplica una operación del diario sobre el estado y devuelve su resultado."""
+    return VOICE_OPS[op["op"]](state, op)
+
+
+# ========= TEMPORIZADOR =========
+def depressive_timer_expired(member, is_depressed, state):
+    """
+    Trabajo del actor que se encola al vencer el plazo de solo de un usuario
+    (ver VoiceCog.start_timer). Lo marca como deprimido si sigue solo en su
+    canal; si entretanto alguien ha entrado o se ha ido, no hace nada.
+    """
+    channel = getattr(member.voice, "channel", None)
+    if channel is None or len(channel.members) != 1:
+        return
+
+    mid = str(member.id)
+    is_depressed[mid] = True
+    # Guardamos el marcador dentro del usuario en dates.json
+    state.record("depressive", uid=mid, channel=channel.id)
+    print(
+        f"\033[93m[{member.guild.name}] {member.display_name} se ha marcado con depresión.\033[0m"
+    )
 
 
 # ========= ACTUALIZACIÓN JSON =========
@@ -386,16 +781,12 @@ async def update_json_file(bot, interaction, filename, global_vars: dict, timeou
         except Exception:
             return False
 
-    tmp_name = None
     try:
         message = await bot.wait_for("message", check=check, timeout=timeout)
         attachment = message.attachments[0]
 
-        tmp_name = f"tmp_{user.id}_{attachment.filename}"
-        await attachment.save(tmp_name)
-
-        with open(tmp_name, "r", encoding="utf-8") as f:
-            new_data = json.load(f)
+        # Se lee el adjunto en memoria, sin archivo temporal en disco
+        new_data = json.loads(await attachment.read())
 
         # Actualizamos la variable global correspondiente
         obj = global_vars.get(filename)
@@ -407,20 +798,10 @@ async def update_json_file(bot, interaction, filename, global_vars: dict, timeou
 
         guild = interaction.guild
         if guild:
-            path_write = get_data_path(guild, filename)
+            # El estado residente se sustituye y se vuelca a disco al momento
+            await bot.guild_store.replace(guild, filename, new_data)
         else:
-            path_write = filename
-
-        os.makedirs(os.path.dirname(path_write) or ".", exist_ok=True)
-        save_json(path_write, new_data)
-
-        # Borrar la carpeta temporal
-        try:
-            folder = os.path.dirname(path_write)
-            if folder and os.path.exists(folder):
-                shutil.rmtree(folder)
-        except Exception:
-            pass
+            await save_json_async(filename, new_data)
 
         try:
             await user.send(
@@ -432,7 +813,6 @@ async def update_json_file(bot, interaction, filename, global_vars: dict, timeou
                 ephemeral=True,
             )
 
-        os.remove(tmp_name)
         print(
             f"\033[32m[{user.guild.name}] Copia local de {filename} actualizada.\033[0m"
         )
@@ -452,6 +832,4 @@ async def update_json_file(bot, interaction, filename, global_vars: dict, timeou
         await interaction.followup.send(
             f"Ocurrió un error con `{filename}`: {e}", ephemeral=True
         )
-        if tmp_name and os.path.exists(tmp_name):
-            os.remove(tmp_name)
         return False
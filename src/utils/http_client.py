@@ -0,0 +1,120 @@
+# src/utils/http_client.py
+# Cliente HTTP compartido (keep-alive + pool de conexiones) para las llamadas salientes.
+
+import re
+import time
+
+import httpx
+
+from src.config import (
+    HTTP2_ENABLED,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE,
+    HTTP_TIMEOUT,
+)
+
+# IDs de Discord en las rutas: se agrupan las métricas por plantilla (/stats/:id)
+_ID_RE = re.compile(r"/\d+(?=/|$)")
+
+
+class PooledHttpClient:
+    """
+    Un único `httpx.AsyncClient` para todo el bot (`bot.http_pool`): las
+    conexiones se reutilizan entre peticiones y servidores (sin repetir el
+    handshake TLS) y, si está instalado `h2`, se negocia HTTP/2. Se crea en
+    `setup_hook` y se cierra al apagar el bot. Cada petición anota su
+    duración por método y ruta para `metrics`.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = HTTP_MAX_CONNECTIONS,
+        max_keepalive: int = HTTP_MAX_KEEPALIVE,
+        keepalive_expiry: float = HTTP_KEEPALIVE_EXPIRY,
+        timeout: float = HTTP_TIMEOUT,
+        http2: bool = HTTP2_ENABLED,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(timeout)
+        self.http2 = http2
+        self._client = None
+        self._stats = {}  # "MÉTODO /ruta" -> contadores
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            try:
+                self._client = httpx.AsyncClient(
+                    limits=self.limits, timeout=self.timeout, http2=self.http2
+                )
+            except ImportError:
+                # http2=True necesita el paquete h2 (httpx[http2])
+                print(
+                    "\033[33m[HTTP][WARN] Paquete h2 no instalado: se usa HTTP/1.1.\033[0m"
+                )
+                self.http2 = False
+                self._client = httpx.AsyncClient(
+                    limits=self.limits, timeout=self.timeout
+                )
+        return self._client
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        key = f"{method} {_ID_RE.sub('/:id', httpx.URL(url).path)}"
+        started = time.perf_counter()
+        response = None
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            return response
+        finally:
+            self._record(key, time.perf_counter() - started, response)
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    def _record(self, key: str, elapsed: float, response):
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = {
+                "requests": 0,
+                "errors": 0,
+                "total": 0.0,
+                "max": 0.0,
+                "versions": {},
+            }
+        stats["requests"] += 1
+        stats["total"] += elapsed
+        stats["max"] = max(stats["max"], elapsed)
+        if response is None or response.status_code >= 500:
+            stats["errors"] += 1
+        if response is not None:
+            versions = stats["versions"]
+            versions[response.http_version] = versions.get(response.http_version, 0) + 1
+
+    def metrics(self, reset: bool = False) -> dict:
+        """Peticiones, errores y latencias por ruta; con `reset` se reinician."""
+        data = {
+            key: {
+                "requests": stats["requests"],
+                "errors": stats["errors"],
+                "avg_ms": stats["total"] / stats["requests"] * 1000,
+                "max_ms": stats["max"] * 1000,
+                "http_versions": dict(stats["versions"]),
+            }
+            for key, stats in self._stats.items()
+        }
+        if reset:
+            self._stats = {}
+        return data
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
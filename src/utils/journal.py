@@ -0,0 +1,87 @@
+# src/utils/journal.py
+# Diario append-only de eventos de voz por servidor (journal.jsonl).
+
+import json
+import os
+
+
+class VoiceJournal:
+    """
+    Diario de operaciones de un servidor, una línea JSON por operación.
+    Las operaciones se acumulan en memoria y se escriben por lotes con un único
+    fsync (`sync`); tras una compactación a snapshot el diario se vacía.
+    Cada operación lleva un `seq` creciente, de modo que al arrancar solo se
+    reproducen las posteriores al snapshot aunque no se llegara a truncar.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._buffer = []
+        self.records = 0  # Operaciones en disco desde la última compactación
+
+    @property
+    def pending(self) -> int:
+        """Operaciones pendientes de escribir."""
+        return len(self._buffer)
+
+    def append(self, op: dict):
+        self._buffer.append(json.dumps(op, separators=(",", ":")))
+
+    def take(self) -> list:
+        """Saca del búfer las líneas pendientes para escribirlas con `write`."""
+        lines, self._buffer = self._buffer, []
+        return lines
+
+    def restore(self, lines: list):
+        """Devuelve al búfer unas líneas cuya escritura ha fallado."""
+        self._buffer[:0] = lines
+
+    def write(self, lines: list) -> int:
+        """Añade las líneas al archivo con un único fsync (apto para un hilo)."""
+        if not lines:
+            return 0
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.records += len(lines)
+        return len(lines)
+
+    def sync(self) -> int:
+        """Escribe de inmediato las operaciones pendientes."""
+        return self.write(self.take())
+
+    def replay(self, after_seq: int = 0) -> list:
+        """
+        Lee el diario y devuelve las operaciones con seq > after_seq.
+        Una última línea incompleta (escritura cortada por un cierre brusco)
+        se descarta.
+        """
+        ops = []
+        self.records = 0
+        if not os.path.exists(self.path):
+            return ops
+
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    op = json.loads(line)
+                except json.JSONDecodeError:
+                    print(
+                        f"\033[33m[JOURNAL][WARN] Línea incompleta descartada en {self.path}.\033[0m"
+                    )
+                    break
+                self.records += 1
+                if op.get("seq", 0) > after_seq:
+                    ops.append(op)
+        return ops
+
+    def truncate(self):
+        """Vacía el archivo del diario (tras compactar su contenido en un snapshot)."""
+        if os.path.exists(self.path):
+            with open(self.path, "w", encoding="utf-8"):
+                pass
+        self.records = 0
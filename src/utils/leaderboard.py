@@ -0,0 +1,122 @@
+# src/utils/leaderboard.py
+# Clasificaciones del servidor (/ranking) mantenidas de forma incremental.
+
+from bisect import bisect_left, insort
+from heapq import nsmallest
+
+from src.config import LEADERBOARD_SIZE
+
+
+class TopK:
+    """
+    Las `capacity` claves con mayor puntuación, en una lista ordenada.
+    Las subidas de puntuación (lo habitual: los contadores solo crecen) se
+    aplican en O(capacity). Si una clave del top baja o desaparece y hay
+    más claves fuera de él, el top se marca incompleto y la siguiente
+    consulta lo reconstruye desde `source()`, que devuelve (clave, puntuación)
+    de todas las claves; así no hace falta guardar las puntuaciones de todas.
+    """
+
+    def __init__(self, source, capacity: int = LEADERBOARD_SIZE * 2):
+        self.source = source
+        self.capacity = capacity
+        self._top = []  # [(-puntuación, clave)] ordenado
+        self._scores = {}  # clave -> puntuación de las que están en _top
+        self.complete = False  # Se construye en la primera consulta
+
+    def invalidate(self):
+        self.complete = False
+
+    def _discard(self, key):
+        score = self._scores.pop(key, None)
+        if score is not None:
+            del self._top[bisect_left(self._top, (-score, key))]
+        return score
+
+    def update(self, key, score):
+        """Anota la nueva puntuación de `key`."""
+        if not self.complete:
+            return  # Se leerá de `source` al reconstruir
+        old = self._discard(key)
+        if old is not None and score < old:
+            # Bajada: puede haber claves de fuera del top por encima
+            self.complete = False
+            return
+        if len(self._top) >= self.capacity:
+            if (-score, key) >= self._top[-1]:
+                return
+            del self._scores[self._top.pop()[1]]
+        insort(self._top, (-score, key))
+        self._scores[key] = score
+
+    def remove(self, key):
+        """Quita `key` del top (p. ej. un usuario que borra sus datos)."""
+        if self._discard(key) is not None:
+            self.complete = False
+
+    def keys(self):
+        return list(self._scores)
+
+    def top(self, k: int) -> list:
+        """Las k primeras como [(clave, puntuación)], en O(k) si el top está al día."""
+        if not self.complete:
+            # Mismo orden que la lista: (-puntuación, clave)
+            self._top = nsmallest(
+                self.capacity, ((-score, key) for key, score in self.source())
+            )
+            self._scores = {key: -neg for neg, key in self._top}
+            self.complete = True
+        return [(key, -neg) for neg, key in self._top[:k]]
+
+
+def pair_key(a: str, b: str) -> tuple:
+    return (a, b) if a <= b else (b, a)
+
+
+def _number(value):
+    return value if isinstance(value, (int, float)) else 0
+
+
+class Leaderboard:
+    """
+    Clasificaciones de un servidor sobre su `StatsTable`:
+    - `pairs`: parejas por tiempo compartido;
+    - `solo`: usuarios por tiempo a solas;
+    - `depressive`: usuarios por intentos depresivos.
+    Los aplicadores de helpers.py avisan de cada contador que cambia.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+        self.pairs = TopK(self._pair_scores)
+        self.solo = TopK(lambda: self._user_scores("total_solo_time"))
+        self.depressive = TopK(lambda: self._user_scores("depressive_attempts"))
+
+    def _pair_scores(self):
+        best = {}
+        for a, b in self.stats.pair_keys():
+            if a == b:
+                continue
+            key = pair_key(a, b)
+            shared = _number(self.stats.pair(a, b).get("total_shared_time", 0))
+            if shared > best.get(key, 0):
+                best[key] = shared
+        return best.items()
+
+    def _user_scores(self, field):
+        for uid in self.stats:
+            fields = self.stats.user_fields(uid)
+            if isinstance(fields, dict) and _number(fields.get(field, 0)) > 0:
+                yield uid, fields[field]
+
+    def invalidate(self):
+        """Tras sustituir stats.json entero."""
+        for board in (self.pairs, self.solo, self.depressive):
+            board.invalidate()
+
+    def forget_user(self, uid: str):
+        self.solo.remove(uid)
+        self.depressive.remove(uid)
+        for key in self.pairs.keys():
+            if uid in key:
+                self.pairs.remove(key)
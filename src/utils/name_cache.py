@@ -0,0 +1,121 @@
+# src/utils/name_cache.py
+# Caché compartida de nombres visibles de usuarios (TTL + LRU).
+
+import asyncio
+import time
+from collections import OrderedDict
+
+import discord
+
+from src.config import NAME_CACHE_SIZE, NAME_CACHE_TTL, NAME_FETCH_CONCURRENCY
+
+
+class NameCache:
+    """
+    Nombres visibles por (servidor, usuario), propiedad del bot (`bot.name_cache`).
+    Cada entrada caduca a los `ttl` segundos y, pasado `maxsize`, se descarta
+    la menos usada. Los IDs que no están en la caché del gateway se piden a la
+    API en paralelo, con como mucho `concurrency` peticiones a la vez, y las
+    peticiones repetidas de un mismo ID comparten la misma consulta.
+    """
+
+    def __init__(
+        self,
+        bot,
+        maxsize: int = NAME_CACHE_SIZE,
+        ttl: float = NAME_CACHE_TTL,
+        concurrency: int = NAME_FETCH_CONCURRENCY,
+    ):
+        self.bot = bot
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # (gid, uid) -> (caducidad, nombre o None)
+        self._inflight = {}  # (gid, uid) -> Task de la consulta en curso
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.hits = 0
+        self.misses = 0
+
+    # ----- Caché -----
+    def get(self, guild, uid: str):
+        """
+        Nombre en caché o en la caché del gateway. Devuelve (encontrado, nombre);
+        el nombre es None si se sabe que el usuario ya no existe.
+        """
+        if not str(uid).isdigit():
+            return True, None  # Clave anómala (p. ej. "None"): no es un usuario
+        key = (guild.id, str(uid))
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+        member = guild.get_member(int(uid))
+        if member is not None:
+            self.put(guild, uid, member.display_name)
+            self.hits += 1
+            return True, member.display_name
+
+        self.misses += 1
+        return False, None
+
+    def put(self, guild, uid: str, name):
+        key = (guild.id, str(uid))
+        self._entries[key] = (time.monotonic() + self.ttl, name)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    # ----- Resolución -----
+    async def resolve_many(self, guild, uids) -> dict:
+        """{uid: nombre o None} de los IDs indicados, consultando la API solo para los que faltan."""
+        names, missing = {}, []
+        for uid in dict.fromkeys(str(uid) for uid in uids):
+            found, name = self.get(guild, uid)
+            if found:
+                names[uid] = name
+            else:
+                missing.append(uid)
+
+        if missing:
+            results = await asyncio.gather(
+                *(self._resolve(guild, uid) for uid in missing)
+            )
+            names.update(zip(missing, results))
+        return names
+
+    def _resolve(self, guild, uid: str):
+        key = (guild.id, uid)
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(self._fetch(guild, uid))
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return task
+
+    async def _fetch(self, guild, uid: str):
+        async with self._semaphore:
+            try:
+                name = await self._fetch_name(guild, uid)
+            except discord.RateLimited as e:
+                # discord.py ya espera los límites cortos; uno largo se reintenta una vez
+                await asyncio.sleep(e.retry_after)
+                try:
+                    name = await self._fetch_name(guild, uid)
+                except (discord.RateLimited, discord.HTTPException):
+                    return None
+            except discord.HTTPException:
+                return None  # Error transitorio: no se guarda en caché
+        self.put(guild, uid, name)
+        return name
+
+    async def _fetch_name(self, guild, uid: str):
+        # Primero el miembro del servidor (tiene apodo)
+        try:
+            return (await guild.fetch_member(int(uid))).display_name
+        except discord.NotFound:
+            pass  # El usuario ya no está en el servidor
+        # Si se fue del servidor, el usuario global
+        try:
+            return (await self.bot.fetch_user(int(uid))).display_name
+        except discord.NotFound:
+            return None
@@ -0,0 +1,188 @@
+# src/utils/occupancy.py
+# Ocupación de los canales de voz: búfer circular de cambios + resúmenes por minuto.
+
+import time
+from array import array
+
+from src.config import OCCUPANCY_EVENTS, OCCUPANCY_MINUTES
+
+
+class RingBuffer:
+    """
+    Array de como mucho `size` valores en el que, una vez lleno, cada valor
+    nuevo sustituye al más antiguo. Crece a medida que se usa, así que un
+    canal poco activo no ocupa el tamaño máximo.
+    """
+
+    def __init__(self, typecode: str, size: int):
+        self.data = array(typecode)
+        self.size = size
+        self.start = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def append(self, value):
+        if self.count < self.size:
+            # Aún sin llenar: start es 0 y los valores van en orden
+            self.data.append(value)
+            self.count += 1
+        else:
+            # Lleno: el nuevo ocupa el lugar del más antiguo
+            self.data[self.start] = value
+            self.start = (self.start + 1) % self.size
+
+    def __getitem__(self, i: int):
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        return self.data[(self.start + i) % self.size]
+
+    def __iter__(self):
+        """Del más antiguo al más reciente."""
+        for i in range(self.count):
+            yield self.data[(self.start + i) % self.size]
+
+
+class ChannelOccupancy:
+    """
+    Ocupación de un canal con memoria constante:
+    - los últimos `events` cambios como (epoch, miembros tras el cambio);
+    - los últimos `minutes` minutos resumidos en máximo y media ponderada
+      por tiempo de miembros conectados.
+    Los búferes se reservan a medida que se llenan.
+    """
+
+    def __init__(
+        self, events: int = OCCUPANCY_EVENTS, minutes: int = OCCUPANCY_MINUTES
+    ):
+        self.times = RingBuffer("d", events)
+        self.levels = RingBuffer("H", events)
+        self.minutes = RingBuffer("q", minutes)
+        self.peaks = RingBuffer("H", minutes)
+        self.averages = RingBuffer("f", minutes)
+        self.current = 0
+        # Minuto en curso (aún sin cerrar): desde cuándo se mide y hasta dónde se ha acumulado
+        self._minute = None
+        self._start = 0.0
+        self._since = 0.0
+        self._peak = 0
+        self._area = 0.0
+
+    def record(self, level: int, now: float = None):
+        """Anota que el canal tiene ahora `level` miembros."""
+        now = time.time() if now is None else now
+        self._advance(now)
+        self._area += self.current * (now - self._since)
+        self._since = now
+        self.current = level
+        self._peak = max(self._peak, level)
+        self.times.append(now)
+        self.levels.append(level)
+
+    def _advance(self, now: float):
+        """Cierra los minutos completos hasta `now` con la ocupación vigente."""
+        minute = int(now // 60)
+        if self._minute is None:
+            self._minute, self._start, self._since = minute, now, now
+            self._peak = self.current
+            return
+        while self._minute < minute:
+            self._close()
+            # Un hueco más largo que el histórico solo dejaría minutos descartados
+            self._minute = max(self._minute + 1, minute - self.minutes.size + 1)
+            self._start = self._since = self._minute * 60
+            self._peak, self._area = self.current, 0.0
+
+    def _close(self):
+        end = (self._minute + 1) * 60
+        self._area += self.current * (end - self._since)
+        self.minutes.append(self._minute)
+        self.peaks.append(self._peak)
+        self.averages.append(self._area / max(end - self._start, 1e-9))
+
+    def rollups(self, window: int, now: float = None) -> list:
+        """
+        Resúmenes (minuto, máximo, media) de los últimos `window` minutos,
+        incluido el minuto en curso.
+        """
+        now = time.time() if now is None else now
+        self._advance(now)
+        first = int(now // 60) - window + 1
+        rows = [
+            (minute, peak, avg)
+            for minute, peak, avg in zip(self.minutes, self.peaks, self.averages)
+            if minute >= first
+        ]
+        elapsed = now - self._start
+        if elapsed > 0:
+            area = self._area + self.current * (now - self._since)
+            rows.append((self._minute, self._peak, area / elapsed))
+        return rows
+
+    def summary(self, window: int, now: float = None) -> dict:
+        """Ocupación actual, máxima (y cuándo) y media de los últimos `window` minutos."""
+        rows = self.rollups(window, now)
+        if not rows:
+            return {
+                "current": self.current,
+                "peak": self.current,
+                "peak_at": None,
+                "avg": float(self.current),
+            }
+        peak_minute, peak, _ = max(rows, key=lambda row: (row[1], row[0]))
+        return {
+            "current": self.current,
+            "peak": peak,
+            "peak_at": peak_minute * 60,
+            "avg": sum(row[2] for row in rows) / len(rows),
+        }
+
+
+class OccupancyTracker:
+    """
+    Ocupación de los canales de voz por ID de canal. Solo se guardan los
+    canales con actividad en el histórico de minutos (ver `_evict_idle`).
+    """
+
+    def __init__(
+        self, events: int = OCCUPANCY_EVENTS, minutes: int = OCCUPANCY_MINUTES
+    ):
+        self.events = events
+        self.minutes = minutes
+        self.channels = {}
+        self._swept = 0.0  # Última limpieza de canales inactivos
+
+    def record(self, channel_id: int, level: int, now: float = None):
+        channel = self.channels.get(channel_id)
+        if channel is None:
+            channel = self.channels[channel_id] = ChannelOccupancy(
+                self.events, self.minutes
+            )
+        channel.record(level, now)
+        self._evict_idle(time.time() if now is None else now)
+
+    def forget(self, channel_id: int):
+        """Descarta un canal (p. ej. borrado)."""
+        self.channels.pop(channel_id, None)
+
+    def _evict_idle(self, now: float):
+        """
+        Como mucho una vez por minuto, descarta los canales vacíos sin cambios
+        en todo el histórico de minutos: su resumen ya solo serían ceros. Así
+        los canales temporales no se acumulan aunque no llegue su borrado.
+        """
+        if now - self._swept < 60:
+            return
+        self._swept = now
+        cutoff = now - self.minutes * 60
+        for channel_id, channel in list(self.channels.items()):
+            if channel.current == 0 and channel.times[-1] < cutoff:
+                del self.channels[channel_id]
+
+    def summary(self, channel_id: int, window: int, now: float = None):
+        """Resumen de un canal (ver ChannelOccupancy.summary) o None si no hay datos."""
+        channel = self.channels.get(channel_id)
+        return None if channel is None else channel.summary(window, now)
@@ -0,0 +1,90 @@
+# src/utils/open_sessions.py
+# Tabla en memoria de las sesiones abiertas (parejas en llamada y periodos solo).
+
+from datetime import datetime
+
+
+def _parse(iso):
+    try:
+        return datetime.fromisoformat(iso)
+    except (TypeError, ValueError):
+        return None
+
+
+class OpenSessions:
+    """
+    Sesiones en curso de un servidor con su hora de inicio ya parseada:
+    - `pairs`: {frozenset(a, b): inicio} de las parejas que comparten canal;
+    - `solo`: {uid: inicio} de los periodos 'total solo' abiertos.
+
+    La mantienen los aplicadores de helpers.py a la vez que dates.json, de
+    modo que las consultas pueden sumar `ahora - inicio` a los totales de
+    stats sin que haya que escribir nada mientras dura la llamada.
+    """
+
+    def __init__(self):
+        self.pairs = {}
+        self.solo = {}
+
+    @classmethod
+    def from_dates(cls, dates: dict) -> "OpenSessions":
+        """Reconstruye la tabla a partir de las entradas abiertas de dates.json."""
+        sessions = cls()
+        for uid, entry in dates.items():
+            if not isinstance(entry, dict):
+                continue
+            sessions.open_solo(uid, entry.get("_solo_total_start"))
+            for other, value in entry.items():
+                if isinstance(value, dict) and value.get("entries"):
+                    last = value["entries"][-1]
+                    if last.get("end_time") is None:
+                        sessions.open_pair(uid, other, last.get("start_time"))
+        return sessions
+
+    # ----- Mantenimiento (desde los aplicadores) -----
+    def open_pair(self, a: str, b: str, start_iso: str):
+        start = _parse(start_iso)
+        if start is not None:
+            # Como en dates.json, cuenta la última entrada abierta
+            self.pairs[frozenset((a, b))] = start
+
+    def close_pair(self, a: str, b: str):
+        self.pairs.pop(frozenset((a, b)), None)
+
+    def open_solo(self, uid: str, start_iso: str):
+        start = _parse(start_iso)
+        if start is not None:
+            self.solo[uid] = start
+
+    def close_solo(self, uid: str):
+        self.solo.pop(uid, None)
+
+    def drop_user(self, uid: str):
+        """Olvida todas las sesiones en las que aparece `uid`."""
+        self.close_solo(uid)
+        for pair in [pair for pair in self.pairs if uid in pair]:
+            del self.pairs[pair]
+
+    # ----- Consultas -----
+    @staticmethod
+    def _elapsed(start, now, since) -> float:
+        if start is None:
+            return 0.0
+        if since is not None:
+            start = max(start, since)
+        return max(0.0, ((now or datetime.now()) - start).total_seconds())
+
+    def shared_elapsed(
+        self, a: str, b: str, now: datetime = None, since: datetime = None
+    ) -> float:
+        """
+        Segundos de la sesión en curso entre a y b (0 si no comparten canal),
+        contando solo desde `since` si se indica.
+        """
+        return self._elapsed(self.pairs.get(frozenset((a, b))), now, since)
+
+    def solo_elapsed(
+        self, uid: str, now: datetime = None, since: datetime = None
+    ) -> float:
+        """Segundos del periodo 'total solo' en curso de uid (0 si no está solo)."""
+        return self._elapsed(self.solo.get(uid), now, since)
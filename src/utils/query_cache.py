@@ -0,0 +1,76 @@
+# src/utils/query_cache.py
+# Caché de resultados de consultas por servidor, invalidada por versiones de usuario.
+
+from collections import OrderedDict
+
+from src.config import QUERY_CACHE_SIZE
+
+
+class QueryCache:
+    """
+    Resultados ya derivados de stats (p. ej. los de /datos_llamada) por clave.
+    Cada resultado se guarda con un sello: las versiones de los usuarios de
+    los que depende, más una época global. GuildState sube la versión de
+    cada usuario que toca una mutación (y la época si cambia todo), así que
+    un resultado vale mientras su sello coincida con el actual. Pasado
+    `maxsize`, se descarta el menos usado.
+    """
+
+    def __init__(self, maxsize: int = QUERY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._versions = {}  # uid -> nº de mutaciones que lo han tocado
+        self._epoch = 0
+        self._entries = OrderedDict()  # clave -> (sello, resultado)
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0  # Fallos por una entrada invalidada (no por no estar)
+
+    # ----- Invalidación (desde GuildState) -----
+    def bump(self, uids):
+        for uid in uids:
+            self._versions[uid] = self._versions.get(uid, 0) + 1
+
+    def bump_all(self):
+        self._epoch += 1
+        self._entries.clear()
+
+    # ----- Consultas -----
+    def stamp(self, uids) -> tuple:
+        """
+        Sello actual de un resultado que depende de `uids`. Se toma antes de
+        derivarlo, para que una mutación intermedia lo deje ya invalidado.
+        """
+        return (self._epoch, *(self._versions.get(uid, 0) for uid in uids))
+
+    def get(self, key, stamp: tuple):
+        """Devuelve (encontrado, resultado) de `key` si sigue valiendo para `stamp`."""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == stamp:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+        self.misses += 1
+        if entry is not None:
+            self.stale += 1
+        return False, None
+
+    def put(self, key, stamp: tuple, value):
+        self._entries[key] = (stamp, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def metrics(self, reset: bool = False) -> dict:
+        """Aciertos, fallos y tamaño; con `reset` se reinician los contadores."""
+        lookups = self.hits + self.misses
+        data = {
+            "entries": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+        if reset:
+            self.hits = self.misses = self.stale = 0
+        return data
@@ -0,0 +1,55 @@
+# src/utils/retention.py
+# Política de retención del histórico de FastAPI (tabla json_data de webserver.py).
+
+from datetime import datetime, timedelta
+
+from src.config import HISTORY_DAILY_DAYS, HISTORY_HOURLY_HOURS
+
+
+def retention_bucket(
+    created_at: datetime,
+    now: datetime,
+    hourly_hours: float = HISTORY_HOURLY_HOURS,
+    daily_days: float = HISTORY_DAILY_DAYS,
+) -> datetime:
+    """
+    Cubeta de un registro según su antigüedad: su hora en las últimas
+    `hourly_hours` horas, su día hasta `daily_days` días y, después, el
+    lunes de su semana ISO.
+    """
+    if created_at >= now - timedelta(hours=hourly_hours):
+        return created_at.replace(minute=0, second=0, microsecond=0)
+    day = created_at.replace(hour=0, minute=0, second=0, microsecond=0)
+    if created_at >= now - timedelta(days=daily_days):
+        return day
+    return day - timedelta(days=day.weekday())
+
+
+def expired_records(
+    rows,
+    now: datetime,
+    keep=(),
+    hourly_hours: float = HISTORY_HOURLY_HOURS,
+    daily_days: float = HISTORY_DAILY_DAYS,
+) -> list:
+    """
+    IDs de los registros que sobran: de cada servidor y cubeta solo se queda
+    el más reciente (por created_at y, a igualdad, id). `rows` son tuplas
+    (id, guild_id, created_at). Nunca se devuelven los IDs de `keep` (el
+    último registro de cada servidor) ni los registros sin fecha.
+    """
+    newest = {}  # (guild_id, cubeta) -> (created_at, id)
+    expired = []
+    for record_id, gid, created_at in rows:
+        if created_at is None:
+            continue
+        key = (gid, retention_bucket(created_at, now, hourly_hours, daily_days))
+        best = newest.get(key)
+        if best is None or (created_at, record_id) > best:
+            newest[key] = (created_at, record_id)
+            if best is not None:
+                expired.append(best[1])
+        else:
+            expired.append(record_id)
+    keep = set(keep)
+    return [record_id for record_id in expired if record_id not in keep]
@@ -0,0 +1,186 @@
+# src/utils/rollups.py
+# Contadores por cubetas de tiempo (días, semanas y meses) para consultar periodos.
+
+from datetime import date, datetime, time, timedelta
+
+from src.config import ROLLUP_DAYS, ROLLUP_WEEKS
+
+from .leaderboard import pair_key
+
+# Días que abarca cada periodo de las consultas, contando hoy
+PERIODS = {"hoy": 1, "semana": 7, "mes": 30, "año": 365}
+
+# Posiciones de los valores en cada cubeta
+SOLO, DEP_ATTEMPTS, DEP_TIME = range(3)  # Usuarios
+CALLS_AB, CALLS_BA, SHARED = range(3)  # Parejas (a, b) con a <= b
+
+
+def period_start(period: str, today: date = None):
+    """Primer día incluido en `period` (None = desde siempre)."""
+    days = PERIODS.get(period)
+    if days is None:
+        return None
+    return (today or date.today()) - timedelta(days=days - 1)
+
+
+def bucket_start(key: str) -> date:
+    """Primer día de una cubeta: "2026-10-17" (día), "2026-W42" (semana) o "2026-10" (mes)."""
+    if "-W" in key:
+        year, week = key.split("-W")
+        return date.fromisocalendar(int(year), int(week), 1)
+    if len(key) == 7:
+        return date.fromisoformat(key + "-01")
+    return date.fromisoformat(key)
+
+
+def _week_key(day: date) -> str:
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def split_days(start_iso: str, end_iso: str) -> list:
+    """Reparte el intervalo [start, end] en [(día, segundos)] por días naturales."""
+    try:
+        start = datetime.fromisoformat(start_iso)
+        end = datetime.fromisoformat(end_iso)
+    except (TypeError, ValueError):
+        return []
+    parts = []
+    while start < end:
+        midnight = datetime.combine(
+            start.date() + timedelta(days=1), time.min, tzinfo=start.tzinfo
+        )
+        part_end = min(end, midnight)
+        parts.append((start.date(), (part_end - start).total_seconds()))
+        start = part_end
+    return parts
+
+
+def _day(iso: str):
+    try:
+        return datetime.fromisoformat(iso).date()
+    except (TypeError, ValueError):
+        return None
+
+
+class Rollups:
+    """
+    Los mismos contadores que stats, repartidos en cubetas por día:
+    - `users`: {uid: {cubeta: [tiempo solo, intentos depresivos, tiempo depresivo]}};
+    - `pairs`: {(a, b): {cubeta: [llamadas de stats[a][b], de stats[b][a], tiempo compartido]}},
+      con a <= b.
+
+    Al abrir la primera cubeta de un día en un usuario o pareja se compactan
+    las suyas: los días de más de `days` días pasan a su semana ISO y las
+    semanas de más de `weeks` semanas al mes de su lunes. Así, los periodos
+    de hasta `days` días son exactos y los más largos cuentan semanas y meses
+    enteros. Lo alimentan los aplicadores de helpers.py con la marca de
+    tiempo de cada operación, de modo que reproducir el diario da lo mismo.
+    """
+
+    def __init__(self, days: int = ROLLUP_DAYS, weeks: int = ROLLUP_WEEKS):
+        self.days = days
+        self.weeks = weeks
+        self.users = {}
+        self.pairs = {}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Rollups":
+        rollups = cls()
+        rollups.users = dict(data.get("users", {}))
+        for a, row in data.get("pairs", {}).items():
+            for b, buckets in row.items():
+                rollups.pairs[(a, b)] = buckets
+        return rollups
+
+    def to_dict(self) -> dict:
+        pairs = {}
+        for (a, b), buckets in self.pairs.items():
+            pairs.setdefault(a, {})[b] = buckets
+        return {"users": self.users, "pairs": pairs}
+
+    # ----- Escritura (desde los aplicadores) -----
+    def _bucket(self, buckets: dict, day: date) -> list:
+        key = day.isoformat()
+        bucket = buckets.get(key)
+        if bucket is None:
+            self._compact(buckets, day)
+            bucket = buckets[key] = [0, 0, 0.0]
+        return bucket
+
+    def _compact(self, buckets: dict, today: date):
+        day_cutoff = today - timedelta(days=self.days)
+        week_cutoff = today - timedelta(weeks=self.weeks)
+        for is_old, target in (
+            (lambda key, start: len(key) == 10 and start < day_cutoff, _week_key),
+            (
+                lambda key, start: "-W" in key and start < week_cutoff,
+                lambda start: start.strftime("%Y-%m"),
+            ),
+        ):
+            for key in list(buckets):
+                start = bucket_start(key)
+                if is_old(key, start):
+                    values = buckets.pop(key)
+                    merged = buckets.setdefault(target(start), [0, 0, 0.0])
+                    for i, value in enumerate(values):
+                        merged[i] += value
+
+    def _user(self, uid: str, day: date) -> list:
+        return self._bucket(self.users.setdefault(uid, {}), day)
+
+    def _pair(self, a: str, b: str, day: date) -> list:
+        return self._bucket(self.pairs.setdefault(pair_key(a, b), {}), day)
+
+    def add_call(self, a: str, b: str, ts: str):
+        """Una llamada más en stats[a][b] (b entra donde estaba a)."""
+        day = _day(ts)
+        if day is not None:
+            self._pair(a, b, day)[CALLS_AB if a <= b else CALLS_BA] += 1
+
+    def add_shared(self, a: str, b: str, start_iso: str, end_iso: str):
+        for day, seconds in split_days(start_iso, end_iso):
+            self._pair(a, b, day)[SHARED] += seconds
+
+    def add_solo(self, uid: str, start_iso: str, end_iso: str):
+        for day, seconds in split_days(start_iso, end_iso):
+            self._user(uid, day)[SOLO] += seconds
+
+    def add_depressive(self, uid: str, start_iso: str, end_iso: str):
+        """Un intento depresivo el día en que se cierra, con su tiempo repartido por días."""
+        day = _day(end_iso)
+        if day is not None:
+            self._user(uid, day)[DEP_ATTEMPTS] += 1
+        for day, seconds in split_days(start_iso, end_iso):
+            self._user(uid, day)[DEP_TIME] += seconds
+
+    def drop_user(self, uid: str, partners):
+        """Olvida al usuario y sus parejas con `partners`."""
+        self.users.pop(uid, None)
+        for other in partners:
+            self.pairs.pop(pair_key(uid, other), None)
+
+    # ----- Consultas -----
+    @staticmethod
+    def _sum(buckets, since: date) -> list:
+        total = [0, 0, 0.0]
+        for key, values in (buckets or {}).items():
+            if bucket_start(key) >= since:
+                for i, value in enumerate(values):
+                    total[i] += value
+        return total
+
+    def user_period(self, uid: str, since: date) -> dict:
+        solo, attempts, dep_time = self._sum(self.users.get(uid), since)
+        return {
+            "total_solo_time": solo,
+            "depressive_attempts": attempts,
+            "depressive_time": dep_time,
+        }
+
+    def pair_period(self, a: str, b: str, since: date) -> dict:
+        """Llamadas de stats[a][b] y stats[b][a] y tiempo compartido desde `since`."""
+        calls_lo, calls_hi, shared = self._sum(self.pairs.get(pair_key(a, b)), since)
+        if a > b:
+            calls_lo, calls_hi = calls_hi, calls_lo
+        return {"calls_ab": calls_lo, "calls_ba": calls_hi, "shared": shared}
@@ -0,0 +1,173 @@
+# src/utils/scheduler.py
+# Planificador único de plazos (min-heap indexado) para los temporizadores de solo.
+
+import asyncio
+import heapq
+import time
+
+
+class DeadlineScheduler:
+    """
+    Guarda plazos por clave en un min-heap y los ejecuta con una sola tarea
+    que solo despierta cuando vence el primero (o cuando llega uno anterior).
+    Un índice clave → posición permite cancelar en O(log n).
+
+    Las funciones `callback(*args)` se llaman desde el event loop y deben ser
+    rápidas y no bloqueantes (p. ej. encolar un trabajo en un actor).
+    """
+
+    def __init__(self, name: str = "scheduler"):
+        self.name = name
+        self._heap = []  # Entradas [deadline, seq, key, callback, args]
+        self._pos = {}  # key -> índice de su entrada en _heap
+        self._seq = 0  # Desempate estable entre plazos iguales
+        self._wakeup = None
+        self._task = None
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __contains__(self, key):
+        return key in self._pos
+
+    # ----- API -----
+    def schedule(self, key, delay: float, callback, *args) -> bool:
+        """
+        Programa callback(*args) dentro de `delay` segundos.
+        Devuelve False (sin cambiar nada) si `key` ya tiene un plazo.
+        """
+        if key in self._pos:
+            return False
+
+        self._seq += 1
+        entry = [time.monotonic() + delay, self._seq, key, callback, args]
+        self._heap.append(entry)
+        self._pos[key] = len(self._heap) - 1
+        self._sift_up(len(self._heap) - 1)
+        self._ensure_running()
+        if self._pos[key] == 0:
+            # El nuevo plazo es el más próximo: el bucle debe recalcular su espera
+            self._wakeup.set()
+        return True
+
+    def remaining(self, key):
+        """Segundos que le quedan a `key`, o None si no tiene plazo."""
+        i = self._pos.get(key)
+        if i is None:
+            return None
+        return max(0.0, self._heap[i][0] - time.monotonic())
+
+    def cancel(self, key):
+        """Cancela el plazo de `key`. Devuelve los segundos que le quedaban o None."""
+        i = self._pos.get(key)
+        if i is None:
+            return None
+        entry = self._remove(i)
+        return max(0.0, entry[0] - time.monotonic())
+
+    def cancel_many(self, keys) -> dict:
+        """
+        Cancela varios plazos de una vez. Devuelve {key: segundos restantes}
+        de los que existían. Con muchas claves se reconstruye el heap en O(n)
+        en lugar de hacer una eliminación O(log n) por clave.
+        """
+        keys = [k for k in dict.fromkeys(keys) if k in self._pos]
+        if not keys:
+            return {}
+
+        now = time.monotonic()
+        if len(keys) * 4 < len(self._heap):
+            return {k: max(0.0, self._remove(self._pos[k])[0] - now) for k in keys}
+
+        drop = set(keys)
+        cancelled = {}
+        kept = []
+        for entry in self._heap:
+            if entry[2] in drop:
+                cancelled[entry[2]] = max(0.0, entry[0] - now)
+            else:
+                kept.append(entry)
+        self._heap = kept
+        self._rebuild()
+        return cancelled
+
+    async def close(self):
+        """Detiene la tarea del planificador (los plazos pendientes se descartan)."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # ----- Bucle -----
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            while self._heap and self._heap[0][0] <= now:
+                _, _, key, callback, args = self._remove(0)
+                try:
+                    callback(*args)
+                except Exception as e:
+                    print(
+                        f"\033[31m[{self.name.upper()}] Error al vencer el plazo {key}: {e}\033[0m"
+                    )
+
+            timeout = self._heap[0][0] - now if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    # ----- Heap indexado -----
+    def _remove(self, i: int) -> list:
+        heap = self._heap
+        entry = heap[i]
+        last = heap.pop()
+        del self._pos[entry[2]]
+        if i < len(heap):
+            heap[i] = last
+            self._pos[last[2]] = i
+            self._sift_down(i)
+            self._sift_up(i)
+        return entry
+
+    def _rebuild(self):
+        # (deadline, seq) es único, así que la comparación nunca llega a la clave
+        heapq.heapify(self._heap)
+        self._pos = {entry[2]: i for i, entry in enumerate(self._heap)}
+
+    def _swap(self, i: int, j: int):
+        heap = self._heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self._pos[heap[i][2]] = i
+        self._pos[heap[j][2]] = j
+
+    def _sift_up(self, i: int):
+        heap = self._heap
+        while i > 0:
+            parent = (i - 1) // 2
+            if heap[i][:2] >= heap[parent][:2]:
+                break
+            self._swap(i, parent)
+            i = parent
+
+    def _sift_down(self, i: int):
+        heap = self._heap
+        n = len(heap)
+        while True:
+            smallest = i
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < n and heap[child][:2] < heap[smallest][:2]:
+                    smallest = child
+            if smallest == i:
+                return
+            self._swap(i, smallest)
+            i = smallest
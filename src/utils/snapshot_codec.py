@@ -0,0 +1,406 @@
+# src/utils/snapshot_codec.py
+# Formato binario compacto de snapshot (snapshot.bin) equivalente a stats + dates.
+
+import json
+import struct
+import sys
+from array import array
+from datetime import datetime, timedelta
+
+MAGIC = b"JTSNAP"
+VERSION = 1
+HEADER = struct.Struct("<6sHq")  # magic, versión, seq
+
+USER_FIELDS = (
+    "total_solo_time",
+    "depressive_attempts",
+    "depressive_time",
+    "opt_out_logs",
+)
+PAIR_FIELDS = ("calls_started", "total_shared_time")
+TIME_FIELDS = ("_solo_total_start", "_solo_depressive_start")
+CHANNEL_FIELDS = ("_solo_total_channel", "_solo_depressive_channel_id")
+
+# Tipos de valor de una columna numérica
+ABSENT, INT, FLOAT, TRUE, FALSE, NONE = range(6)
+# Marca de tiempo None (sesión abierta) en las columnas de microsegundos
+NO_TIME = -(2**63)
+
+_EPOCH = datetime(1970, 1, 1)
+_US = timedelta(microseconds=1)
+
+
+class _Unsupported(Exception):
+    """Valor que no cabe en las columnas binarias: va a la sección JSON extra."""
+
+
+# ========= Conversión de valores =========
+def _canonical_id(key):
+    """ID de usuario como int64 si su texto es canónico (sin ceros a la izquierda, etc.)."""
+    try:
+        value = int(key)
+    except (TypeError, ValueError):
+        return None
+    if str(value) != key or not -(2**63) <= value < 2**63:
+        return None
+    return value
+
+
+def _time_to_us(iso):
+    """ISO naive → microsegundos desde epoch (exacto, a diferencia de un float)."""
+    if iso is None:
+        return NO_TIME
+    if not isinstance(iso, str):
+        raise _Unsupported
+    try:
+        dt = datetime.fromisoformat(iso)
+    except ValueError:
+        raise _Unsupported
+    if dt.tzinfo is not None or dt.isoformat() != iso:
+        raise _Unsupported
+    return (dt - _EPOCH) // _US
+
+
+def _us_to_time(us):
+    return None if us == NO_TIME else (_EPOCH + us * _US).isoformat()
+
+
+class _Column:
+    """Columna de números opcionales: un byte de tipo por fila y arrays empaquetados."""
+
+    def __init__(self):
+        self.kinds = array("B")
+        self.ints = array("q")
+        self.floats = array("d")
+
+    @staticmethod
+    def check(value):
+        """Lanza _Unsupported si el valor no cabe en la columna."""
+        if value is None or isinstance(value, bool):
+            return
+        if isinstance(value, int):
+            if not -(2**63) <= value < 2**63:
+                raise _Unsupported
+        elif not isinstance(value, float):
+            raise _Unsupported
+
+    def add(self, value, present=True):
+        if not present:
+            self.kinds.append(ABSENT)
+        elif value is None:
+            self.kinds.append(NONE)
+        elif value is True:
+            self.kinds.append(TRUE)
+        elif value is False:
+            self.kinds.append(FALSE)
+        elif isinstance(value, int):
+            self.kinds.append(INT)
+            self.ints.append(value)
+        else:
+            self.kinds.append(FLOAT)
+            self.floats.append(value)
+
+    def arrays(self):
+        return [self.kinds, self.ints, self.floats]
+
+    @staticmethod
+    def values(kinds, ints, floats):
+        """Decodifica la columna como lista de (presente, valor)."""
+        ints, floats = iter(ints), iter(floats)
+        out = []
+        for kind in kinds:
+            if kind == ABSENT:
+                out.append((False, None))
+            elif kind == INT:
+                out.append((True, next(ints)))
+            elif kind == FLOAT:
+                out.append((True, next(floats)))
+            else:
+                out.append((True, {TRUE: True, FALSE: False, NONE: None}[kind]))
+        return out
+
+
+# ========= Codificación =========
+def encode(seq: int, stats: dict, dates: dict, rollups: dict = None) -> bytes:
+    """
+    Codifica stats + dates en el formato binario. Todo lo que no encaje en
+    las columnas (claves no numéricas, campos desconocidos, fechas con otro
+    formato...) se guarda tal cual en una sección JSON final, de modo que
+    `decode(encode(...))` devuelve siempre los mismos dicts. Los contadores
+    por periodos (`rollups`), si se pasan, van también en esa sección.
+    """
+    extra = {"stats": {}, "dates": {}}
+    if rollups:
+        extra["rollups"] = rollups
+    ids = {}  # uid (str) -> índice denso
+
+    def index(uid):
+        if uid not in ids:
+            ids[uid] = len(ids)
+        return ids[uid]
+
+    def spill(section, uid, key, value):
+        extra[section].setdefault(uid, {})[key] = value
+
+    # --- Usuarios presentes en cada dict ---
+    in_stats, in_dates = set(), set()
+    for section, data, present in (
+        ("stats", stats, in_stats),
+        ("dates", dates, in_dates),
+    ):
+        for uid, entry in data.items():
+            if _canonical_id(uid) is None or not isinstance(entry, dict):
+                extra[section][uid] = entry
+                continue
+            index(uid)
+            present.add(uid)
+
+    # --- stats: campos de usuario y parejas ---
+    user_values = {}
+    pairs = []
+    for uid in in_stats:
+        for key, value in stats[uid].items():
+            if key in USER_FIELDS:
+                try:
+                    _Column.check(value)
+                except _Unsupported:
+                    spill("stats", uid, key, value)
+                    continue
+                user_values[(uid, key)] = value
+            elif (
+                isinstance(value, dict)
+                and _canonical_id(key) is not None
+                and set(value) <= set(PAIR_FIELDS)
+            ):
+                try:
+                    for field in value.values():
+                        _Column.check(field)
+                except _Unsupported:
+                    spill("stats", uid, key, value)
+                    continue
+                pairs.append((uid, key, value))
+            else:
+                spill("stats", uid, key, value)
+
+    # --- dates: marcadores por usuario y sesiones de pareja ---
+    date_values = {}
+    sessions = []
+    for uid in in_dates:
+        for key, value in dates[uid].items():
+            try:
+                if key in TIME_FIELDS:
+                    date_values[(uid, key)] = _time_to_us(value)
+                elif key in CHANNEL_FIELDS:
+                    _Column.check(value)
+                    date_values[(uid, key)] = value
+                elif (
+                    _canonical_id(key) is not None
+                    and isinstance(value, dict)
+                    and list(value) == ["entries"]
+                    and isinstance(value["entries"], list)
+                ):
+                    entries = []
+                    for e in value["entries"]:
+                        if not isinstance(e, dict) or list(e) != [
+                            "start_time",
+                            "end_time",
+                        ]:
+                            raise _Unsupported
+                        entries.append(
+                            (_time_to_us(e["start_time"]), _time_to_us(e["end_time"]))
+                        )
+                    sessions.append((uid, key, entries))
+                else:
+                    raise _Unsupported
+            except _Unsupported:
+                spill("dates", uid, key, value)
+
+    for uid, other, _ in pairs:
+        index(other)
+    for uid, other, _ in sessions:
+        index(other)
+
+    # --- Tabla de usuarios ---
+    order = sorted(ids, key=ids.get)
+    user_ids = array("q", (int(uid) for uid in order))
+    flags = array("B", ((uid in in_stats) | (uid in in_dates) << 1 for uid in order))
+
+    sections = [user_ids, flags]
+    for field in USER_FIELDS:
+        column = _Column()
+        for uid in order:
+            present = (uid, field) in user_values
+            column.add(user_values.get((uid, field)), present)
+        sections += column.arrays()
+
+    pair_a = array("I", (ids[uid] for uid, _, _ in pairs))
+    pair_b = array("I", (ids[other] for _, other, _ in pairs))
+    sections += [pair_a, pair_b]
+    for field in PAIR_FIELDS:
+        column = _Column()
+        for _, _, value in pairs:
+            column.add(value.get(field), field in value)
+        sections += column.arrays()
+
+    for field in TIME_FIELDS:
+        kinds, times = array("B"), array("q")
+        for uid in order:
+            present = (uid, field) in date_values
+            kinds.append(present)
+            if present:
+                times.append(date_values[(uid, field)])
+        sections += [kinds, times]
+    for field in CHANNEL_FIELDS:
+        column = _Column()
+        for uid in order:
+            present = (uid, field) in date_values
+            column.add(date_values.get((uid, field)), present)
+        sections += column.arrays()
+
+    sess_a = array("I", (ids[uid] for uid, _, _ in sessions))
+    sess_b = array("I", (ids[other] for _, other, _ in sessions))
+    sess_n = array("I", (len(entries) for _, _, entries in sessions))
+    starts = array("q", (s for _, _, entries in sessions for s, _ in entries))
+    ends = array("q", (e for _, _, entries in sessions for _, e in entries))
+    sections += [sess_a, sess_b, sess_n, starts, ends]
+
+    out = [HEADER.pack(MAGIC, VERSION, seq), struct.pack("<I", len(sections))]
+    for arr in sections:
+        out.append(_pack_array(arr))
+    extra_bytes = json.dumps(extra, separators=(",", ":")).encode("utf-8")
+    out.append(struct.pack("<I", len(extra_bytes)))
+    out.append(extra_bytes)
+    return b"".join(out)
+
+
+def _pack_array(arr: array) -> bytes:
+    if sys.byteorder != "little":
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    data = arr.tobytes()
+    return struct.pack("<cI", arr.typecode.encode(), len(data)) + data
+
+
+# ========= Decodificación =========
+def decode(data: bytes):
+    """Devuelve (seq, stats, dates) a partir de un snapshot binario."""
+    return decode_snapshot(data)[:3]
+
+
+def decode_snapshot(data: bytes):
+    """Devuelve (seq, stats, dates, rollups o None) a partir de un snapshot binario."""
+    magic, version, seq = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("No es un snapshot binario de JoinTracker.")
+    if version != VERSION:
+        raise ValueError(f"Versión de snapshot no soportada: {version}")
+
+    offset = HEADER.size
+    (count,) = struct.unpack_from("<I", data, offset)
+    offset += 4
+    arrays = []
+    for _ in range(count):
+        typecode, size = struct.unpack_from("<cI", data, offset)
+        offset += 5
+        arr = array(typecode.decode())
+        arr.frombytes(data[offset : offset + size])
+        if sys.byteorder != "little":
+            arr.byteswap()
+        arrays.append(arr)
+        offset += size
+    (extra_size,) = struct.unpack_from("<I", data, offset)
+    offset += 4
+    extra = json.loads(data[offset : offset + extra_size].decode("utf-8"))
+
+    sections = iter(arrays)
+    user_ids, flags = next(sections), next(sections)
+    order = [str(uid) for uid in user_ids]
+    stats, dates = {}, {}
+    for uid, flag in zip(order, flags):
+        if flag & 1:
+            stats[uid] = {}
+        if flag & 2:
+            dates[uid] = {}
+
+    for field in USER_FIELDS:
+        column = _Column.values(next(sections), next(sections), next(sections))
+        for uid, (present, value) in zip(order, column):
+            if present:
+                stats[uid][field] = value
+
+    pair_a, pair_b = next(sections), next(sections)
+    pair_values = [{} for _ in pair_a]
+    for field in PAIR_FIELDS:
+        column = _Column.values(next(sections), next(sections), next(sections))
+        for pair, (present, value) in zip(pair_values, column):
+            if present:
+                pair[field] = value
+    for a, b, pair in zip(pair_a, pair_b, pair_values):
+        stats[order[a]][order[b]] = pair
+
+    for field in TIME_FIELDS:
+        kinds, times = next(sections), iter(next(sections))
+        for uid, present in zip(order, kinds):
+            if present:
+                dates[uid][field] = _us_to_time(next(times))
+    for field in CHANNEL_FIELDS:
+        column = _Column.values(next(sections), next(sections), next(sections))
+        for uid, (present, value) in zip(order, column):
+            if present:
+                dates[uid][field] = value
+
+    sess_a, sess_b, sess_n = next(sections), next(sections), next(sections)
+    starts, ends = iter(next(sections)), iter(next(sections))
+    for a, b, n in zip(sess_a, sess_b, sess_n):
+        dates[order[a]][order[b]] = {
+            "entries": [
+                {
+                    "start_time": _us_to_time(next(starts)),
+                    "end_time": _us_to_time(next(ends)),
+                }
+                for _ in range(n)
+            ]
+        }
+
+    for section, target in (("stats", stats), ("dates", dates)):
+        for uid, value in extra[section].items():
+            if isinstance(target.get(uid), dict) and isinstance(value, dict):
+                target[uid].update(value)
+            else:
+                target[uid] = value
+    return seq, stats, dates, extra.get("rollups")
+
+
+# ========= Conversión de archivos =========
+def json_to_binary(snapshot: dict) -> bytes:
+    """snapshot.json ({"seq", "stats", "dates", "rollups"}) → snapshot.bin."""
+    return encode(
+        snapshot.get("seq", 0),
+        snapshot["stats"],
+        snapshot["dates"],
+        snapshot.get("rollups"),
+    )
+
+
+def binary_to_json(data: bytes) -> dict:
+    """snapshot.bin → el mismo dict que snapshot.json."""
+    seq, stats, dates, rollups = decode_snapshot(data)
+    snapshot = {"seq": seq, "stats": stats, "dates": dates}
+    if rollups is not None:
+        snapshot["rollups"] = rollups
+    return snapshot
+
+
+if __name__ == "__main__":
+    # python -m src.utils.snapshot_codec entrada.{json,bin} salida.{bin,json}
+    src, dst = sys.argv[1:3]
+    if src.endswith(".bin"):
+        with open(src, "rb") as f:
+            snapshot = binary_to_json(f.read())
+        with open(dst, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, indent=4, sort_keys=True)
+    else:
+        with open(src, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+        with open(dst, "wb") as f:
+            f.write(json_to_binary(snapshot))
@@ -0,0 +1,113 @@
+# src/utils/solo_timers.py
+# Temporizadores de depresión persistidos en data/timers.json.
+
+import asyncio
+import time
+
+from src.config import FLUSH_INTERVAL
+
+from .data_handler import load_json, run_io, save_json
+from .scheduler import DeadlineScheduler
+
+TIMERS_FILE = "timers.json"
+
+
+class SoloTimers:
+    """
+    Plazos de depresión de los usuarios solos, uno por usuario.
+    Los plazos vivos los ejecuta un `DeadlineScheduler`; además se guarda en
+    un único archivo compacto (data/timers.json) el plazo de cada usuario:
+
+        {uid: {"g": guild_id, "c": channel_id, "d": deadline_epoch}}
+
+    La entrada se mantiene aunque el plazo ya haya vencido (usuario marcado
+    con depresión) hasta que se cancela, para poder restaurar tanto las
+    cuentas atrás como las marcas tras un reinicio sin recorrer los datos de
+    todos los servidores.
+    """
+
+    def __init__(self, filename: str = TIMERS_FILE, save_delay: float = FLUSH_INTERVAL):
+        self.filename = filename
+        self.save_delay = save_delay
+        self.scheduler = DeadlineScheduler("timers")
+        self.entries = {}
+        self._save_task = None
+
+    def __contains__(self, uid):
+        return uid in self.entries
+
+    # ----- Plazos -----
+    def arm(self, uid: str, guild_id: str, channel_id, delay: float, callback, *args):
+        """
+        Programa callback(*args) dentro de `delay` segundos para `uid`.
+        Devuelve False si el usuario ya tenía un plazo (vivo o vencido).
+        """
+        if uid in self.entries:
+            return False
+        self.scheduler.schedule(uid, delay, callback, *args)
+        self.entries[uid] = {
+            "g": str(guild_id),
+            "c": channel_id,
+            "d": round(time.time() + delay, 3),
+        }
+        self._touch()
+        return True
+
+    def restore(self, uid: str, entry: dict, callback=None, *args):
+        """
+        Recupera una entrada guardada en un arranque anterior. Si se indica
+        `callback`, se rearma con el tiempo que le quedaba (0 si ya venció);
+        sin él se conserva solo como marca de plazo vencido.
+        """
+        self.entries[uid] = entry
+        if callback is not None:
+            self.scheduler.schedule(
+                uid, max(0.0, entry["d"] - time.time()), callback, *args
+            )
+
+    def cancel(self, uid: str):
+        """
+        Quita el plazo de `uid`. Devuelve los segundos que le quedaban,
+        0 si ya había vencido o None si no tenía.
+        """
+        if self.entries.pop(uid, None) is None:
+            return None
+        self._touch()
+        remaining = self.scheduler.cancel(uid)
+        return 0.0 if remaining is None else remaining
+
+    def cancel_many(self, uids) -> dict:
+        """Quita de una vez los plazos vivos de varios usuarios ({uid: segundos restantes})."""
+        uids = [uid for uid in uids if self.entries.pop(uid, None) is not None]
+        if not uids:
+            return {}
+        self._touch()
+        cancelled = self.scheduler.cancel_many(uids)
+        return {uid: cancelled.get(uid, 0.0) for uid in uids}
+
+    # ----- Persistencia -----
+    async def load(self) -> dict:
+        """Devuelve los plazos guardados en el último arranque."""
+        return await run_io(self.filename, load_json, self.filename)
+
+    def _touch(self):
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.create_task(self._save_later())
+
+    async def _save_later(self):
+        # Varios cambios seguidos se agrupan en una sola escritura
+        await asyncio.sleep(self.save_delay)
+        try:
+            await self.save()
+        except Exception as e:
+            print(f"\033[31m[TIMERS] Error guardando {self.filename}: {e}\033[0m")
+
+    async def save(self):
+        await run_io(self.filename, save_json, self.filename, dict(self.entries), False)
+
+    async def close(self):
+        """Detiene el planificador y escribe el estado final de los plazos."""
+        if self._save_task and not self._save_task.done():
+            self._save_task.cancel()
+        await self.scheduler.close()
+        await self.save()
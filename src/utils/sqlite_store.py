@@ -0,0 +1,347 @@
+# src/utils/sqlite_store.py
+# Backend opcional de almacenamiento local en SQLite (STORAGE_BACKEND=sqlite).
+
+import json
+import os
+import sqlite3
+
+from .data_handler import data_path, run_io
+from .guild_store import GuildState, JournalBackend
+from .leaderboard import pair_key
+from .stats_table import PAIR_FIELDS
+
+# Campos escalares de stats[uid]; el resto de claves son parejas (dicts)
+USER_FIELDS = (
+    "total_solo_time",
+    "depressive_attempts",
+    "depressive_time",
+    "opt_out_logs",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pairs (
+    guild_id TEXT NOT NULL,
+    a TEXT NOT NULL,
+    b TEXT NOT NULL,
+    calls_started INTEGER,
+    total_shared_time REAL,
+    extra TEXT,
+    PRIMARY KEY (guild_id, a, b)
+);
+CREATE INDEX IF NOT EXISTS idx_pairs_reverse ON pairs (guild_id, b, a);
+
+CREATE TABLE IF NOT EXISTS users (
+    guild_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    total_solo_time REAL,
+    depressive_attempts INTEGER,
+    depressive_time REAL,
+    opt_out_logs INTEGER,
+    extra TEXT,
+    PRIMARY KEY (guild_id, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS dates (
+    guild_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (guild_id, user_id)
+);
+
+CREATE TABLE IF NOT EXISTS rollups (
+    guild_id TEXT NOT NULL,
+    a TEXT NOT NULL,
+    b TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (guild_id, a, b)
+);
+
+CREATE TABLE IF NOT EXISTS guilds (
+    guild_id TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL
+);
+"""
+
+# Columnas añadidas después de crear el esquema (bases ya existentes)
+MIGRATIONS = (("users", "extra", "TEXT"), ("pairs", "extra", "TEXT"))
+
+
+class SqliteBackend:
+    """
+    Guarda todos los servidores en data/jointracker.db.
+    - pairs: una fila por stats[a][b], indexada en ambos sentidos.
+    - users: contadores de solo/depresión y opt_out de stats[uid].
+    Las claves que no tienen columna propia (en users y pairs) se guardan
+    como JSON en `extra`, para que nada de stats.json se pierda al cambiar
+    de backend.
+    - dates: entradas de dates.json por usuario (JSON compacto).
+    - rollups: cubetas por periodos de cada usuario (b = "") y pareja (a <= b).
+    Cada volcado es una única transacción con las filas de los usuarios y
+    parejas que han cambiado desde el anterior. Todo acceso a la conexión se
+    hace desde el pool de E/S con la ruta de la base como clave, de modo que
+    las transacciones nunca se solapan.
+    A diferencia de JournalBackend no hay diario: si el proceso muere, se
+    pierden las operaciones aún sin volcar (como mucho FLUSH_INTERVAL
+    segundos o FLUSH_DIRTY_THRESHOLD operaciones por servidor).
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or data_path("jointracker.db")
+        self._conn = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+            self._migrate()
+        return self._conn
+
+    def _migrate(self):
+        for table, column, kind in MIGRATIONS:
+            columns = {
+                row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")
+            }
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {kind}")
+
+    # ----- Carga -----
+    async def load(self, gid: str) -> GuildState:
+        return await run_io(self.path, self._load, gid)
+
+    def _load(self, gid: str) -> GuildState:
+        row = self.conn.execute(
+            "SELECT seq FROM guilds WHERE guild_id = ?", (gid,)
+        ).fetchone()
+        if row is None:
+            # Primera vez con SQLite: se migra desde los JSON y se escribe entero
+            state = JournalBackend().load_sync(gid)
+            state.journal = None
+            self._write_all(state)
+            return state
+
+        stats, dates = {}, {}
+        for uid, *values, extra in self.conn.execute(
+            f"SELECT user_id, {', '.join(USER_FIELDS)}, extra FROM users WHERE guild_id = ?",
+            (gid,),
+        ):
+            extra = json.loads(extra) if extra else {}
+            if not isinstance(extra, dict):
+                # stats[uid] anómalo (no dict), guardado tal cual
+                stats[uid] = extra
+                continue
+            user = stats.setdefault(uid, {})
+            for field, value in zip(USER_FIELDS, values):
+                if value is not None:
+                    user[field] = bool(value) if field == "opt_out_logs" else value
+            user.update(extra)
+
+        for a, b, calls, shared, extra in self.conn.execute(
+            "SELECT a, b, calls_started, total_shared_time, extra FROM pairs WHERE guild_id = ?",
+            (gid,),
+        ):
+            pair = _pair_dict(calls, shared)
+            if extra:
+                pair.update(json.loads(extra))
+            stats.setdefault(a, {})[b] = pair
+
+        for uid, data in self.conn.execute(
+            "SELECT user_id, data FROM dates WHERE guild_id = ?", (gid,)
+        ):
+            dates[uid] = json.loads(data)
+
+        rollups = {"users": {}, "pairs": {}}
+        for a, b, data in self.conn.execute(
+            "SELECT a, b, data FROM rollups WHERE guild_id = ?", (gid,)
+        ):
+            if b:
+                rollups["pairs"].setdefault(a, {})[b] = json.loads(data)
+            else:
+                rollups["users"][a] = json.loads(data)
+
+        return GuildState(gid, stats, dates, row[0], rollups=rollups)
+
+    # ----- Escritura -----
+    async def flush(self, state: GuildState, compact: bool = False):
+        dirty = state.take_dirty()
+        try:
+            if dirty["all"]:
+                # Reescritura completa: se lee todo el estado desde el hilo,
+                # dentro de un trabajo del actor para que nadie lo mute a la vez
+                await state.actor.run(run_io, self.path, self._write_all, state)
+            else:
+                # Solo se copian en el loop las filas que han cambiado
+                rows = self._collect(state, dirty["users"], dirty["pairs"])
+                await run_io(
+                    self.path, self._write_rows, state.guild_id, rows, state.seq
+                )
+        except Exception:
+            state.restore_dirty(dirty)
+            raise
+
+    def _collect(self, state: GuildState, users, pairs) -> dict:
+        """Valores actuales de los usuarios y parejas indicados (None = borrar)."""
+        user_rows, date_rows, pair_rows, rollup_rows = [], [], [], []
+        for uid in users:
+            user_rows.append((uid, _user_values(state.stats.user_fields(uid))))
+            entry = state.dates.get(uid)
+            date_rows.append(
+                (
+                    uid,
+                    None if entry is None else json.dumps(entry, separators=(",", ":")),
+                )
+            )
+            rollup_rows.append((uid, "", _compact_json(state.rollups.users.get(uid))))
+        for a, b in pairs:
+            pair = state.stats.pair(a, b)
+            pair_rows.append(
+                (
+                    a,
+                    b,
+                    (
+                        None
+                        if pair is None
+                        else (
+                            pair.get("calls_started"),
+                            pair.get("total_shared_time"),
+                            _extra_json(pair, PAIR_FIELDS),
+                        )
+                    ),
+                )
+            )
+        for a, b in {pair_key(a, b) for a, b in pairs}:
+            rollup_rows.append((a, b, _compact_json(state.rollups.pairs.get((a, b)))))
+        return {
+            "users": user_rows,
+            "dates": date_rows,
+            "pairs": pair_rows,
+            "rollups": rollup_rows,
+        }
+
+    def _write_all(self, state: GuildState):
+        gid = state.guild_id
+        users = set(state.stats) | set(state.dates) | set(state.rollups.users)
+        pairs = set(state.stats.pair_keys()) | set(state.rollups.pairs)
+        rows = self._collect(state, users, pairs)
+        with self.conn:
+            for table in ("pairs", "users", "dates", "rollups"):
+                self.conn.execute(f"DELETE FROM {table} WHERE guild_id = ?", (gid,))
+            self._apply_rows(gid, rows, state.seq)
+
+    def _write_rows(self, gid: str, rows: dict, seq: int):
+        with self.conn:
+            self._apply_rows(gid, rows, seq)
+
+    def _apply_rows(self, gid: str, rows: dict, seq: int):
+        for uid, values in rows["users"]:
+            if values is None:
+                self.conn.execute(
+                    "DELETE FROM users WHERE guild_id = ? AND user_id = ?", (gid, uid)
+                )
+            else:
+                self.conn.execute(
+                    f"INSERT OR REPLACE INTO users (guild_id, user_id, {', '.join(USER_FIELDS)}, extra) "
+                    f"VALUES (?, ?, {', '.join('?' * len(USER_FIELDS))}, ?)",
+                    (gid, uid, *values),
+                )
+
+        for uid, data in rows["dates"]:
+            if data is None:
+                self.conn.execute(
+                    "DELETE FROM dates WHERE guild_id = ? AND user_id = ?", (gid, uid)
+                )
+            else:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO dates (guild_id, user_id, data) VALUES (?, ?, ?)",
+                    (gid, uid, data),
+                )
+
+        for a, b, values in rows["pairs"]:
+            if values is None:
+                self.conn.execute(
+                    "DELETE FROM pairs WHERE guild_id = ? AND a = ? AND b = ?",
+                    (gid, a, b),
+                )
+            else:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO pairs (guild_id, a, b, calls_started, total_shared_time, extra) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (gid, a, b, *values),
+                )
+
+        for a, b, data in rows["rollups"]:
+            if data is None:
+                self.conn.execute(
+                    "DELETE FROM rollups WHERE guild_id = ? AND a = ? AND b = ?",
+                    (gid, a, b),
+                )
+            else:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO rollups (guild_id, a, b, data) VALUES (?, ?, ?, ?)",
+                    (gid, a, b, data),
+                )
+
+        self.conn.execute(
+            "INSERT INTO guilds (guild_id, seq) VALUES (?, ?) "
+            "ON CONFLICT(guild_id) DO UPDATE SET seq = excluded.seq",
+            (gid, seq),
+        )
+
+    # ----- Consultas por índice -----
+    async def partners(self, gid: str, user_id: str) -> set:
+        """Usuarios con pareja registrada con `user_id` (índices directo e inverso)."""
+        return await run_io(self.path, self._partners, gid, user_id)
+
+    def _partners(self, gid: str, user_id: str) -> set:
+        rows = self.conn.execute(
+            "SELECT b FROM pairs WHERE guild_id = ? AND a = ? "
+            "UNION SELECT a FROM pairs WHERE guild_id = ? AND b = ?",
+            (gid, user_id, gid, user_id),
+        )
+        return {row[0] for row in rows} - {user_id}
+
+    def needs_flush(self, state: GuildState, compact: bool = False) -> bool:
+        return bool(state.pending or state.dirty_all)
+
+    async def close(self):
+        await run_io(self.path, self._close)
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def _pair_dict(calls, shared) -> dict:
+    pair = {}
+    if calls is not None:
+        pair["calls_started"] = calls
+    if shared is not None:
+        pair["total_shared_time"] = shared
+    return pair
+
+
+def _user_values(user):
+    """Columnas de users (campos conocidos + extra) para stats[uid], o None si no existe."""
+    if user is None:
+        return None
+    if not isinstance(user, dict):
+        return [None] * len(USER_FIELDS) + [_compact_json(user)]
+    # Un campo conocido con un valor que no es un número va a extra
+    known = [f for f in USER_FIELDS if isinstance(user.get(f), (int, float))]
+    return [user.get(f) if f in known else None for f in USER_FIELDS] + [
+        _extra_json(user, known)
+    ]
+
+
+def _extra_json(entry: dict, known):
+    """Claves de `entry` sin columna propia, como JSON (None si no hay)."""
+    extra = {key: value for key, value in entry.items() if key not in known}
+    return _compact_json(extra) if extra else None
+
+
+def _compact_json(value):
+    return None if value is None else json.dumps(value, separators=(",", ":"))
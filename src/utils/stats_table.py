@@ -0,0 +1,344 @@
+# src/utils/stats_table.py
+# stats.json residente: índice denso de usuarios + matriz de parejas sobre arrays.
+
+import math
+from array import array
+from bisect import bisect_left, insort
+from collections.abc import Mapping
+
+PAIR_FIELDS = ("calls_started", "total_shared_time")
+ABSENT = math.nan  # Campo de pareja que no existe en el JSON
+
+
+class UserIndex:
+    """Tabla de internado: ID de usuario (str) → índice denso, y al revés."""
+
+    def __init__(self):
+        self._index = {}
+        self._ids = []
+
+    def __len__(self):
+        return len(self._ids)
+
+    def get(self, uid: str):
+        return self._index.get(uid)
+
+    def intern(self, uid: str) -> int:
+        i = self._index.get(uid)
+        if i is None:
+            i = self._index[uid] = len(self._ids)
+            self._ids.append(uid)
+        return i
+
+    def uid(self, i: int) -> str:
+        return self._ids[i]
+
+
+class _Row:
+    """
+    Parejas salientes de un usuario: `cols` ordenado con los índices de los
+    otros usuarios y `vals` con dos valores por pareja (llamadas, tiempo).
+    """
+
+    __slots__ = ("cols", "vals")
+
+    def __init__(self):
+        self.cols = array("I")
+        self.vals = array("d")
+
+    def find(self, b: int) -> int:
+        i = bisect_left(self.cols, b)
+        return i if i < len(self.cols) and self.cols[i] == b else -1
+
+    def insert(self, b: int) -> int:
+        i = bisect_left(self.cols, b)
+        self.cols.insert(i, b)
+        self.vals[2 * i : 2 * i] = array("d", (ABSENT, ABSENT))
+        return i
+
+    def delete(self, i: int):
+        del self.cols[i]
+        del self.vals[2 * i : 2 * i + 2]
+
+    def pair(self, i: int) -> dict:
+        calls, shared = self.vals[2 * i], self.vals[2 * i + 1]
+        pair = {}
+        if not math.isnan(calls):
+            pair["calls_started"] = int(calls)
+        if not math.isnan(shared):
+            pair["total_shared_time"] = shared
+        return pair
+
+
+class PairMatrix:
+    """
+    Matriz dispersa dirigida de parejas (a, b) sobre índices densos, guardada
+    como dict de filas; cada fila son dos arrays (columnas y valores), unos
+    20 bytes por pareja frente a los cientos de un dict anidado.
+    `incoming` es el índice inverso ({b: array ordenado de los a con (a, b)}),
+    para consultar y borrar a un usuario en O(grado) sin recorrer las filas.
+    """
+
+    def __init__(self):
+        self.rows = {}
+        self.incoming = {}
+
+    def __len__(self):
+        return sum(len(row.cols) for row in self.rows.values())
+
+    def get(self, a: int, b: int):
+        row = self.rows.get(a)
+        if row is None:
+            return None
+        i = row.find(b)
+        return None if i < 0 else row.pair(i)
+
+    def slot(self, a: int, b: int, create: bool = True):
+        """(fila, posición) de la pareja (a, b), creándola vacía si no existe."""
+        row = self.rows.get(a)
+        if row is None:
+            if not create:
+                return None, -1
+            row = self.rows[a] = _Row()
+        i = row.find(b)
+        if i < 0 and create:
+            i = row.insert(b)
+            insort(self.incoming.setdefault(b, array("I")), a)
+        return row, i
+
+    def set(self, a: int, b: int, pair: dict):
+        row, i = self.slot(a, b)
+        row.vals[2 * i] = pair.get("calls_started", ABSENT)
+        row.vals[2 * i + 1] = pair.get("total_shared_time", ABSENT)
+
+    def delete(self, a: int, b: int) -> bool:
+        row, i = self.slot(a, b, create=False)
+        if row is None or i < 0:
+            return False
+        row.delete(i)
+        if not row.cols:
+            del self.rows[a]
+        self._unlink(a, b)
+        return True
+
+    def drop_row(self, a: int):
+        """Quita todas las parejas salientes de a."""
+        row = self.rows.pop(a, None)
+        if row is not None:
+            for b in row.cols:
+                self._unlink(a, b)
+
+    def _unlink(self, a: int, b: int):
+        column = self.incoming[b]
+        del column[bisect_left(column, a)]
+        if not column:
+            del self.incoming[b]
+
+    def row(self, a: int):
+        """Itera (b, pair) de las parejas salientes de a."""
+        row = self.rows.get(a)
+        if row is None:
+            return
+        for i, b in enumerate(row.cols):
+            yield b, row.pair(i)
+
+    def column(self, b: int):
+        """Índices a con pareja (a, b)."""
+        return list(self.incoming.get(b, ()))
+
+
+def is_pair(key, value) -> bool:
+    """Valor de stats[uid][key] que se guarda en la matriz de parejas."""
+    if not isinstance(value, dict) or not set(value) <= set(PAIR_FIELDS):
+        return False
+    calls = value.get("calls_started", 0)
+    shared = value.get("total_shared_time", 0.0)
+    # Las llamadas se guardan en un float64: enteros exactos hasta 2**53
+    return (
+        type(calls) is int
+        and abs(calls) <= 2**53
+        and type(shared) in (int, float)
+        and not math.isnan(shared)
+    )
+
+
+class UserStats(Mapping):
+    """Vista de solo lectura de stats[uid]: campos del usuario + sus parejas."""
+
+    def __init__(self, table, i: int):
+        self._table = table
+        self._i = i
+
+    def _fields(self):
+        return self._table.fields.get(self._i, {})
+
+    def __getitem__(self, key):
+        fields = self._fields()
+        if key in fields:
+            return fields[key]
+        b = self._table.index.get(key)
+        pair = None if b is None else self._table.pairs.get(self._i, b)
+        if pair is None:
+            raise KeyError(key)
+        return pair
+
+    def __iter__(self):
+        yield from self._fields()
+        index = self._table.index
+        for b, _ in self._table.pairs.row(self._i):
+            yield index.uid(b)
+
+    def __len__(self):
+        row = self._table.pairs.rows.get(self._i)
+        return len(self._fields()) + (len(row.cols) if row else 0)
+
+
+class StatsTable(Mapping):
+    """
+    Equivalente residente de stats.json. Se lee como el dict de siempre
+    (stats[uid][otro]["total_shared_time"]), pero guarda:
+    - `index`: ID → índice denso;
+    - `fields`: campos propios de cada usuario (solo, depresión, opt_out...);
+    - `pairs`: contadores de pareja en una `PairMatrix`.
+    Las escrituras pasan por los métodos de abajo; `to_dict` da el JSON.
+    """
+
+    def __init__(self, data: dict = None):
+        self.index = UserIndex()
+        self.fields = {}  # índice -> dict de campos (existe si stats[uid] existe)
+        self.pairs = PairMatrix()
+        if data:
+            self.update(data)
+
+    # ----- Lectura (Mapping) -----
+    def __getitem__(self, uid):
+        i = self.index.get(uid)
+        if i is None or i not in self.fields:
+            raise KeyError(uid)
+        if not isinstance(self.fields[i], dict):
+            return self.fields[i]
+        return UserStats(self, i)
+
+    def __iter__(self):
+        index = self.index
+        return (index.uid(i) for i in list(self.fields))
+
+    def __len__(self):
+        return len(self.fields)
+
+    def user_fields(self, uid: str):
+        """Campos propios de stats[uid] (sin parejas), o None si no existe."""
+        return self.fields.get(self.index.get(uid))
+
+    def pair(self, a: str, b: str):
+        """Copia de stats[a][b] o None."""
+        ia, ib = self.index.get(a), self.index.get(b)
+        if ia is None or ib is None:
+            return None
+        return self.pairs.get(ia, ib)
+
+    def pair_keys(self):
+        """Todas las parejas (a, b) como IDs."""
+        uid = self.index.uid
+        return [
+            (uid(a), uid(b)) for a, row in self.pairs.rows.items() for b in row.cols
+        ]
+
+    def partners(self, uid: str) -> set:
+        """
+        IDs con pareja registrada con `uid` en cualquiera de los dos sentidos,
+        en O(grado) gracias al índice inverso.
+        """
+        i = self.index.get(uid)
+        if i is None:
+            return set()
+        found = {b for b, _ in self.pairs.row(i)} | set(self.pairs.column(i))
+        found.discard(i)
+        return {self.index.uid(j) for j in found}
+
+    # ----- Escritura -----
+    def user(self, uid: str) -> dict:
+        """Campos propios de stats[uid] (mutable), creando la entrada si falta."""
+        i = self.index.intern(uid)
+        if not isinstance(self.fields.get(i), dict):
+            self.fields[i] = {}
+        return self.fields[i]
+
+    def _slot(self, a: str, b: str):
+        ia = self.index.intern(a)
+        self.fields.setdefault(ia, {})
+        return self.pairs.slot(ia, self.index.intern(b))
+
+    def ensure_pair(self, a: str, b: str, calls=None, shared=None):
+        """
+        Crea stats[a] y stats[a][b] si faltan y rellena los campos ausentes
+        con `calls` / `shared` (None = no rellenar).
+        """
+        row, i = self._slot(a, b)
+        if calls is not None and math.isnan(row.vals[2 * i]):
+            row.vals[2 * i] = calls
+        if shared is not None and math.isnan(row.vals[2 * i + 1]):
+            row.vals[2 * i + 1] = shared
+
+    def add_calls(self, a: str, b: str, n: int = 1):
+        """stats[a][b]["calls_started"] += n (la pareja debe tener el campo)."""
+        row, i = self._slot(a, b)
+        row.vals[2 * i] += n
+
+    def shared_time(self, a: str, b: str) -> float:
+        """stats[a][b]["total_shared_time"] (0 si no existe)."""
+        pair = self.pair(a, b)
+        return (pair or {}).get("total_shared_time", 0)
+
+    def set_shared_time(self, a: str, b: str, value: float):
+        row, i = self._slot(a, b)
+        row.vals[2 * i + 1] = value
+
+    def remove_user(self, uid: str) -> set:
+        """
+        Quita stats[uid] y todas las parejas en las que aparece.
+        Devuelve los IDs de los usuarios que tenían pareja con él.
+        """
+        i = self.index.get(uid)
+        if i is None:
+            return set()
+        partners = self.partners(uid)
+        self.fields.pop(i, None)
+        self.pairs.drop_row(i)
+        for a in self.pairs.column(i):
+            self.pairs.delete(a, i)
+        return partners
+
+    def clear(self):
+        self.index = UserIndex()
+        self.fields = {}
+        self.pairs = PairMatrix()
+
+    def update(self, data: dict):
+        """Como dict.update: cada stats[uid] de `data` sustituye al actual."""
+        for uid, entry in data.items():
+            i = self.index.intern(uid)
+            self.pairs.drop_row(i)
+            if not isinstance(entry, dict):
+                # Valor anómalo (no dict): se conserva tal cual
+                self.fields[i] = entry
+                continue
+            fields = self.fields[i] = {}
+            for key, value in entry.items():
+                if is_pair(key, value):
+                    self.pairs.set(i, self.index.intern(key), value)
+                else:
+                    fields[key] = value
+
+    def to_dict(self) -> dict:
+        """stats.json como dicts anidados."""
+        uid = self.index.uid
+        out = {}
+        for i, fields in list(self.fields.items()):
+            if not isinstance(fields, dict):
+                out[uid(i)] = fields
+                continue
+            entry = out[uid(i)] = dict(fields)
+            for b, pair in self.pairs.row(i):
+                entry[uid(b)] = pair
+        return out
@@ -1,18 +1,15 @@
 import discord
 from discord.ui import View, Button, Select
-from src.utils.data_handler import load_json, save_json
-from src.utils.helpers import get_data_path
 
 
 # ========= CLASES DE CONFIGURACIÓN =========
-def generate_settings_interface(
-    guild_id: int, user_id: str, specific_status_msg: str = None
+async def generate_settings_interface(
+    store, guild_id: int, user_id: str, specific_status_msg: str = None
 ):
     """
     Genera el Embed y la Vista de configuración.
     """
-    path_stats = get_data_path(guild_id, "stats.json")
-    data = load_json(path_stats)
+    data = (await store.get(guild_id)).stats
 
     user_data = data.get(user_id, {})
     is_opt_out = user_data.get("opt_out_logs", False)
@@ -31,13 +28,14 @@ def generate_settings_interface(
         color=discord.Color.blue(),
     )
 
-    view = ToggleSettingsView(user_id, tracking_active, guild_id)
+    view = ToggleSettingsView(store, user_id, tracking_active, guild_id)
     return embed, view
 
 
 class ConfirmDeleteView(View):
-    def __init__(self, user_id: str, guild_id: int):
+    def __init__(self, store, user_id: str, guild_id: int):
         super().__init__(timeout=30)
+        self.store = store
         self.user_id = user_id
         self.guild_id = guild_id
         self.message = None
@@ -60,30 +58,15 @@ class ConfirmDeleteView(View):
             return
 
         await interaction.response.defer(ephemeral=False)
-        mid = self.user_id
-        files_to_clean = ["stats.json", "dates.json"]
+        state = await self.store.get(self.guild_id)
 
-        for filename in files_to_clean:
-            try:
-                path = get_data_path(self.guild_id, filename)
-                data = load_json(path)
-
-                # Limpieza profunda
-                for other_user_id, other_user_data in data.items():
-                    if other_user_id == mid:
-                        continue
-                    if isinstance(other_user_data, dict) and mid in other_user_data:
-                        del other_user_data[mid]
-
-                if mid in data:
-                    del data[mid]
-
-                if filename == "stats.json":
-                    data[mid] = {"opt_out_logs": True}
-
-                save_json(path, data)
-            except Exception as e:
-                print(f"[ERROR ConfirmDelete] {e}")
+        try:
+            # Limpieza profunda en stats y dates (ver helpers.erase_user)
+            await state.actor.run(lambda: state.record("erase", uid=self.user_id))
+            # El borrado se persiste al momento, compactando el snapshot
+            await self.store.flush(state, compact=True)
+        except Exception as e:
+            print(f"[ERROR ConfirmDelete] {e}")
 
         print(f"[INFO] Usuario {self.user_id} borró historial en {self.guild_id}.")
 
@@ -112,8 +95,9 @@ class ConfirmDeleteView(View):
 
 
 class ToggleSettingsView(View):
-    def __init__(self, user_id: str, logs_activados: bool, guild_id: int):
+    def __init__(self, store, user_id: str, logs_activados: bool, guild_id: int):
         super().__init__(timeout=300)
+        self.store = store
         self.user_id = user_id
         self.logs_activados = logs_activados
         self.guild_id = guild_id
@@ -157,8 +141,8 @@ class ToggleSettingsView(View):
             child.disabled = True
         if self.message:
             try:
-                fresh_embed, _ = generate_settings_interface(
-                    self.guild_id, self.user_id
+                fresh_embed, _ = await generate_settings_interface(
+                    self.store, self.guild_id, self.user_id
                 )
                 await self.message.edit(
                     content="⌛ **Sesión caducada.**",
@@ -177,29 +161,23 @@ class ToggleSettingsView(View):
 
         await interaction.response.defer(ephemeral=True)
         eleccion = interaction.data["values"][0]
-        path_stats = get_data_path(self.guild_id, "stats.json")
-        data = load_json(path_stats)
-
-        if self.user_id not in data:
-            data[self.user_id] = {}
-
-        if eleccion == "activar":
-            data[self.user_id]["opt_out_logs"] = False
-            new_status = True
-        else:
-            data[self.user_id]["opt_out_logs"] = True
-            new_status = False
-
-        save_json(path_stats, data)
+        state = await self.store.get(self.guild_id)
+        await state.actor.run(
+            lambda: state.record(
+                "opt_out", uid=self.user_id, value=eleccion != "activar"
+            )
+        )
 
-        embed, view = generate_settings_interface(self.guild_id, self.user_id)
+        embed, view = await generate_settings_interface(
+            self.store, self.guild_id, self.user_id
+        )
         await interaction.edit_original_response(content=None, embed=embed, view=view)
         view.message = await interaction.original_response()
 
     async def callback_delete(self, interaction: discord.Interaction):
         if str(interaction.user.id) != self.user_id:
             return
-        view_confirm = ConfirmDeleteView(self.user_id, self.guild_id)
+        view_confirm = ConfirmDeleteView(self.store, self.user_id, self.guild_id)
         await interaction.response.send_message(
             "⚠️ **¿Estás seguro de que quieres borrar todo?**",
             view=view_confirm,
@@ -213,6 +191,9 @@ class BasePaginatorView(View):
     """
     Clase base reutilizable para paginar listas de items.
     Hereda de esta clase y define `get_page_content` para personalizar qué se muestra.
+    Los datos pueden darse ya construidos (`set_data`) o como fuente perezosa
+    (`set_source`): claves ya ordenadas + un cargador que construye solo los
+    items de la página que se va a mostrar. Las páginas renderizadas se memorizan.
     """
 
     def __init__(self, items_per_page=10):
@@ -221,15 +202,28 @@ class BasePaginatorView(View):
         self.current_page = 0
         self.data_list = []  # Lista de datos a paginar (dict, objetos, strings...)
         self.title = "Estadísticas"  # Título por defecto
+        self.loader = None  # async (claves de la página) -> items de la página
+        self._loaded = {}  # página -> items cargados
+        self._rendered = {}  # página -> (embed, content)
 
     def set_data(self, data: list, title: str):
         """Carga los datos y calcula páginas totales."""
         self.data_list = data
         self.title = title
+        self._loaded.clear()
+        self._rendered.clear()
         # Calcular total de páginas (ceil division)
         self.total_pages = (len(data) + self.items_per_page - 1) // self.items_per_page
         self.update_buttons()
 
+    def set_source(self, keys: list, loader, title: str):
+        """
+        Fuente perezosa: `keys` ya en el orden final y `loader`, una corrutina
+        que recibe las claves de una página y devuelve sus items.
+        """
+        self.set_data(keys, title)
+        self.loader = loader
+
     def update_buttons(self):
         """Habilita o deshabilita botones según la página actual."""
         self.children[0].disabled = self.current_page == 0  # Botón Anterior
@@ -237,6 +231,31 @@ class BasePaginatorView(View):
             self.current_page >= self.total_pages - 1
         )  # Botón Siguiente
 
+    def page_items(self) -> list:
+        """Items de la página actual (con fuente perezosa, tras `prepare_page`)."""
+        if self.loader is not None:
+            return self._loaded.get(self.current_page, [])
+        start = self.current_page * self.items_per_page
+        return self.data_list[start : start + self.items_per_page]
+
+    async def prepare_page(self):
+        """Carga los items de la página actual si la fuente es perezosa."""
+        page = self.current_page
+        if self.loader is None or page in self._loaded:
+            return
+        start = page * self.items_per_page
+        self._loaded[page] = await self.loader(
+            self.data_list[start : start + self.items_per_page]
+        )
+
+    async def render_page(self):
+        """(embed, content) de la página actual, preparándola la primera vez."""
+        page = self.current_page
+        if page not in self._rendered:
+            await self.prepare_page()
+            self._rendered[page] = self.get_page_content()
+        return self._rendered[page]
+
     def get_page_content(self):
         """
         MÉTODO ABSTRACTO: Sobrescríbelo en tu clase hija.
@@ -250,17 +269,24 @@ class BasePaginatorView(View):
     async def prev_button(self, interaction: discord.Interaction, button: Button):
         if self.current_page > 0:
             self.current_page -= 1
-            self.update_buttons()
-            embed, content = self.get_page_content()
-            await interaction.response.edit_message(embed=embed, view=self)
+            await self._show_page(interaction)
 
     @discord.ui.button(label="▶", style=discord.ButtonStyle.primary)
     async def next_button(self, interaction: discord.Interaction, button: Button):
         if self.current_page < self.total_pages - 1:
             self.current_page += 1
-            self.update_buttons()
-            embed, content = self.get_page_content()
+            await self._show_page(interaction)
+
+    async def _show_page(self, interaction: discord.Interaction):
+        self.update_buttons()
+        if self.current_page in self._rendered:
+            embed, content = self._rendered[self.current_page]
             await interaction.response.edit_message(embed=embed, view=self)
+            return
+        # La página puede tardar en cargarse: se confirma antes la interacción
+        await interaction.response.defer()
+        embed, content = await self.render_page()
+        await interaction.edit_original_response(embed=embed, view=self)
 
 
 class UserStatsPaginator(BasePaginatorView):
@@ -271,18 +297,28 @@ class UserStatsPaginator(BasePaginatorView):
 
     def __init__(
         self,
-        data: list,
+        uids: list,
+        loader,
         user_display_name: str,
         solo_time: int,
         dep_attempts: int,
         dep_time: int,
+        period_label: str = None,
     ):
+        """
+        `uids`: IDs de las parejas ya ordenados; `loader`: corrutina que
+        construye las filas (nombre y estadísticas) de los IDs de una página.
+        `period_label`: periodo consultado, si no es desde siempre.
+        """
         super().__init__(items_per_page=15)
         self.user_name = user_display_name
         self.solo_time = solo_time
         self.dep_attempts = dep_attempts
         self.dep_time = dep_time
-        self.set_data(data, f"Estadísticas de {user_display_name}")
+        title = f"Estadísticas de {user_display_name}"
+        if period_label:
+            title += f" ({period_label})"
+        self.set_source(uids, loader, title)
 
     @staticmethod
     def fmt_time(seconds):
@@ -295,8 +331,7 @@ class UserStatsPaginator(BasePaginatorView):
 
     def get_page_content(self):
         start = self.current_page * self.items_per_page
-        end = start + self.items_per_page
-        page_items = self.data_list[start:end]
+        page_items = self.page_items()
 
         embed = discord.Embed(title=f"📊 {self.title}", color=discord.Color.blue())
 
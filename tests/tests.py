@@ -1,5 +1,35 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+import types
 import unittest
-from src.utils.data_handler import stringify_keys
+from datetime import date, datetime
+from unittest import mock
+from src.utils.data_handler import (
+    apply_stats_delta,
+    data_path,
+    save_json,
+    stringify_keys,
+)
+from src.utils.guild_actor import GuildActor
+from src.cogs.voice_cog import VoiceCog, _closing_time, _latest
+from src.utils import helpers
+from src.utils.guild_store import GuildState
+from src.utils.http_client import PooledHttpClient
+from src.utils.journal import VoiceJournal
+from src.utils.leaderboard import TopK
+from src.utils.query_cache import QueryCache
+from src.utils.retention import expired_records
+from src.utils.rollups import Rollups
+from src.utils.occupancy import ChannelOccupancy, OccupancyTracker
+from src.utils.open_sessions import OpenSessions
+from src.utils.scheduler import DeadlineScheduler
+from src.utils.solo_timers import SoloTimers
+from src.utils.sqlite_store import SqliteBackend
+from src.utils.stats_table import StatsTable
+from src.utils import snapshot_codec
 
 
 # Función auxiliar para encontrar claves que no son strings (originalmente en helpers.py para send_to_fastapi)
@@ -17,6 +47,30 @@ def find_non_str_keys(obj, path="root"):
 
 
 class TestDataHandler(unittest.TestCase):
+    def test_apply_stats_delta(self):
+        base = {
+            "1": {"total_solo_time": 5, "2": {"calls_started": 1}},
+            "2": {"1": {"calls_started": 0}},
+            "3": {"1": {"calls_started": 2}},
+        }
+        delta = {
+            "resets": ["3"],
+            "users": {"1": {"total_solo_time": 9}, "3": {"opt_out_logs": True}},
+            "pairs": [["1", "2", None], ["2", "1", {"calls_started": 4}]],
+        }
+        result = apply_stats_delta(base, delta)
+
+        self.assertEqual(
+            result,
+            {
+                "1": {"total_solo_time": 9},
+                "2": {"1": {"calls_started": 4}},
+                "3": {"opt_out_logs": True},
+            },
+        )
+        # El registro de partida no se modifica
+        self.assertEqual(base["1"], {"total_solo_time": 5, "2": {"calls_started": 1}})
+
     def test_stringify_keys_basic(self):
         # Caso: Diccionario con enteros
         data = {1: "uno", 2: "dos"}
@@ -44,5 +98,551 @@ class TestDataHandler(unittest.TestCase):
         self.assertEqual(find_non_str_keys(result), [])
 
 
+class TestVoiceJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "journal.jsonl")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_replay_skips_ops_already_in_snapshot(self):
+        journal = VoiceJournal(self.path)
+        for seq in (1, 2, 3):
+            journal.append({"op": "join", "a": "1", "b": "2", "seq": seq})
+        self.assertEqual(journal.sync(), 3)
+
+        ops = VoiceJournal(self.path).replay(after_seq=1)
+        self.assertEqual([op["seq"] for op in ops], [2, 3])
+
+    def test_replay_discards_torn_tail(self):
+        journal = VoiceJournal(self.path)
+        journal.append({"op": "solo_start", "uid": "1", "seq": 1})
+        journal.sync()
+        # Simulamos una escritura cortada a mitad de línea
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write('{"op":"solo_end","ui')
+
+        reloaded = VoiceJournal(self.path)
+        ops = reloaded.replay()
+        self.assertEqual(len(ops), 1)
+        self.assertEqual(reloaded.records, 1)
+
+
+class TestGuildActor(unittest.TestCase):
+    def test_jobs_run_in_order_without_interleaving(self):
+        async def scenario():
+            actor = GuildActor("test")
+            log = []
+
+            async def job(n):
+                log.append(("start", n))
+                await asyncio.sleep(0)
+                log.append(("end", n))
+                return n
+
+            results = await asyncio.gather(*(actor.run(job, n) for n in range(3)))
+            # Un trabajo reentrante se ejecuta al momento, sin bloquearse
+            nested = await actor.run(lambda: actor.run(job, 9))
+            await actor.drain()
+            return results, nested, log, actor.metrics()
+
+        results, nested, log, metrics = asyncio.run(scenario())
+        self.assertEqual(results, [0, 1, 2])
+        self.assertEqual(nested, 9)
+        expected = [(e, n) for n in range(3) for e in ("start", "end")]
+        self.assertEqual(log[:6], expected)
+        self.assertEqual(metrics["processed"], 4)
+        self.assertEqual(metrics["max_depth"], 3)
+
+
+class TestDeadlineScheduler(unittest.TestCase):
+    def test_fires_in_deadline_order_and_skips_cancelled(self):
+        async def scenario():
+            scheduler = DeadlineScheduler()
+            fired = []
+            for key, delay in (("c", 0.03), ("a", 0.01), ("b", 0.02), ("d", 0.04)):
+                scheduler.schedule(key, delay, fired.append, key)
+            self.assertFalse(scheduler.schedule("a", 0.0, fired.append, "dup"))
+            self.assertIsNotNone(scheduler.cancel("b"))
+            self.assertEqual(set(scheduler.cancel_many(["c", "x"])), {"c"})
+            await asyncio.sleep(0.08)
+            await scheduler.close()
+            return fired, len(scheduler)
+
+        fired, pending = asyncio.run(scenario())
+        self.assertEqual(fired, ["a", "d"])
+        self.assertEqual(pending, 0)
+
+
+class TestSoloTimers(unittest.TestCase):
+    def test_restore_rearms_with_remaining_time(self):
+        async def scenario():
+            timers = SoloTimers()
+            fired = []
+            now = time.time()
+            # Vencido mientras el bot estaba apagado: salta al momento
+            timers.restore(
+                "late", {"g": "1", "c": None, "d": now - 60}, fired.append, "late"
+            )
+            timers.restore(
+                "soon", {"g": "1", "c": None, "d": now + 0.1}, fired.append, "soon"
+            )
+            # Sin callback: solo la marca de un plazo ya vencido
+            timers.restore("marked", {"g": "1", "c": None, "d": now - 600})
+            await asyncio.sleep(0.03)
+            early = list(fired)
+            await asyncio.sleep(0.15)
+            self.assertIn("marked", timers)
+            self.assertEqual(timers.cancel("marked"), 0.0)
+            timers._save_task.cancel()  # Sin escribir data/timers.json
+            await timers.scheduler.close()
+            return early, fired
+
+        early, fired = asyncio.run(scenario())
+        self.assertEqual(early, ["late"])
+        self.assertEqual(fired, ["late", "soon"])
+
+
+class TestSnapshotCodec(unittest.TestCase):
+    def test_binary_round_trip_is_lossless(self):
+        stats = {
+            "111": {
+                "total_solo_time": 12.5,
+                "opt_out_logs": False,
+                "222": {"calls_started": 3, "total_shared_time": 0},
+            },
+            "222": {"111": {"total_shared_time": 40.25}, "apodo": "texto"},
+            "None": {"x": 1},
+        }
+        dates = {
+            "111": {
+                "_solo_total_start": "2025-03-01T10:00:00.123456",
+                "_solo_total_channel": 999,
+                "222": {
+                    "entries": [{"start_time": "2025-03-01T09:00:00", "end_time": None}]
+                },
+            },
+            "222": {"_solo_depressive_start": "2025-03-01 10:00"},
+        }
+        data = snapshot_codec.encode(7, stats, dates)
+        self.assertEqual(snapshot_codec.decode(data), (7, stats, dates))
+        self.assertIsInstance(
+            snapshot_codec.decode(data)[1]["111"]["222"]["total_shared_time"], int
+        )
+
+
+class TestStatsTable(unittest.TestCase):
+    def test_round_trip_and_updates(self):
+        data = {
+            "1": {
+                "total_solo_time": 5.0,
+                "2": {"calls_started": 2, "total_shared_time": 30.0},
+            },
+            "2": {"1": {"total_shared_time": 30.0}, "opt_out_logs": True},
+            "3": {"2": {"calls_started": 1, "total_shared_time": 4.0}},
+        }
+        table = StatsTable(data)
+        self.assertEqual(table.to_dict(), data)
+        self.assertEqual(table["1"]["2"]["calls_started"], 2)
+        self.assertEqual(table.partners("2"), {"1", "3"})
+
+        table.add_calls("1", "2")
+        table.set_shared_time("1", "2", 45.5)
+        self.assertEqual(
+            table.pair("1", "2"), {"calls_started": 3, "total_shared_time": 45.5}
+        )
+
+        table.remove_user("2")
+        self.assertNotIn("2", table)
+        self.assertEqual(table.to_dict(), {"1": {"total_solo_time": 5.0}, "3": {}})
+
+    def test_reverse_index_stays_consistent_after_remove_user(self):
+        pair = {"calls_started": 1, "total_shared_time": 1.0}
+        table = StatsTable(
+            {a: {b: pair for b in "1234" if b != a} for a in "1234"} | {"5": {}}
+        )
+        table.remove_user("2")
+        table.ensure_pair("5", "3", calls=1, shared=0.0)
+        table.remove_user("4")
+
+        # `incoming` es exactamente la traspuesta de las filas, sin columnas vacías
+        incoming = {}
+        for a, row in table.pairs.rows.items():
+            for b in row.cols:
+                incoming.setdefault(b, []).append(a)
+        self.assertEqual(
+            {b: list(col) for b, col in table.pairs.incoming.items()},
+            {b: sorted(col) for b, col in incoming.items()},
+        )
+        self.assertEqual(table.partners("3"), {"1", "5"})
+        self.assertEqual(table.partners("2"), set())
+
+
+class TestOpenSessions(unittest.TestCase):
+    def test_elapsed_from_dates(self):
+        from datetime import datetime
+
+        dates = {
+            "1": {
+                "_solo_total_start": None,
+                "2": {
+                    "entries": [{"start_time": "2025-01-01T10:00:00", "end_time": None}]
+                },
+            },
+            "3": {"_solo_total_start": "2025-01-01T10:00:30"},
+        }
+        sessions = OpenSessions.from_dates(dates)
+        now = datetime.fromisoformat("2025-01-01T10:01:00")
+        self.assertEqual(sessions.shared_elapsed("2", "1", now), 60.0)
+        self.assertEqual(sessions.solo_elapsed("3", now), 30.0)
+        self.assertEqual(sessions.solo_elapsed("1", now), 0.0)
+
+        sessions.drop_user("1")
+        self.assertEqual(sessions.shared_elapsed("1", "2", now), 0.0)
+
+
+class TestChannelOccupancy(unittest.TestCase):
+    def test_minute_rollups_and_bounded_history(self):
+        channel = ChannelOccupancy(events=4, minutes=3)
+        t = 6000.0  # Inicio de un minuto
+        channel.record(1, t + 10)
+        channel.record(2, t + 30)
+        channel.record(0, t + 90)
+
+        rows = channel.rollups(10, t + 120)
+        self.assertEqual([(m, p) for m, p, _ in rows], [(100, 2), (101, 2)])
+        self.assertAlmostEqual(rows[0][2], 80 / 50)  # Ponderada desde el primer cambio
+        self.assertAlmostEqual(rows[1][2], 1.0)
+
+        for i in range(10):
+            channel.record(i % 3, t + 200 + i * 60)
+        self.assertEqual(len(channel.times), 4)
+        self.assertEqual(len(channel.minutes), 3)
+        # Tras dar la vuelta quedan los últimos valores, en orden
+        self.assertEqual(list(channel.times), [t + 200 + i * 60 for i in range(6, 10)])
+        self.assertEqual(list(channel.levels), [0, 1, 2, 0])
+        self.assertEqual(channel.times[-1], t + 740)
+        self.assertEqual(list(channel.minutes), [109, 110, 111])
+        self.assertEqual(channel.summary(2, t + 800)["current"], 0)
+
+    def test_tracker_evicts_idle_and_deleted_channels(self):
+        tracker = OccupancyTracker(events=4, minutes=3)
+        tracker.record(1, 2, 6000.0)
+        tracker.record(1, 0, 6010.0)
+        tracker.record(2, 1, 6020.0)
+        self.assertEqual(len(tracker.channels[1].times.data), 2)  # Reserva perezosa
+
+        # Pasado el histórico de minutos, el canal vacío se descarta
+        tracker.record(2, 2, 6300.0)
+        self.assertEqual(sorted(tracker.channels), [2])
+        tracker.forget(2)
+        self.assertEqual(tracker.channels, {})
+
+
+class TestTopK(unittest.TestCase):
+    def test_incremental_updates_match_full_ranking(self):
+        scores = {"a": 5, "b": 3, "c": 1, "d": 0.5}
+        board = TopK(lambda: scores.items(), capacity=2)
+        self.assertEqual(board.top(2), [("a", 5), ("b", 3)])
+
+        scores["c"] = 4
+        board.update("c", 4)
+        self.assertEqual(board.top(2), [("a", 5), ("c", 4)])
+
+        # Una bajada dentro del top obliga a reconstruir desde la fuente
+        scores["a"] = 2
+        board.update("a", 2)
+        self.assertFalse(board.complete)
+        self.assertEqual(board.top(2), [("c", 4), ("b", 3)])
+
+
+class TestQueryCache(unittest.TestCase):
+    def test_bump_invalidates_only_dependent_entries(self):
+        cache = QueryCache()
+        cache.put(("pair", "1", "2"), cache.stamp(("1", "2")), "a")
+        cache.put(("user", "3"), cache.stamp(("3",)), "b")
+
+        cache.bump(("2",))
+        self.assertEqual(
+            cache.get(("pair", "1", "2"), cache.stamp(("1", "2"))), (False, None)
+        )
+        self.assertEqual(cache.get(("user", "3"), cache.stamp(("3",))), (True, "b"))
+
+        cache.bump_all()
+        self.assertEqual(cache.get(("user", "3"), cache.stamp(("3",))), (False, None))
+        self.assertEqual(cache.metrics()["hits"], 1)
+        self.assertEqual(cache.metrics()["stale"], 1)
+
+
+class TestRollups(unittest.TestCase):
+    def test_periods_and_compaction(self):
+        rollups = Rollups(days=7, weeks=2)
+        # Sesión que cruza la medianoche: se reparte entre los dos días
+        rollups.add_shared("2", "1", "2026-01-01T23:00:00", "2026-01-02T01:00:00")
+        rollups.add_call("2", "1", "2026-01-02T00:30:00")
+        self.assertEqual(
+            sorted(rollups.pairs[("1", "2")]), ["2026-01-01", "2026-01-02"]
+        )
+
+        rollups.add_shared("1", "2", "2026-03-10T10:00:00", "2026-03-10T10:30:00")
+        # Los días viejos acaban en semanas y las semanas viejas en meses
+        self.assertEqual(sorted(rollups.pairs[("1", "2")]), ["2025-12", "2026-03-10"])
+
+        recent = rollups.pair_period("1", "2", date(2026, 3, 4))
+        self.assertEqual(recent, {"calls_ab": 0, "calls_ba": 0, "shared": 1800.0})
+        lifetime = rollups.pair_period("2", "1", date(2025, 1, 1))
+        self.assertEqual(lifetime, {"calls_ab": 1, "calls_ba": 0, "shared": 9000.0})
+
+
+class TestRetention(unittest.TestCase):
+    def test_expired_records(self):
+        now = datetime(2026, 3, 10, 12, 0)
+        rows = [
+            # Misma hora, mismo día y misma semana ISO: sobra el más antiguo
+            (1, "1", datetime(2026, 3, 10, 11, 10)),
+            (2, "1", datetime(2026, 3, 10, 11, 40)),
+            (3, "1", datetime(2026, 3, 5, 9, 0)),
+            (4, "1", datetime(2026, 3, 5, 20, 0)),
+            (5, "1", datetime(2026, 1, 5, 8, 0)),
+            (6, "1", datetime(2026, 1, 8, 8, 0)),
+            (7, "1", datetime(2026, 1, 12, 8, 0)),
+            # Otro servidor en la misma hora no comparte cubeta
+            (8, "2", datetime(2026, 3, 10, 11, 20)),
+            # El último registro conocido del servidor no se borra nunca
+            (9, "3", datetime(2026, 3, 10, 11, 20)),
+            (10, "3", datetime(2026, 3, 10, 11, 30)),
+            (11, "3", None),
+        ]
+        self.assertEqual(
+            sorted(expired_records(rows, now, hourly_hours=24, daily_days=30)),
+            [1, 3, 5, 9],
+        )
+        self.assertEqual(
+            sorted(
+                expired_records(rows, now, keep=[9], hourly_hours=24, daily_days=30)
+            ),
+            [1, 3, 5],
+        )
+
+
+class TestGuildState(unittest.TestCase):
+    def test_replace_stats_resets_rollups(self):
+        state = GuildState("1", {}, {})
+        for _ in range(3):
+            state.record("join", a="1", bs=["2"])
+            state.record("leave", a="1", bs=["2"])
+        today = date.today()
+        self.assertEqual(state.rollups.pair_period("2", "1", today)["calls_ab"], 3)
+
+        # Restauración con una copia que tiene menos llamadas que los rollups
+        state.replace_stats({"2": {"1": {"calls_started": 1}}}, version=5)
+        for since in (today, date(2000, 1, 1)):
+            period = state.rollups.pair_period("2", "1", since)
+            self.assertLessEqual(
+                period["calls_ab"], state.stats.pair("2", "1")["calls_started"]
+            )
+        self.assertTrue(state.dirty_all)
+        self.assertFalse(state.sync_pending())
+
+    def test_erase_keeps_date_refs_consistent(self):
+        state = GuildState("1", {}, {})
+        state.record("join", a="1", bs=["2"])
+        state.record("join", a="3", bs=["1", "2"])
+        state.record("leave", a="3", bs=["1", "2"])
+        state.record("erase", uid="2")
+
+        self.assertFalse(any("2" in entry for entry in state.dates.values()))
+        live_refs = {uid: refs for uid, refs in state.date_refs.items() if refs}
+        self.assertEqual(live_refs, helpers.index_dates(state.dates))
+        self.assertEqual(state.stats.partners("1"), {"3"})
+
+
+class TestSqliteBackend(unittest.TestCase):
+    GID = "test-sqlite-backend"
+
+    def setUp(self):
+        # data/ (JSON de la migración, diario y base) va a un directorio temporal
+        self.tmp = tempfile.TemporaryDirectory()
+        patcher = mock.patch("src.utils.data_handler.RAIZ_PROYECTO", self.tmp.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.path = data_path("jointracker.db")
+        self.stats = {
+            "1": {
+                "total_solo_time": 5.0,
+                "opt_out_logs": True,
+                "apodo": "x",  # Clave sin columna propia
+                "2": {"calls_started": 2, "total_shared_time": 30.0},
+                "3": {"calls_started": 1, "nota": "y"},  # Pareja no estándar
+            },
+            "2": {"1": {"calls_started": 1, "total_shared_time": 30.0}},
+            "raro": 3,  # Entrada que no es un dict
+        }
+        save_json(f"{self.GID}/stats.json", self.stats)
+        save_json(f"{self.GID}/dates.json", {})
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip_with_incremental_flushes(self):
+        async def scenario():
+            backend = SqliteBackend(path=self.path)
+            state = await backend.load(self.GID)
+            self.assertEqual(state.stats.to_dict(), self.stats)
+
+            # Volcados incrementales de solo las filas tocadas
+            state.record("join", a="4", bs=["1"])
+            await backend.flush(state)
+            state.record("leave", a="4", bs=["1"])
+            state.record("erase", uid="2")
+            await backend.flush(state)
+            expected = state.stats.to_dict()
+            expected_dates = state.dates
+            await backend.close()
+
+            reloaded = SqliteBackend(path=self.path)
+            again = await reloaded.load(self.GID)
+            partners = await reloaded.partners(self.GID, "1")
+            await reloaded.close()
+            return expected, expected_dates, again, partners
+
+        expected, expected_dates, again, partners = asyncio.run(scenario())
+        self.assertNotIn("1", expected["2"])  # Borrado con sus parejas
+        self.assertEqual(again.stats.to_dict(), expected)
+        self.assertEqual(again.dates, expected_dates)
+        self.assertEqual(partners, {"4"})
+
+
+class TestReconcile(unittest.TestCase):
+    def test_close_time_rule(self):
+        heartbeat, checkpoint = "2026-01-01T10:10:00", "2026-01-01T10:20:00"
+        last_seen = _latest(heartbeat, None, checkpoint)
+        self.assertEqual(last_seen, checkpoint)
+        self.assertEqual(_closing_time(last_seen, "2026-01-01T10:00:00"), checkpoint)
+        # Nunca antes de su inicio; sin latido ni checkpoint, ahora (None)
+        self.assertEqual(
+            _closing_time(last_seen, "2026-01-01T10:30:00"), "2026-01-01T10:30:00"
+        )
+        self.assertIsNone(_closing_time(None, "2026-01-01T10:00:00"))
+
+    def test_reconcile_closes_stale_sessions_at_last_seen(self):
+        state = GuildState("1", {}, {})
+        state.record("join", a="1", bs=["2"], ts="2026-01-01T10:00:00")
+        state.record("solo_start", uid="3", channel=None, ts="2026-01-01T10:30:00")
+        # Nadie sigue en voz: todo lo abierto quedó colgado por una caída
+        guild = types.SimpleNamespace(voice_channels=[])
+        result = VoiceCog._reconcile_guild(
+            types.SimpleNamespace(), guild, state, "2026-01-01T10:20:00"
+        )
+
+        self.assertEqual(result["closed"], 1)
+        # Cerrada (y consolidada en stats) a la hora del último checkpoint
+        self.assertEqual(state.sessions.shared_elapsed("1", "2"), 0)
+        self.assertEqual(state.live_shared_time("1", "2"), 1200.0)
+        self.assertEqual(state.live_solo_time("3"), 0)
+        self.assertTrue(state.sessions_verified)
+
+
+class TestPooledHttpClient(unittest.TestCase):
+    def test_falls_back_to_http1_without_h2(self):
+        pool = PooledHttpClient(http2=True)
+        client = object()
+        with mock.patch(
+            "src.utils.http_client.httpx.AsyncClient",
+            side_effect=[ImportError("h2"), client],
+        ) as factory:
+            self.assertIs(pool.client, client)
+            self.assertIs(pool.client, client)  # Se crea una sola vez
+        self.assertFalse(pool.http2)
+        self.assertEqual(factory.call_count, 2)
+        self.assertNotIn("http2", factory.call_args.kwargs)
+
+
+class _StubResponse:
+    def __init__(self, status_code: int, data):
+        self.status_code = status_code
+        self._data = data
+        self.text = json.dumps(data)
+
+    def json(self):
+        return self._data
+
+
+class _StubClient:
+    """Cliente HTTP falso: responde a cada POST con la siguiente respuesta dada."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.posts = []  # (ruta, json, content)
+
+    async def post(self, url, json=None, content=None, headers=None):
+        self.posts.append((url.split("/save-json", 1)[1], json, content))
+        return self.responses.pop(0)
+
+
+class TestFastApiSync(unittest.TestCase):
+    def _synced_state(self, gid: str, version: int) -> GuildState:
+        """Estado ya confirmado en `version`, con un cambio nuevo pendiente."""
+        state = GuildState(gid, {}, {})
+        state.record("join", a="1", bs=["2"])
+        state.confirm_sync(state.take_sync(), version)
+        state.record("leave", a="1", bs=["2"])
+        return state
+
+    @mock.patch.object(helpers, "API_URL", "http://api")
+    def test_delta_conflict_falls_back_to_full_upload(self):
+        state = self._synced_state("1", 7)
+        client = _StubClient(
+            _StubResponse(409, {"detail": {"version": 8}}),
+            _StubResponse(200, {"status": "guardado", "version": 9}),
+        )
+
+        self.assertTrue(asyncio.run(helpers._sync_state(client, state, "1")))
+        (delta_path, delta, _), (full_path, full, _) = client.posts
+        self.assertEqual((delta_path, delta["base_version"]), ("/delta", 7))
+        self.assertEqual(full_path, "")
+        self.assertEqual(full["data"], state.export("stats.json"))
+        self.assertEqual(state.sync_version, 9)
+        self.assertFalse(state.sync_pending())
+
+    @mock.patch.object(helpers, "API_URL", "http://api")
+    def test_batch_resends_conflicts_as_full_snapshots(self):
+        conflicted = self._synced_state("10", 7)
+        saved = self._synced_state("11", 3)
+        client = _StubClient(
+            _StubResponse(
+                200,
+                {
+                    "status": "ok",
+                    "results": [
+                        {"guild": "10", "status": "conflicto", "version": 8},
+                        {"guild": "11", "status": "guardado", "version": 4},
+                    ],
+                },
+            ),
+            _StubResponse(
+                200,
+                {
+                    "status": "ok",
+                    "results": [{"guild": "10", "status": "guardado", "version": 9}],
+                },
+            ),
+        )
+
+        outcome = asyncio.run(helpers._sync_batch(client, [conflicted, saved]))
+        self.assertEqual(outcome, {"10": True, "11": True})
+        first, second = (
+            [json.loads(line) for line in content.splitlines()]
+            for _, _, content in client.posts
+        )
+        self.assertEqual([item["base_version"] for item in first], [7, 3])
+        self.assertEqual(
+            second, [{"guild_id": "10", "data": conflicted.export("stats.json")}]
+        )
+        self.assertEqual((conflicted.sync_version, saved.sync_version), (9, 4))
+        self.assertFalse(conflicted.sync_pending() or saved.sync_pending())
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,8 +1,11 @@
 # webserver.py
 
+import asyncio
 import os
 import hmac
 import hashlib
+import json
+import time
 from datetime import datetime
 from contextlib import asynccontextmanager
 
@@ -10,12 +13,24 @@ from dotenv import load_dotenv
 from fastapi import FastAPI, Header, HTTPException, Request, Depends
 from sqlalchemy.orm import sessionmaker, Session
 from pydantic import BaseModel
-from sqlalchemy import create_engine, Column, Integer, JSON, TIMESTAMP, String
+from sqlalchemy import (
+    create_engine,
+    text,
+    Column,
+    Index,
+    Integer,
+    JSON,
+    TIMESTAMP,
+    String,
+)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.declarative import declarative_base
 
 import src.bot_instance as bot_instance
+from src.config import HISTORY_RETENTION_INTERVAL, SHUTDOWN_DEADLINE
 from src.utils.helpers import sync_all_guilds
-from src.utils.data_handler import stringify_keys
+from src.utils.data_handler import apply_stats_delta, stringify_keys
+from src.utils.retention import expired_records
 
 # ========= Cargar variables de entorno =========
 load_dotenv()  # carga .env
@@ -58,9 +73,35 @@ class JSONData(Base):
     data = Column(JSON, nullable=False)
     created_at = Column(TIMESTAMP, default=datetime.utcnow)
 
+    # Para buscar y recortar el histórico de un servidor por fecha
+    __table_args__ = (Index("ix_json_data_guild_created", "guild_id", "created_at"),)
+
+
+# Último registro de cada servidor, actualizado (upsert) en cada guardado: las
+# lecturas no tienen que ordenar el histórico
+class LatestData(Base):
+    __tablename__ = "latest_json_data"
+    guild_id = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False)  # id del registro en json_data
+    data = Column(JSON, nullable=False)
+    created_at = Column(TIMESTAMP)
+
 
-# Crear tabla si no existe
+# Crear tablas si no existen (create_all no añade índices a tablas ya creadas)
 Base.metadata.create_all(bind=engine)
+for index in JSONData.__table__.indexes:
+    index.create(bind=engine, checkfirst=True)
+
+# Rellenar `latest` con los servidores guardados antes de que existiera
+with engine.begin() as conn:
+    conn.execute(text("""
+            INSERT INTO latest_json_data (guild_id, version, data, created_at)
+            SELECT DISTINCT ON (guild_id) guild_id, id, data, created_at
+            FROM json_data
+            WHERE guild_id NOT IN (SELECT guild_id FROM latest_json_data)
+            ORDER BY guild_id, created_at DESC, id DESC
+            ON CONFLICT (guild_id) DO NOTHING
+            """))
 
 
 # ========= Modelos de entrada =========
@@ -69,6 +110,12 @@ class Payload(BaseModel):
     data: dict
 
 
+class DeltaPayload(BaseModel):
+    guild_id: str
+    base_version: int  # id del registro sobre el que el bot calculó el delta
+    delta: dict
+
+
 # ========= Funciones auxiliares =========
 def verify_github_signature(body: bytes, signature_header: str) -> bool:
     """Verifica la firma HMAC-SHA256 enviada por GitHub."""
@@ -83,6 +130,133 @@ def verify_github_signature(body: bytes, signature_header: str) -> bool:
     return hmac.compare_digest(mac.hexdigest(), signature)
 
 
+def latest_record(db: Session, gid: str, for_update: bool = False):
+    """
+    Último registro guardado de un servidor (su `version` es el id en
+    json_data). Con `for_update` se bloquea su fila hasta el commit, para que
+    dos deltas sobre la misma versión no se apliquen a la vez.
+    """
+    query = db.query(LatestData).filter_by(guild_id=gid)
+    if for_update:
+        query = query.with_for_update()
+    return query.first()
+
+
+def latest_records(db: Session, gids, for_update: bool = False) -> dict:
+    """{gid: último registro} de varios servidores en una sola consulta."""
+    if not gids:
+        return {}
+    # Filas bloqueadas siempre en el mismo orden, para no interbloquear lotes
+    query = (
+        db.query(LatestData)
+        .filter(LatestData.guild_id.in_(gids))
+        .order_by(LatestData.guild_id)
+    )
+    if for_update:
+        query = query.with_for_update()
+    return {row.guild_id: row for row in query.all()}
+
+
+def save_records(db: Session, records: list):
+    """
+    Añade los registros al histórico y actualiza `latest_json_data` con un
+    único upsert. No confirma: el commit lo hace quien llama.
+    """
+    if not records:
+        return
+    db.add_all(records)
+    db.flush()  # Asigna id y created_at
+    stmt = pg_insert(LatestData).values(
+        [
+            {
+                "guild_id": record.guild_id,
+                "version": record.id,
+                "data": record.data,
+                "created_at": record.created_at,
+            }
+            for record in records
+        ]
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[LatestData.guild_id],
+        set_={
+            "version": stmt.excluded.version,
+            "data": stmt.excluded.data,
+            "created_at": stmt.excluded.created_at,
+        },
+        # Un guardado más antiguo que termine después no pisa al último
+        where=LatestData.version < stmt.excluded.version,
+    )
+    db.execute(stmt)
+
+
+# Borrados por sentencia al recortar el histórico
+RETENTION_DELETE_CHUNK = 1000
+
+
+def compact_history(now: datetime = None) -> int:
+    """
+    Aplica la política de retención al histórico (ver
+    src/utils/retention.py). Solo se leen id, servidor y fecha de cada
+    registro; el último de cada servidor no se borra nunca. Devuelve las
+    filas borradas.
+    """
+    now = now or datetime.utcnow()
+    db = SessionLocal()
+    try:
+        rows = db.query(JSONData.id, JSONData.guild_id, JSONData.created_at).all()
+        keep = [version for (version,) in db.query(LatestData.version)]
+        expired = expired_records(rows, now, keep)
+        for i in range(0, len(expired), RETENTION_DELETE_CHUNK):
+            chunk = expired[i : i + RETENTION_DELETE_CHUNK]
+            db.query(JSONData).filter(JSONData.id.in_(chunk)).delete(
+                synchronize_session=False
+            )
+        db.commit()
+        return len(expired)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def retention_task():
+    """Recorta el histórico al arrancar y después cada HISTORY_RETENTION_INTERVAL segundos."""
+    while True:
+        try:
+            # Consulta bloqueante: fuera del event loop
+            deleted = await asyncio.to_thread(compact_history)
+            if deleted:
+                print(
+                    f"\033[92m[WEB] 🧹 Histórico compactado: {deleted} registros borrados.\033[0m"
+                )
+        except Exception as e:
+            print(f"\033[91m[WEB] ⚠️ Error compactando el histórico: {e}\033[0m")
+        await asyncio.sleep(HISTORY_RETENTION_INTERVAL)
+
+
+async def read_batch_items(request: Request) -> list:
+    """
+    Elementos de un lote: NDJSON (application/x-ndjson, leído en streaming
+    línea a línea) o un array JSON.
+    """
+    if "ndjson" not in request.headers.get("content-type", ""):
+        items = await request.json()
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Se esperaba un array JSON.")
+        return items
+
+    items, buffer = [], b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        items.extend(json.loads(line) for line in lines if line.strip())
+    if buffer.strip():
+        items.append(json.loads(buffer))
+    return items
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -94,18 +268,47 @@ def get_db():
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # ARRANQUE DE BOT
+    retention = None
+    if HISTORY_RETENTION_INTERVAL > 0:
+        retention = asyncio.create_task(retention_task())
     yield
+    if retention:
+        retention.cancel()
     # APAGADO DE BOT
     print("\n🚨 [LIFESPAN] Apagado iniciado.")
+    started = time.monotonic()
+    store = getattr(bot_instance.bot, "guild_store", None)
     try:
+        # Persistimos en disco lo pendiente antes de sincronizar (el almacén
+        # sigue abierto: el bot aún recibe eventos hasta que se desconecta)
+        if store:
+            await store.flush_all()
+
         if bot_instance.bot and bot_instance.bot.is_ready():
             # force=False: Si el webhook guardó hace poco, no se guardan datos.
-            sent = await sync_all_guilds(bot_instance.bot, force=False)
-            print(f"✅ [LIFESPAN] Apagado completado. Servidores sincronizados: {sent}")
+            # El plazo descuenta lo que ya ha tardado el volcado a disco
+            remaining = max(1.0, SHUTDOWN_DEADLINE - (time.monotonic() - started))
+            report = await sync_all_guilds(
+                bot_instance.bot, force=False, deadline=remaining
+            )
+            print(
+                f"✅ [LIFESPAN] Apagado completado. Servidores sincronizados: {report['sent']}"
+            )
+            if report["failed"] or report["missed"]:
+                print(
+                    f"⚠️ [LIFESPAN] Sin sincronizar: {len(report['failed'])} con error "
+                    f"({', '.join(report['failed'])}), {len(report['missed'])} fuera de plazo "
+                    f"({', '.join(report['missed'])})."
+                )
         else:
             print("⚠️ Bot no listo, saltando guardado.")
     except Exception as e:
         print(f"❌ Error crítico en cierre: {e}")
+    finally:
+        # Cierre definitivo del almacén, tras la sincronización: guarda
+        # también las versiones que FastAPI acaba de confirmar (sync.json)
+        if store:
+            await store.close()
 
 
 # ========= Instancia FastAPI =========
@@ -130,7 +333,7 @@ async def save_json_endpoint(
             print(f"\033[93m[WEB][WARN] Sanitizado payload...\033[0m")
 
         record = JSONData(guild_id=payload.guild_id, data=safe_data)
-        db.add(record)
+        save_records(db, [record])
         db.commit()
         db.refresh(record)
 
@@ -146,11 +349,156 @@ async def save_json_endpoint(
         return {
             "status": "guardado",
             "guild": payload.guild_id,
+            "version": record.id,
             "timestamp": ts.isoformat() if ts else None,
         }
     except Exception as e:
         print(f"\033[93m[WEB][WARN] No se pudo construir la respuesta...\033[0m")
-        return {"status": "guardado", "guild": payload.guild_id, "timestamp": None}
+        return {
+            "status": "guardado",
+            "guild": payload.guild_id,
+            "version": record.id,
+            "timestamp": None,
+        }
+
+
+@app.post("/save-json/delta")
+async def save_json_delta_endpoint(
+    payload: DeltaPayload, x_api_key: str = Header(None), db: Session = Depends(get_db)
+):
+    """
+    Aplica los cambios de stats enviados por el bot sobre el último registro
+    del servidor y lo guarda como uno nuevo. Si la versión base no es la
+    última (o no existe), responde 409 y el bot envía el snapshot entero.
+    """
+    if API_KEY is None or x_api_key != API_KEY:
+        print("Las claves no coinciden.")
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    base = latest_record(db, payload.guild_id, for_update=True)
+    if base is None or base.version != payload.base_version:
+        db.rollback()
+        raise HTTPException(
+            status_code=409,
+            detail={
+                "error": "Versión base desactualizada.",
+                "version": base.version if base else None,
+            },
+        )
+
+    try:
+        data = apply_stats_delta(base.data, stringify_keys(payload.delta))
+        record = JSONData(guild_id=payload.guild_id, data=data)
+        save_records(db, [record])
+        db.commit()
+        db.refresh(record)
+        print(
+            f"\033[92m[WEB] ✅ Delta aplicado sobre la versión {base.version}...\033[0m"
+        )
+    except Exception as e:
+        db.rollback()
+        print(f"\033[91m[WEB] ⚠️ Cambios revertidos...\033[0m")
+        raise HTTPException(status_code=500, detail=f"No se pudo aplicar el delta: {e}")
+
+    return {
+        "status": "guardado",
+        "guild": payload.guild_id,
+        "version": record.id,
+        "timestamp": record.created_at.isoformat() if record.created_at else None,
+    }
+
+
+@app.post("/save-json/batch")
+async def save_json_batch_endpoint(
+    request: Request, x_api_key: str = Header(None), db: Session = Depends(get_db)
+):
+    """
+    Guarda de una vez los datos de varios servidores: cada elemento es un
+    snapshot ({"guild_id", "data"}, como /save-json) o un delta
+    ({"guild_id", "base_version", "delta"}, como /save-json/delta). Todos los
+    registros válidos se insertan en una única transacción y se devuelve el
+    estado de cada servidor, en el mismo orden.
+    """
+    if API_KEY is None or x_api_key != API_KEY:
+        print("Las claves no coinciden.")
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    try:
+        items = await read_batch_items(request)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=f"Lote no válido: {e}")
+
+    payloads, seen = [], set()
+    for item in items:
+        try:
+            model = DeltaPayload if "delta" in item else Payload
+            payload = model(**item)
+        except Exception as e:
+            gid = item.get("guild_id") if isinstance(item, dict) else None
+            payloads.append((gid, None, {"status": "invalido", "error": str(e)}))
+            continue
+        if payload.guild_id in seen:
+            # Un delta posterior partiría de una versión que aún no existe
+            payloads.append((payload.guild_id, None, {"status": "duplicado"}))
+            continue
+        seen.add(payload.guild_id)
+        payloads.append((payload.guild_id, payload, None))
+
+    bases = latest_records(
+        db,
+        [gid for gid, payload, _ in payloads if isinstance(payload, DeltaPayload)],
+        for_update=True,
+    )
+
+    records, results = [], []
+    for gid, payload, result in payloads:
+        if payload is None:
+            results.append(result)
+            continue
+        if isinstance(payload, DeltaPayload):
+            base = bases.get(gid)
+            if base is None or base.version != payload.base_version:
+                results.append(
+                    {"status": "conflicto", "version": base.version if base else None}
+                )
+                continue
+            data = apply_stats_delta(base.data, stringify_keys(payload.delta))
+        else:
+            data = stringify_keys(payload.data)
+        record = JSONData(guild_id=gid, data=data)
+        records.append(record)
+        results.append(record)
+
+    try:
+        # Un único INSERT por lotes; los ids se conocen tras el flush
+        save_records(db, records)
+        results = [
+            (
+                {
+                    "status": "guardado",
+                    "version": result.id,
+                    "timestamp": (
+                        result.created_at.isoformat() if result.created_at else None
+                    ),
+                }
+                if isinstance(result, JSONData)
+                else result
+            )
+            for result in results
+        ]
+        db.commit()
+        print(f"\033[92m[WEB] ✅ Lote de {len(records)} servidores guardado...\033[0m")
+    except Exception as e:
+        db.rollback()
+        print(f"\033[91m[WEB] ⚠️ Cambios revertidos...\033[0m")
+        raise HTTPException(status_code=500, detail=f"No se pudo guardar el lote: {e}")
+
+    return {
+        "status": "ok",
+        "results": [
+            {"guild": gid, **result} for (gid, _, _), result in zip(payloads, results)
+        ],
+    }
 
 
 @app.post("/github-webhook")
@@ -175,15 +523,16 @@ async def github_webhook(request: Request):
         f"\033[93m[GITHUB] Detectado push en GitHub. Volcado automático iniciado.\033[0m"
     )
 
-    sent = await sync_all_guilds(bot_instance.bot, force=False)
+    report = await sync_all_guilds(bot_instance.bot, force=False)
 
     print(
-        f"\033[93m[GITHUB] ✅ Volcado automático completado. Servidores sincronizados: {sent}\033[0m"
+        f"\033[93m[GITHUB] ✅ Volcado automático completado. Servidores sincronizados: {report['sent']}\033[0m"
     )
 
     return {
         "status": "ok",
-        "synced_guilds": sent,
+        "synced_guilds": report["sent"],
+        "failed_guilds": report["failed"],
         "repo": payload.get("repository", {}).get("full_name"),
         "ref": payload.get("ref"),
     }
@@ -198,16 +547,12 @@ async def get_guild_stats(
     if API_KEY is None or x_api_key != API_KEY:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
-    record = (
-        db.query(JSONData)
-        .filter_by(guild_id=gid)
-        .order_by(JSONData.created_at.desc())
-        .first()
-    )
+    record = latest_record(db, gid)
 
     if record:
         response_content = {
             "data": record.data,
+            "version": record.version,
             "created_at": (
                 record.created_at.isoformat() if record.created_at else None
             ),
@@ -215,3 +560,39 @@ async def get_guild_stats(
         return response_content
 
     return {"error": "No hay datos guardados aún para este servidor."}
+
+
+@app.get("/metrics/actors")
+async def get_actor_metrics(x_api_key: str = Header(None)):
+    """Profundidad de cola y latencias del actor de cada servidor cargado."""
+    if API_KEY is None or x_api_key != API_KEY:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    store = getattr(bot_instance.bot, "guild_store", None)
+    if store is None:
+        return {"error": "El bot aún no ha cargado ningún servidor."}
+    return store.actor_metrics()
+
+
+@app.get("/metrics/query-cache")
+async def get_query_cache_metrics(x_api_key: str = Header(None)):
+    """Aciertos, fallos y tamaño de la caché de consultas de cada servidor cargado."""
+    if API_KEY is None or x_api_key != API_KEY:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    store = getattr(bot_instance.bot, "guild_store", None)
+    if store is None:
+        return {"error": "El bot aún no ha cargado ningún servidor."}
+    return store.query_cache_metrics()
+
+
+@app.get("/metrics/http")
+async def get_http_metrics(x_api_key: str = Header(None)):
+    """Peticiones, errores, latencias y versión HTTP de las llamadas salientes del bot."""
+    if API_KEY is None or x_api_key != API_KEY:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    http_pool = getattr(bot_instance.bot, "http_pool", None)
+    if http_pool is None:
+        return {"error": "El bot aún no ha creado su cliente HTTP."}
+    return http_pool.metrics()